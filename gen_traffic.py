@@ -3,13 +3,16 @@
 import logging
 import json
 import argparse 
-from time import sleep
 
 from stc_session import StcSession
 from stc_streamblock import StcStreamblock, StcStreamblockException
 from stc_ethernetII import StcEthernetII
 from stc_ipv4 import StcIPv4
 from stc_config import StcConfig
+from stc_profile import StcTrafficProfile
+from stc_results import StcResults
+from stc_export import StcResultExporter
+from stc_trace import trace_session
 
 log = logging.getLogger(__name__)
 
@@ -19,11 +22,22 @@ if __name__ == '__main__':
                     dest='loglevel', default='info')
     ap.add_argument('--debugREST', default=False, help='If given, dump a lot of information about'
                     ' the HTTP/URL calls being made by the REST API.', action='store_true')
+    ap.add_argument('--trace', dest='trace', type=str, default=None, help='Append a JSON line per REST call'
+                    ' (method, object/command, duration, bytes, outcome) to this file and print a summary'
+                    ' of the calls at exit.')
     ap.add_argument('-c', '--config', default=None, help='Customize the traffic via a config file.')
     ap.add_argument('--generate_config', default=False, help='Generate a sample config file to stdout and exit.',
                     action='store_true')
     ap.add_argument('-t', '--time-in-seconds', type=int, default=5, dest='howlong', 
                     help='How long to generate traffic for in seconds.')
+    ap.add_argument('-i', '--interval', type=float, default=None, dest='interval',
+                    help='If given, read and log traffic results every INTERVAL seconds while traffic runs.')
+    ap.add_argument('-e', '--export', type=str, default=None, dest='export',
+                    help='Write the traffic results read while traffic runs to this file (every INTERVAL'
+                    ' seconds, default 1). The format is taken from the extension (.csv, .bin, .arrow) or'
+                    ' --export_format.')
+    ap.add_argument('--export_format', choices=['csv', 'bin', 'arrow'], default=None, dest='export_format',
+                    help='Format of the --export file.')
     args = ap.parse_args()
 
     if args.debugREST:
@@ -48,16 +62,37 @@ if __name__ == '__main__':
             custom_config = json.load(fd)
             config.apply_config(custom_config)
 
+    if args.interval:
+        config.apply_config({StcResults.config_key: {'interval': args.interval}})
+
+    if args.export:
+        config.apply_config({StcResultExporter.config_key: {'path': args.export, 'format': args.export_format}})
+
     try:
-        with StcSession(config=config, keep_open=False) as sess:
-            ports = sess.reserve_ports()
+        sess = StcSession(config=config, keep_open=False)
+        if args.trace:
+            trace_session(sess, args.trace)
+
+        with sess:
             try:
-                sb = sess.create_streamblock(port=ports[0])
-                sb.create_ethernetII()
-                sb.create_ipv4()
-                sb.start_traffic()
-                sleep(args.howlong)
-                sb.stop_traffic()
+                profile = StcTrafficProfile(sess).create()
+                # the chassis times the run, see StcTrafficProfile.start_timed().
+                if not args.interval and not args.export:
+                    profile.run_timed(args.howlong)
+                else:
+                    with StcResults(sess) as results:
+                        end = profile.start_timed(args.howlong)
+                        for sample in results.samples(duration=args.howlong):
+                            if not args.interval:
+                                continue
+                            log.info('{} {}: frames {} bytes {} rate {} fps dropped {} latency {}/{}/{}'.format(
+                                sample.handle, sample.result_type, sample.frames, sample.bytes,
+                                sample.frame_rate, sample.dropped, sample.latency_min, sample.latency_avg,
+                                sample.latency_max))
+                        profile.wait_timed(end)
+                        results.poll()
+                        for handle, s in sorted(results.summary().items()):
+                            log.info('{}: {}'.format(handle, s))
             except StcStreamblockException as e:
                 log.error('Error running traffic stream: {}'.format(e))
                 exit(1)  
@@ -9,4 +9,4 @@ fi
 
 virtualenv -p python3 ${VDIR}
 . ./${VDIR}/bin/activate
-pip install -U stcrestclient
+pip install -U stcrestclient aiohttp numpy pytest
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import logging
+import json
+import argparse
+from os.path import isfile, basename
+
+from stc_analysis import StcAnalysis, StcAnalysisException, summary_path
+
+log = logging.getLogger(__name__)
+
+def table(summary):
+    cols = ['flow', 'port', 'tx_frames', 'rx_frames', 'loss_pct', 'rx_mbps', 'rx_fps_p50', 'rx_fps_p99',
+            'lat_p50', 'lat_p99', 'lat_max', 'out_of_seq']
+    lines = [' '.join(['{:>12}'.format(c) for c in cols])]
+    for handle, f in sorted(summary['flows'].items()):
+        tx, rx = f.get('tx', {}), f.get('rx', {})
+        row = [handle, f.get('port'), tx.get('frames'), rx.get('frames'), f.get('loss_pct'), f.get('rx_mbps'),
+               rx.get('fps_p50'), rx.get('fps_p99'), rx.get('latency_p50'), rx.get('latency_p99'),
+               rx.get('latency_max'), rx.get('out_of_seq')]
+        lines.append(' '.join(['{:>12.3f}'.format(v) if isinstance(v, float) else '{:>12}'.format(str(v))
+                               for v in row]))
+
+    t = summary['totals']
+    lines.append('{} flow(s), {} sample(s). tx {} rx {} lost {} ({}%)'.format(
+        t['flows'], summary['samples'], t['tx_frames'], t['rx_frames'], t['lost_frames'],
+        '{:.3f}'.format(t['loss_pct']) if t['loss_pct'] is not None else 'n/a'))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Summarize traffic results files (written with gen_traffic.py -e or'
+                                 ' the "export" config) per flow: loss, throughput, rate and latency percentiles,'
+                                 ' out of sequence frames.')
+    ap.add_argument('-l', '--loglevel', choices=['all', 'debug', 'info', 'error', 'critical'],
+                    dest='loglevel', default='info')
+    ap.add_argument('-s', '--statefile', type=str, dest='statefile', default=None,
+                    help='The spirent_session.py state file of the run. The summary is written next to it'
+                    ' (STATEFILE.summary.json) and flows are labeled with their ports.')
+    ap.add_argument('-o', '--output', type=str, default=None, help='Write the summary here instead.')
+    ap.add_argument('--json', default=False, action='store_true', help='Print the summary as JSON.')
+    ap.add_argument('results', nargs='+', help='Results file(s), .csv, .bin, or .arrow.')
+    args = ap.parse_args()
+
+    logging.basicConfig(level=args.loglevel.upper())
+
+    state = None
+    if args.statefile and isfile(args.statefile):
+        with open(args.statefile) as fd:
+            state = json.load(fd)
+
+    try:
+        analysis = StcAnalysis.concat([StcAnalysis.load(path) for path in args.results],
+                                      names=[basename(path) for path in args.results])
+        summary = analysis.summary(state)
+    except (StcAnalysisException, OSError, ValueError) as e:
+        log.error('Unable to analyze results: {}'.format(e))
+        exit(1)
+
+    path = args.output if args.output else (summary_path(args.statefile) if args.statefile else None)
+    if path:
+        with open(path, 'w') as fd:
+            json.dump(summary, fd, indent=4, sort_keys=True)
+        log.info('Wrote summary to {}'.format(path))
+
+    if args.json:
+        print(json.dumps(summary, indent=4, sort_keys=True))
+    else:
+        print(table(summary))
+
+    exit(0)
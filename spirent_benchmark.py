@@ -0,0 +1,78 @@
+#!/usr/bin/env python3 
+
+import logging
+import json
+import argparse 
+
+from stc_config import StcConfig
+from stc_session import StcSession
+from stc_benchmark import StcBenchmark, StcStartupBenchmark
+
+log = logging.getLogger(__name__)
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Benchmark the Spirent control plane. Runs the gen_traffic.py and'
+                                 ' spirent_session.py lifecycles and writes, as JSON, the REST call counts, bytes,'
+                                 ' and p50/p99 latency of each lifecycle phase.')
+    ap.add_argument('-l', '--loglevel', choices=['all', 'debug', 'info', 'error', 'critical'],
+                    dest='loglevel', default='error')
+    ap.add_argument('-c', '--config', default=None, help='Config file giving the STC server (and traffic) to'
+                    ' benchmark against.')
+    ap.add_argument('--emulator', default=False, action='store_true', help='Benchmark against a local'
+                    ' stc_emulator.py instead of the server in the config.')
+    ap.add_argument('--latency', default=0.0, type=float, help='With --emulator, seconds to delay each request.')
+    ap.add_argument('-n', '--iterations', default=5, type=int, help='How many times to run each lifecycle.')
+    ap.add_argument('-t', '--traffic_time', default=0, type=float, help='Seconds to run traffic in each'
+                    ' gen_traffic lifecycle.')
+    ap.add_argument('--scenario', default=[], action='append', choices=StcBenchmark.scenarios,
+                    help='Lifecycle to run. May be given multiple times. Default is all of them.')
+    ap.add_argument('--startup', default=False, action='store_true', help='Instead, time how long the scripts'
+                    ' take to start when they do not connect (writing configs, help, argument errors) and list'
+                    ' any slow to import modules they load. No STC server is needed.')
+    ap.add_argument('--max_startup_ms', default=None, type=float, help='With --startup, exit 1 if a command'
+                    ' takes longer than this (p50, less interpreter startup) or imports a slow module.')
+    ap.add_argument('-o', '--output', default=None, help='Write the JSON report here instead of stdout.')
+    args = ap.parse_args()
+
+    logging.basicConfig(level=args.loglevel.upper())
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    config = StcConfig()
+    if args.config:
+        with open(args.config) as fd:
+            config.apply_config(json.load(fd))
+
+    failed = False
+    emulator = None
+    if args.startup:
+        report = StcStartupBenchmark(args.iterations).run()
+        for name, c in report['commands'].items():
+            if c['slow_imports']:
+                log.error('{} imports {}'.format(name, ', '.join(c['slow_imports'])))
+                failed = True
+            if args.max_startup_ms is not None and c['startup_ms']['p50'] > args.max_startup_ms:
+                log.error('{} takes {:.1f}ms to start'.format(name, c['startup_ms']['p50']))
+                failed = True
+    elif args.emulator:
+        from stc_emulator import StcEmulator
+        emulator = StcEmulator(latency=args.latency).start()
+        config.apply_config({StcSession.config_key: {'stc_server_addr': emulator.addr,
+                                                     'stc_server_port': str(emulator.port)}})
+
+    if not args.startup:
+        try:
+            report = StcBenchmark(config, args.iterations, args.traffic_time).run(args.scenario)
+        finally:
+            if emulator:
+                emulator.stop()
+
+    if args.emulator:
+        report['emulator_latency'] = args.latency
+
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump(report, fd, indent=4, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=4, sort_keys=True))
+
+    exit(1 if failed else 0)
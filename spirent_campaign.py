@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import logging
+import json
+import signal
+import argparse
+import threading
+from os.path import isfile
+
+from stc_session import StcSession
+from stc_config import StcConfig
+from stc_campaign import StcCampaign, StcCampaignException
+from stc_port_map import StcPortMapException
+from stc_trace import trace_session
+
+log = logging.getLogger(__name__)
+
+def table(rows):
+    cols = ['name', 'status', 'duration', 'tx_frames', 'rx_frames', 'lost_frames', 'results']
+    lines = [' '.join(['{:>12}'.format(c) for c in cols])]
+    for r in rows:
+        lines.append(' '.join(['{:>12}'.format(str(r.get(c))) for c in cols]))
+
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Run a queue of experiments in one session, in parallel where they'
+                                 ' use different chassis ports. The experiments come from the "campaign" stanza'
+                                 ' of the config and any experiment files given.')
+    ap.add_argument('-l', '--loglevel', choices=['all', 'debug', 'info', 'error', 'critical'],
+                    dest='loglevel', default='info')
+    ap.add_argument('-c', '--config', default=None, help='The config the experiments are applied on top of.')
+    ap.add_argument('-e', '--experiments', dest='experiment_files', default=[], action='append',
+                    help='JSON file with a list of experiments to queue after those of the config. May be given'
+                    ' multiple times.')
+    ap.add_argument('-s', '--statefile', type=str, default=None, help='Run in the session of this spirent state'
+                    ' file (created if it does not exist) and keep it open afterwards, ports attached. Without'
+                    ' it a new session is made and destroyed.')
+    ap.add_argument('--trace', dest='trace', type=str, default=None, help='Append a JSON line per REST call'
+                    ' (method, object/command, duration, bytes, outcome) to this file and print a summary'
+                    ' of the calls at exit.')
+    ap.add_argument('--max_parallel', type=int, default=None, help='Most experiments to run at once.')
+    ap.add_argument('--json', default=False, action='store_true', help='Write the report as JSON.')
+    args = ap.parse_args()
+
+    logging.basicConfig(level=args.loglevel.upper())
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    config = StcConfig()
+    if args.config:
+        with open(args.config) as fd:
+            config.apply_config(json.load(fd))
+
+    if args.max_parallel is not None:
+        config.apply_config({StcCampaign.config_key: {'max_parallel': args.max_parallel}})
+
+    experiments = list(config.data[StcCampaign.config_key]['experiments'])
+    for path in args.experiment_files:
+        with open(path) as fd:
+            experiments += json.load(fd)
+
+    state = None
+    if args.statefile and isfile(args.statefile):
+        with open(args.statefile) as fd:
+            state = json.load(fd)
+
+    # finish the running experiments' results and cancel the rest on ^C.
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    try:
+        sess = StcSession(config=config, state=state, keep_open=bool(args.statefile))
+        if args.trace:
+            trace_session(sess, args.trace)
+
+        with sess:
+            try:
+                campaign = StcCampaign(sess, experiments)
+                report = campaign.run(stop=stop)
+            except (StcCampaignException, StcPortMapException) as e:
+                log.error('Error running campaign: {}'.format(e))
+                exit(1)
+            finally:
+                if args.statefile:
+                    with open(args.statefile, 'w') as fd:
+                        json.dump(sess.state, fd, indent=4, sort_keys=True)
+
+    except Exception as e:
+        log.critical('Critical Error: {}'.format(e))
+        raise(e)
+        exit(2)
+
+    if args.json:
+        print(json.dumps(report, indent=4, sort_keys=True))
+    else:
+        print(table(report))
+
+    exit(0 if not [r for r in report if r['status'] != 'done'] else 1)
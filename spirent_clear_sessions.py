@@ -1,25 +1,93 @@
 #!/usr/bin/env python3 
 
 import logging
-from stcrestclient import stchttp
+import json
+import argparse
+from time import sleep
+
 from stc_session import StcSession
+from stc_cleanup import StcSessionCleaner
 
 log = logging.getLogger(__name__)
 
-logging.basicConfig(level=logging.INFO)
+def report(results):
+    '''Log the results of StcSessionCleaner.clear(). Returns how many failed.'''
+    failed = 0
+    for r in results:
+        if r['status'] == 'dry_run':
+            age = '' if r['age'] is None else ' age {:.0f}s'.format(r['age'])
+            lease = '' if not r.get('lease') else ', lease of {} expired at {:.0f}'.format(
+                r['lease']['holder'], r['lease']['expires'])
+            log.info('Would end session {}{}{}'.format(r['sid'], age, lease))
+        elif r['status'] == 'ok':
+            log.info('Ended session {} in {:.2f}s, detached {} port(s).'.format(r['sid'], r['seconds'],
+                                                                                 len(r['ports'])))
+        elif r['status'] == 'renewed':
+            log.info('Left session {}: its lease was renewed.'.format(r['sid']))
+        else:
+            failed += 1
+            log.error('Failed to end session {} after {:.2f}s: {}'.format(r['sid'], r['seconds'], r['error']))
+
+    log.info('{} session(s) matched, {} failed.'.format(len(results), failed))
+    return failed
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='End sessions on the Spirent device, releasing the ports they hold.'
+                                 ' With no filters, every session is ended.')
+    ap.add_argument('-l', '--loglevel', choices=['all', 'debug', 'info', 'error', 'critical'],
+                    dest='loglevel', default='info')
+    ap.add_argument('-c', '--configfile', dest='configfile', type=str, default=None,
+                    help='Config file giving the STC server. Defaults to the default STC server.')
+    ap.add_argument('-u', '--user', dest='users', default=[], action='append',
+                    help='Only end sessions of this user. May be given multiple times.')
+    ap.add_argument('-n', '--name', dest='name', default=None,
+                    help='Only end sessions whose name matches this shell style pattern, i.e. "ab*".')
+    ap.add_argument('--older_than', dest='older_than', type=float, default=None,
+                    help='Only end sessions at least this many seconds old.')
+    ap.add_argument('--expired', default=False, action='store_true',
+                    help='Only end sessions whose lease has expired, i.e. whose client died without ending them.'
+                    ' Sessions without a lease are left alone.')
+    ap.add_argument('--grace', type=float, default=60,
+                    help='With --expired, seconds past its expiry before a lease counts as expired.')
+    ap.add_argument('--watch', type=float, default=None, metavar='SECONDS',
+                    help='Keep running, clearing matching sessions every SECONDS, i.e. as a reaper with'
+                    ' --expired.')
+    ap.add_argument('--dry_run', default=False, action='store_true',
+                    help='List the sessions that would be ended and exit.')
+    ap.add_argument('-w', '--workers', type=int, default=8, help='How many sessions to end at once.')
+    ap.add_argument('--no_detach', default=False, action='store_true',
+                    help='Do not detach the ports of a session before ending it.')
+    ap.add_argument('--timeout', type=int, default=30, help='Seconds to wait for each session to end.')
+    args = ap.parse_args()
+
+    logging.basicConfig(level=args.loglevel.upper())
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    try:
+        conf = StcSession.default_config
+        if args.configfile:
+            with open(args.configfile) as fd:
+                conf = dict(conf, **json.load(fd).get(StcSession.config_key, {}))
+
+        cleaner = StcSessionCleaner(conf['stc_server_addr'], conf['stc_server_port'], workers=args.workers,
+                                    users=args.users, name=args.name, older_than=args.older_than,
+                                    detach=not args.no_detach, timeout=args.timeout, expired=args.expired,
+                                    grace=args.grace)
+        results = cleaner.clear(dry_run=args.dry_run)
 
-try:
-    addr = StcSession.default_config['stc_server_addr']
-    port = StcSession.default_config['stc_server_port']
-    stc = stchttp.StcHttp(addr, port)
+    except Exception as e:
+        print(e)
+        exit(1)
 
-    sessions = stc.sessions()
-    for session in sessions:
-        log.info('Joining session {}'.format(session))
-        stc.join_session(session)
-        log.info('Ending session {}'.format(session))
-        stc.end_session(session)
+    failed = report(results)
+    while args.watch:
+        try:
+            sleep(args.watch)
+            failed = report(cleaner.clear(dry_run=args.dry_run))
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            # the server may be restarting. Keep watching.
+            log.error('Unable to clear sessions: {}'.format(e))
 
-except Exception as e:
-    print(e)
-    exit(1)
+    exit(1 if failed else 0)
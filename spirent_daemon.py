@@ -0,0 +1,72 @@
+#!/usr/bin/env python3 
+
+import logging
+import json
+import argparse 
+from os.path import isfile
+
+from stc_session import StcSession, StcSessionException
+from stc_config import StcConfig
+from stc_daemon import StcDaemon, StcDaemonException
+from stc_trace import trace_session
+
+log = logging.getLogger(__name__)
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Hold a Spirent session open and run spirent_session.py commands'
+                                 ' for it. While running, spirent_session.py invocations with the same state file'
+                                 ' send their commands here instead of reconnecting to the Spirent device.')
+    ap.add_argument('-l', '--loglevel', choices=['all', 'debug', 'info', 'error', 'critical'],
+                    dest='loglevel', default='info')
+    ap.add_argument('--debugREST', default=False, help='If given, dump a lot of information about'
+                    ' the HTTP/URL calls being made by the REST API.', action='store_true')
+    ap.add_argument('--trace', dest='trace', type=str, default=None, help='Append a JSON line per REST call'
+                    ' (method, object/command, duration, bytes, outcome) to this file and print a summary'
+                    ' of the calls at exit.')
+    ap.add_argument('-s', '--statefile', type=str, dest='statefile', required=True, 
+                    help='The spirent state file. If it does not exist, a new session is created and written'
+                    ' to it.')
+    ap.add_argument('-c', '--configfile', dest='configfile', type=str, help='The configuration to use in this'
+                    ' session. Defaults will be used to fill in any gaps in the configuration.', required=True)
+    ap.add_argument('--socket', dest='socket', type=str, default=None, help='The control socket to listen on.'
+                    ' Defaults to the state file name plus ".sock", which is where spirent_session.py looks.')
+    args = ap.parse_args()
+
+    if args.debugREST:
+        requests_log = logging.getLogger("urllib3")
+        requests_log.setLevel(logging.DEBUG)
+        requests_log.propagate = True
+        import http.client as http_client
+        http_client.HTTPConnection.debuglevel = 1
+    else:
+        logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    logging.basicConfig(level=args.loglevel.upper())
+
+    try:
+        config = StcConfig()
+        with open(args.configfile) as fd:
+            config.apply_config(json.load(fd))
+
+        state = None
+        if isfile(args.statefile):
+            with open(args.statefile) as fd:
+                state = json.load(fd)
+
+        session = StcSession(config=config, state=state)
+        if args.trace:
+            trace_session(session, args.trace)
+
+        session.connect()
+        daemon = StcDaemon(session, args.statefile, args.socket)
+        daemon.write_state()
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            log.info('Interrupted. Leaving the session open.')
+
+    except (StcSessionException, StcDaemonException) as e:
+        log.critical('Critical Error: {}'.format(e))
+        exit(100)
+
+    exit(0)
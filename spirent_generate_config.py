@@ -7,7 +7,7 @@ import argparse
 from stc_session import StcSession
 from stc_config import StcConfig
 from stc_ipv4 import StcIPv4
-from stc_session import StcSession
+from stc_profile import StcTrafficProfile
 
 log = logging.getLogger(__name__)
 
@@ -19,6 +19,9 @@ if __name__ == '__main__':
     ap.add_argument('-t', '--traffic_duration', default=None, help='How long in seconds to generate traffic.', type=int)
     ap.add_argument('-p', '--protocol', default=17, help='IP protocol to use for traffic. Default is UDP (17).',
                     type=int)
+    ap.add_argument('-f', '--flow', default=[], action='append', metavar='SRCADDR,DSTADDR',
+                    help='Add a flow to the traffic profile. May be given multiple times. All flows are '
+                    'started and stopped together.')
     args = ap.parse_args()
 
     logging.basicConfig(level=logging.INFO)
@@ -32,6 +35,19 @@ if __name__ == '__main__':
     # hardcoded for ilab. A.B.C.D --> A.B.C.1
     config[StcIPv4.config_key]['gateway'] = '.'.join(args.srcaddr.split('.')[:3]+['1'])
 
+    # Traffic profile config. Each flow overrides the IP config above.
+    flows = []
+    for flow in args.flow:
+        src, dst = flow.split(',')
+        flows.append({
+            StcIPv4.config_key: {
+                'sourceAddr': src,
+                'destAddr': dst,
+                'gateway': '.'.join(src.split('.')[:3]+['1']),
+            }
+        })
+    config[StcTrafficProfile.config_key]['flows'] = flows
+
     # Session config
     if args.traffic_duration:
         config[StcSession.config_key]['traffic_duration'] = args.traffic_duration
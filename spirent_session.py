@@ -3,13 +3,17 @@
 import logging
 import json
 import argparse 
-from os.path import isfile
+from os.path import abspath, isfile
 
 from stc_session import StcSession, StcSessionException
 from stc_streamblock import StcStreamblock, StcStreamblockException
 from stc_ethernetII import StcEthernetII
 from stc_ipv4 import StcIPv4
 from stc_config import StcConfig
+from stc_profile import StcTrafficProfileException
+from stc_commands import commands, run_command, project_config_key, StcCommandException
+from stc_daemon import StcDaemonClient, daemon_socket_path
+from stc_trace import trace_session
 
 log = logging.getLogger(__name__)
 
@@ -21,12 +25,20 @@ if __name__ == '__main__':
                     dest='loglevel', default='info')
     ap.add_argument('--debugREST', default=False, help='If given, dump a lot of information about'
                     ' the HTTP/URL calls being made by the REST API.', action='store_true')
+    ap.add_argument('--trace', dest='trace', type=str, default=None, help='Append a JSON line per REST call'
+                    ' (method, object/command, duration, bytes, outcome) to this file and print a summary'
+                    ' of the calls at exit.')
     ap.add_argument('-s', '--statefile', type=str, dest='statefile', required=True, 
                     help='The spirent state file. If it does not exist, it will be created. The same state file'
                     ' should be passed to all invocations of this script for a given spirent session.')
     ap.add_argument('-c', '--configfile', dest='configfile', type=str, help='The configuration to use in this'
                     ' session. Defaults will be used to fill in any gaps in the configuration.', required=True)
-    ap.add_argument('commands', choices=['create', 'traffic_start', 'traffic_stop', 'destroy'],
+    ap.add_argument('-p', '--project', dest='project', type=str, default=None, help='STC configuration (XML)'
+                    ' file for the load and save commands. Overrides "file" in the "project" stanza of the'
+                    ' config.')
+    ap.add_argument('--no_daemon', default=False, action='store_true', help='Do not send the commands to'
+                    ' a running spirent_daemon.py for this state file; run them here.')
+    ap.add_argument('commands', choices=commands,
                     help='The command(s) to run using the given session/state. May be given multiple times. '
                     'Arguments will be processed in order.', nargs='+')
     args = ap.parse_args()
@@ -47,7 +59,11 @@ if __name__ == '__main__':
 
         # update default with passed in state.
         with open(args.configfile) as fd:
-            config.apply_config(json.load(fd))
+            config_data = json.load(fd)
+            if args.project:
+                # absolute, as a daemon running the commands may not share our working directory.
+                config_data.setdefault(project_config_key, {})['file'] = abspath(args.project)
+            config.apply_config(config_data)
 
         # load state
         if isfile(args.statefile):
@@ -56,43 +72,29 @@ if __name__ == '__main__':
         else:
             state = None
 
+        # If a daemon holds this session, let it run the commands.
+        client = StcDaemonClient(daemon_socket_path(args.statefile))
+        if not args.no_daemon and client.available():
+            log.info('Sending commands to daemon.')
+            response = client.run(args.commands, config=config_data)
+            if response['status'] != 'ok':
+                log.error('Error from daemon: {}'.format(response['message']))
+                exit(response['exit'])
+            exit(0)
+
         try:
-            with StcSession(config=config, state=state) as session:
+            session = StcSession(config=config, state=state)
+            if args.trace:
+                trace_session(session, args.trace)
+
+            with session:
                 for command in args.commands:
-                    if command == 'create':
-                        # The "create" is done in the context manager if the session does not exist in the given state.
-                        log.info('Created new session.')
-                    
-                    elif command == 'traffic_start':
-                        ports = session.reserve_ports()
-                        try:
-                            sb = session.create_streamblock(port=ports[0])
-                            sb.create_ethernetII()
-                            sb.create_ipv4()
-                            sb.start_traffic()
-                        except StcStreamblockException as e:
-                            log.error('Error starting traffic stream: {}'.format(e))
-                            exit(1)  
-
-                    elif command == 'traffic_stop':
-                        try:
-                            session.keep_open(False)
-                            session.destroy_streamblock()
-                            session.detach_ports()
-                        except StcStreamblockException as e:
-                            log.error('Error stapping traffic stream: {}'.format(e))
-                            exit(1)  
-
-                    elif command == 'destroy':
-                        # in the "destroy" case, we do nothing and let the session context manager
-                        # destory things when teh session goes out of scope.
-                        session.keep_open(False)
-                        log.info('Closing existing session/project/ports.')
-
-                    else:
-                        # should not happen as argparser restricts choices
-                        raise('Command {} not supported.'.format(command))
-                       
+                    try:
+                        run_command(session, command)
+                    except (StcStreamblockException, StcTrafficProfileException, StcCommandException) as e:
+                        log.error('Error running {}: {}'.format(command, e))
+                        exit(1)  
+
                     if command != 'destroy':
                         # pass the current stat forward.
                         with open(args.statefile, 'w') as fd:
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3 
+
+import logging
+import json
+import argparse 
+
+from stc_session import StcSession
+from stc_streamblock import StcStreamblockException
+from stc_config import StcConfig
+from stc_sweep import StcSweep, StcSweepException
+from stc_trace import trace_session
+
+log = logging.getLogger(__name__)
+
+def table(rows):
+    cols = ['frame_size', 'load', 'tx_frames', 'rx_frames', 'loss_pct', 'rx_fps', 'rx_mbps', 'latency_avg',
+            'latency_max', 'passed']
+    lines = [' '.join(['{:>12}'.format(c) for c in cols])]
+    for r in rows:
+        vals = []
+        for c in cols:
+            v = r.get(c)
+            vals.append('{:>12.3f}'.format(v) if isinstance(v, float) else '{:>12}'.format(str(v)))
+        lines.append(' '.join(vals))
+
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Find the highest load the path between the enclaves carries without'
+                                 ' loss (RFC 2544 style), per frame size. Settings not given here come from the'
+                                 ' "sweep" stanza of the config.')
+    ap.add_argument('-l', '--loglevel', choices=['all', 'debug', 'info', 'error', 'critical'],
+                    dest='loglevel', default='info')
+    ap.add_argument('-c', '--config', default=None, help='Customize the traffic and sweep via a config file.')
+    ap.add_argument('--trace', dest='trace', type=str, default=None, help='Append a JSON line per REST call'
+                    ' (method, object/command, duration, bytes, outcome) to this file and print a summary'
+                    ' of the calls at exit.')
+    ap.add_argument('--mode', choices=['step', 'binary'], default=None, help='Step through the loads or binary'
+                    ' search for the highest passing load.')
+    ap.add_argument('-f', '--frame_size', dest='frame_sizes', type=int, default=[], action='append',
+                    help='Frame size to test. May be given multiple times.')
+    ap.add_argument('--load', dest='loads', type=float, default=[], action='append',
+                    help='With step mode, a load to test. May be given multiple times.')
+    ap.add_argument('--min_load', type=float, default=None)
+    ap.add_argument('--max_load', type=float, default=None)
+    ap.add_argument('--resolution', type=float, default=None, help='With binary mode, stop when the passing'
+                    ' and failing loads are this close.')
+    ap.add_argument('--load_unit', default=None, help='i.e. PERCENT_LINE_RATE or FRAMES_PER_SECOND.')
+    ap.add_argument('--trial_time', type=float, default=None, help='Seconds of traffic per trial.')
+    ap.add_argument('--settle_time', type=float, default=None, help='Seconds to wait after each trial before'
+                    ' reading the counters.')
+    ap.add_argument('--loss_threshold', type=float, default=None, help='Percent of frames a trial may lose'
+                    ' and still pass.')
+    ap.add_argument('--json', default=False, action='store_true', help='Write the results as JSON.')
+    ap.add_argument('--all', default=False, action='store_true', help='Write every trial, not just the'
+                    ' throughput of each frame size.')
+    args = ap.parse_args()
+
+    logging.basicConfig(level=args.loglevel.upper())
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    config = StcConfig()
+    if args.config:
+        with open(args.config) as fd:
+            config.apply_config(json.load(fd))
+
+    sweep_conf = {}
+    for k in ['mode', 'frame_sizes', 'loads', 'min_load', 'max_load', 'resolution', 'load_unit', 'trial_time',
+              'settle_time', 'loss_threshold']:
+        v = getattr(args, k)
+        if v is not None and v != []:
+            sweep_conf[k] = v
+    config.apply_config({StcSweep.config_key: sweep_conf})
+
+    try:
+        sess = StcSession(config=config, keep_open=False)
+        if args.trace:
+            trace_session(sess, args.trace)
+
+        with sess:
+            try:
+                sweep = StcSweep(sess)
+                summary = sweep.run()
+            except (StcStreamblockException, StcSweepException) as e:
+                log.error('Error running sweep: {}'.format(e))
+                exit(1)
+
+    except Exception as e:
+        log.critical('Critical Error: {}'.format(e))
+        raise(e)
+        exit(2)
+
+    rows = sweep.trials if args.all else summary
+    if args.json:
+        print(json.dumps(rows, indent=4, sort_keys=True))
+    else:
+        print(table(rows))
+
+    exit(0)
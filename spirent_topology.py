@@ -0,0 +1,78 @@
+#!/usr/bin/env python3 
+
+import logging
+import json
+import argparse 
+
+from stc_session import StcSession
+from stc_streamblock import StcStreamblockException
+from stc_config import StcConfig
+from stc_topology import StcTopology, StcTopologyException
+from stc_trace import trace_session
+
+log = logging.getLogger(__name__)
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Bring up a topology of many enclaves and flows with as few REST calls'
+                                 ' as possible and run traffic on it, or just print the REST call plan for it.')
+    ap.add_argument('-l', '--loglevel', choices=['all', 'debug', 'info', 'error', 'critical'],
+                    dest='loglevel', default='info')
+    ap.add_argument('-c', '--config', default=None, help='Config file for the session and the defaults of'
+                    ' every flow.')
+    ap.add_argument('--trace', dest='trace', type=str, default=None, help='Append a JSON line per REST call'
+                    ' (method, object/command, duration, bytes, outcome) to this file and print a summary'
+                    ' of the calls at exit.')
+    ap.add_argument('--plan_only', default=False, action='store_true', help='Print the REST call plan and its'
+                    ' estimated round trips and exit without connecting.')
+    ap.add_argument('--json', default=False, action='store_true', help='With --plan_only, print the plan as JSON.')
+    ap.add_argument('--no_bulk', default=False, action='store_true', help='With --plan_only, plan for a server'
+                    ' without the bulk API.')
+    ap.add_argument('-w', '--workers', type=int, default=8, help='How many independent calls to make at once.')
+    ap.add_argument('-t', '--time-in-seconds', type=int, default=5, dest='howlong', 
+                    help='How long to generate traffic for in seconds.')
+    ap.add_argument('topology', help='The topology (JSON) file. See stc_topology.py.')
+    args = ap.parse_args()
+
+    logging.basicConfig(level=args.loglevel.upper())
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    config = StcConfig()
+    if args.config:
+        with open(args.config) as fd:
+            config.apply_config(json.load(fd))
+
+    try:
+        with open(args.topology) as fd:
+            topology = StcTopology(json.load(fd))
+
+        sess = StcSession(config=config, keep_open=False)
+        plan = topology.compile(sess, bulk=False if args.no_bulk else None, workers=args.workers)
+    except StcTopologyException as e:
+        log.error('Bad topology: {}'.format(e))
+        exit(1)
+
+    if args.plan_only:
+        print(json.dumps(plan.to_dict(), indent=4, sort_keys=True) if args.json else plan)
+        exit(0)
+
+    log.info('Plan: {} flow(s), {} REST call(s), about {} round trip(s).'.format(
+        len(plan.configs), plan.calls(), plan.round_trips()))
+
+    if args.trace:
+        trace_session(sess, args.trace)
+
+    try:
+        with sess:
+            try:
+                profile = StcTopology.execute(plan, sess)
+                profile.run_timed(args.howlong)
+            except StcStreamblockException as e:
+                log.error('Error running traffic: {}'.format(e))
+                exit(1)
+
+    except Exception as e:
+        log.critical('Critical Error: {}'.format(e))
+        raise(e)
+        exit(2)
+
+    exit(0)
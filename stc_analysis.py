@@ -0,0 +1,300 @@
+import logging
+import json
+import os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+log = logging.getLogger(__name__)
+
+class StcAnalysisException(Exception):
+    pass
+
+def summary_path(statefile):
+    '''The analysis summary that goes with the given state file.'''
+    return os.path.abspath(statefile) + '.summary.json'
+
+class StcAnalysis:
+    '''
+    Post run analysis of traffic result samples (stc_results.StcResultSample), from an
+    StcResults buffer or from files written by StcResultExporter. The samples are held as one
+    NumPy array per column plus a key per sample for its (handle, result_type). Everything is
+    computed on whole arrays at once: the samples are sorted by key and time, so every stream's
+    samples are one contiguous run, and per stream values come from ufunc.reduceat() over the
+    runs and from indexing into them.
+
+    Counters are cumulative, so totals come from the first sample plus the sum of the deltas
+    between samples. A counter that goes down (the streamblock was recreated) is taken to have
+    restarted from zero. Rates are per sample interval.
+
+        analysis = StcAnalysis.load('soak.bin')
+        summary = analysis.summary()
+    '''
+
+    percentiles = [50, 95, 99]
+
+    # columns kept, and their dtype.
+    columns = [
+        ('time', 'f8'),
+        ('frames', 'u8'),
+        ('bytes', 'u8'),
+        ('frame_rate', 'f8'),
+        ('dropped', 'u8'),
+        ('latency_min', 'f8'),
+        ('latency_avg', 'f8'),
+        ('latency_max', 'f8'),
+        ('out_of_seq', 'u8'),
+    ]
+
+    def __init__(self, data, keys):
+        '''data is {column: array} with a "key" array indexing keys, a list of (handle, result_type).
+        Use the from_samples() and load() constructors rather than this.'''
+        if not numpy:
+            raise StcAnalysisException('StcAnalysis needs the numpy package. pip install numpy.')
+
+        key = numpy.asarray(data['key'], dtype='i8')
+        t = numpy.asarray(data['time'], dtype='f8')
+        order = numpy.lexsort((t, key))
+        self._key = key[order]
+        self._cols = {c: numpy.asarray(data[c], dtype=d)[order] for c, d in StcAnalysis.columns}
+        self._keys = [tuple(k) for k in keys]
+
+        # start of each key's run of samples, and the key of each run.
+        n = len(self._key)
+        self._starts = numpy.flatnonzero(numpy.r_[True, self._key[1:] != self._key[:-1]]) if n else numpy.array([], 'i8')
+        self._run_keys = self._key[self._starts]
+        self._first = numpy.zeros(n, dtype=bool)
+        self._first[self._starts] = True
+
+    def __len__(self):
+        return len(self._key)
+
+    @staticmethod
+    def _with_keys(handles, result_types, data):
+        # (handle, result_type) strings --> integer keys, without a Python loop over the samples.
+        names = numpy.char.add(numpy.char.add(numpy.asarray(handles, dtype=str), '\t'),
+                               numpy.asarray(result_types, dtype=str))
+        unique, data['key'] = numpy.unique(names, return_inverse=True)
+        return StcAnalysis(data, [tuple(str(u).split('\t', 1)) for u in unique])
+
+    @staticmethod
+    def from_samples(samples):
+        '''Analysis of an iterable of StcResultSample, i.e. an StcResults.buffer.'''
+        if not numpy:
+            raise StcAnalysisException('StcAnalysis needs the numpy package. pip install numpy.')
+
+        rows = list(samples)
+        fields = ['time', 'handle', 'result_type'] + [c for c, _ in StcAnalysis.columns if c != 'time']
+        cols = dict(zip(fields, zip(*rows))) if rows else {f: [] for f in fields}
+        data = {c: numpy.array(cols[c], dtype=d) for c, d in StcAnalysis.columns}
+        return StcAnalysis._with_keys(cols['handle'], cols['result_type'], data)
+
+    @staticmethod
+    def load(path, fmt=None):
+        '''Analysis of a file written by StcResultExporter. The format is taken from the
+        extension if not given.'''
+        if not numpy:
+            raise StcAnalysisException('StcAnalysis needs the numpy package. pip install numpy.')
+
+        fmt = fmt if fmt else os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt == 'bin':
+            with open(path + '.json') as fd:
+                meta = json.load(fd)
+            dtype = numpy.dtype([tuple(f) for f in meta['dtype']])
+            count = os.path.getsize(path) // dtype.itemsize     # ignore a partial record at the end.
+            records = numpy.memmap(path, dtype=dtype, mode='r', shape=(count,)) if count else numpy.zeros(0, dtype)
+            data = {name: records[name] for name in dtype.names if name in dict(StcAnalysis.columns)}
+            data['key'] = records['key']
+            return StcAnalysis(data, meta['keys'])
+
+        if fmt == 'csv':
+            dtype = [('time', 'f8'), ('handle', 'U128'), ('result_type', 'U64')] + \
+                [(c, d) for c, d in StcAnalysis.columns if c != 'time']
+            records = numpy.loadtxt(path, dtype=dtype, delimiter=',', skiprows=1, ndmin=1)
+            data = {c: records[c] for c, _ in StcAnalysis.columns}
+            return StcAnalysis._with_keys(records['handle'], records['result_type'], data)
+
+        if fmt == 'arrow':
+            if not pyarrow:
+                raise StcAnalysisException('Reading arrow files needs the pyarrow package. pip install pyarrow.')
+            table = pyarrow.ipc.open_stream(pyarrow.memory_map(path)).read_all()
+            data = {c: table.column(c).to_numpy() for c, _ in StcAnalysis.columns}
+            names = [table.column(c).cast(pyarrow.string()).to_numpy(zero_copy_only=False)
+                     for c in ['handle', 'result_type']]
+            return StcAnalysis._with_keys(names[0], names[1], data)
+
+        raise StcAnalysisException('Unknown results file format {} for {}. Use csv, bin, or arrow.'.format(fmt, path))
+
+    @staticmethod
+    def concat(analyses, names=None):
+        '''One analysis of the samples of all the given analyses, i.e. of several runs. A stream
+        (handle, result_type) in more than one of them is a different stream in each, so its
+        handle is labeled "<name>:<handle>" with the name of the analysis it came from, by
+        default "run<n>", n counting from 1.'''
+        names = names if names else ['run{}'.format(i + 1) for i in range(len(analyses))]
+        seen = {}
+        for a in analyses:
+            for k in a._keys:
+                seen[k] = seen.get(k, 0) + 1
+
+        keys = []
+        parts = []
+        for name, a in zip(names, analyses):
+            index = {}
+            for k in a._keys:
+                key = ('{}:{}'.format(name, k[0]), k[1]) if seen[k] > 1 else k
+                if key not in keys:
+                    keys.append(key)
+                index[k] = keys.index(key)
+            remap = numpy.array([index[k] for k in a._keys], dtype='i8')
+            parts.append((remap[a._key] if len(a._key) else a._key, a._cols))
+
+        data = {c: numpy.concatenate([p[c] for _, p in parts]) for c, _ in StcAnalysis.columns}
+        data['key'] = numpy.concatenate([k for k, _ in parts])
+        return StcAnalysis(data, keys)
+
+    def _deltas(self, col):
+        '''Per sample increase of a cumulative counter, 0 for the first sample of each stream.'''
+        values = self._cols[col].astype('f8')
+        d = numpy.r_[0.0, numpy.diff(values)]
+        d = numpy.where(d < 0, values, d)     # counter restarted.
+        d[self._first] = 0.0
+        return d
+
+    def _totals(self, col):
+        return self._cols[col][self._starts].astype('f8') + numpy.add.reduceat(self._deltas(col), self._starts) \
+            if len(self._starts) else numpy.zeros(0)
+
+    def _intervals(self):
+        '''Seconds since the previous sample of the same stream, 0 for the first.'''
+        dt = numpy.r_[0.0, numpy.diff(self._cols['time'])]
+        dt[self._first] = 0.0
+        return dt
+
+    def _grouped_percentiles(self, values, valid):
+        '''The percentiles of values[valid] per run of samples, as a (percentiles, runs) array,
+        NaN for runs without valid values. Linear interpolation, as numpy.percentile.'''
+        run = numpy.cumsum(self._first) - 1           # run index of every sample.
+        run, values = run[valid], values[valid]
+        order = numpy.lexsort((values, run))
+        run, values = run[order], values[order]
+        counts = numpy.bincount(run, minlength=len(self._starts))
+        starts = numpy.cumsum(counts) - counts
+        has = counts > 0
+        result = numpy.full((len(StcAnalysis.percentiles), len(self._starts)), numpy.nan)
+        for i, p in enumerate(StcAnalysis.percentiles):
+            pos = starts[has] + (counts[has] - 1) * p / 100.0
+            lo = numpy.floor(pos).astype('i8')
+            hi = numpy.ceil(pos).astype('i8')
+            result[i, has] = values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+        return result
+
+    def streams(self):
+        '''Return {(handle, result_type): {...}} with the totals, rates, and percentiles of each stream.'''
+        if not len(self):
+            return {}
+
+        starts = self._starts
+        ends = numpy.r_[starts[1:], len(self._key)] - 1
+        t = self._cols['time']
+        duration = t[ends] - t[starts]
+        frames, octets = self._totals('frames'), self._totals('bytes')
+        dropped, out_of_seq = self._totals('dropped'), self._totals('out_of_seq')
+
+        dt = self._intervals()
+        valid = dt > 0
+        df = self._deltas('frames')
+        fps = numpy.divide(df, dt, out=numpy.zeros_like(df), where=valid)
+        fps_pct = self._grouped_percentiles(fps, valid)
+        fps_min = numpy.minimum.reduceat(numpy.where(valid, fps, numpy.inf), starts)
+        fps_max = numpy.maximum.reduceat(numpy.where(valid, fps, -numpy.inf), starts)
+        sent = numpy.add.reduceat(df, starts)
+
+        # AvgLatency is the average since the stream started, so the average over one interval
+        # is the change in (average * frames) over the change in frames.
+        avg, rx = self._cols['latency_avg'], self._cols['frames'].astype('f8')
+        weighted = numpy.r_[0.0, numpy.diff(avg * rx)]
+        lat_valid = valid & (numpy.r_[0.0, numpy.diff(rx)] > 0)
+        lat = numpy.divide(weighted, df, out=numpy.zeros_like(weighted), where=lat_valid)
+        lat_pct = self._grouped_percentiles(lat, lat_valid)
+        lat_max = numpy.maximum.reduceat(self._cols['latency_max'], starts)
+
+        streams = {}
+        for i, k in enumerate(self._run_keys):
+            s = {
+                'samples': int(ends[i] - starts[i] + 1),
+                'start': float(t[starts[i]]),
+                'duration': float(duration[i]),
+                'frames': int(frames[i]),
+                'bytes': int(octets[i]),
+                'fps_avg': float(sent[i] / duration[i]) if duration[i] > 0 else None,
+                'fps_min': float(fps_min[i]) if numpy.isfinite(fps_min[i]) else None,
+                'fps_max': float(fps_max[i]) if numpy.isfinite(fps_max[i]) else None,
+            }
+            for j, p in enumerate(StcAnalysis.percentiles):
+                s['fps_p{}'.format(p)] = None if numpy.isnan(fps_pct[j, i]) else float(fps_pct[j, i])
+
+            if self._keys[k][1] == 'RxStreamResults':
+                s.update({
+                    'dropped': int(dropped[i]),
+                    'out_of_seq': int(out_of_seq[i]),
+                    'latency_avg': float(avg[ends[i]]),
+                    'latency_max': float(lat_max[i]),
+                })
+                for j, p in enumerate(StcAnalysis.percentiles):
+                    s['latency_p{}'.format(p)] = None if numpy.isnan(lat_pct[j, i]) else float(lat_pct[j, i])
+
+            streams[self._keys[k]] = s
+
+        return streams
+
+    def summary(self, state=None):
+        '''
+        Return the per flow (streamblock) summary: Tx and Rx totals, loss, throughput, Rx rate
+        and latency percentiles, and out of sequence frames, plus totals over all flows. If the
+        session state is given, each flow also gets the port its streamblock is on.
+        '''
+        streams = self.streams()
+        ports = {sb['handle']: sb.get('port') for sb in (state or {}).get('streamblocks', [])}
+        flows = {}
+        for (handle, rt), s in streams.items():
+            if rt not in ['TxStreamResults', 'RxStreamResults']:
+                continue
+
+            # handles of concat() runs are labeled with the run.
+            f = flows.setdefault(handle, {'port': ports.get(handle, ports.get(handle.rpartition(':')[2]))})
+            f['tx' if rt == 'TxStreamResults' else 'rx'] = s
+
+        totals = {'flows': len(flows), 'tx_frames': 0, 'rx_frames': 0, 'lost_frames': 0, 'rx_bytes': 0,
+                  'out_of_seq': 0}
+        for handle, f in flows.items():
+            tx, rx = f.get('tx', {}), f.get('rx', {})
+            if tx and rx:
+                f['lost_frames'] = tx['frames'] - rx['frames']
+                f['loss_pct'] = 100.0 * f['lost_frames'] / tx['frames'] if tx['frames'] else None
+                totals['tx_frames'] += tx['frames']
+                totals['lost_frames'] += f['lost_frames']
+            if rx:
+                f['rx_mbps'] = rx['bytes'] * 8 / rx['duration'] / 1e6 if rx['duration'] > 0 else None
+                totals['rx_frames'] += rx['frames']
+                totals['rx_bytes'] += rx['bytes']
+                totals['out_of_seq'] += rx['out_of_seq']
+
+        totals['loss_pct'] = 100.0 * totals['lost_frames'] / totals['tx_frames'] if totals['tx_frames'] else None
+        t = self._cols['time']
+        return {
+            'samples': len(self),
+            'start': float(t.min()) if len(t) else None,
+            'end': float(t.max()) if len(t) else None,
+            'flows': flows,
+            'totals': totals,
+        }
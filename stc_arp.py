@@ -0,0 +1,136 @@
+import logging
+import re
+from time import monotonic, sleep
+
+log = logging.getLogger(__name__)
+
+class StcArpException(Exception):
+    pass
+
+class StcArp:
+    '''
+    ARP (gateway MAC resolution) for a set of streamblocks. All streamblocks are started
+    with one ArpNDStart and checked with one ArpNDVerifyResolved. Streamblocks that are not
+    resolved yet are checked again, backing off between checks, and ARP is restarted for
+    just those, until they resolve or the timeout (or the caller's deadline) passes.
+
+    Resolved gateway MACs are cached per port in the session state. While the port stays
+    attached, a streamblock whose gateway is in the cache for its port skips ARP entirely.
+
+    Streamblocks are anything with handle, port_handle, and gateway, i.e. StcStreamblock.
+    '''
+
+    default_config = {
+        'timeout': 10,          # seconds to wait for all gateways to resolve.
+        'backoff': 0.25,        # seconds to wait before the first re-check. Doubled each time...
+        'max_backoff': 2,       # ...up to this.
+        'use_cache': True,      # skip ARP for gateways already resolved on the port.
+    }
+    config_key = 'arp'
+
+    _mac_re = re.compile(r'([0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5})')
+
+    def __init__(self, session, config=None):
+        conf = (config if config else session.config).data[StcArp.config_key]
+        self._session = session
+        self._timeout = conf['timeout']
+        self._backoff = conf['backoff']
+        self._max_backoff = conf['max_backoff']
+        self._use_cache = conf['use_cache']
+
+    def _cache(self):
+        return self._session.state.setdefault('arp_cache', {})
+
+    def cached(self, streamblock):
+        '''The cached gateway MAC for the streamblock, None if not cached.'''
+        return self._cache().get(streamblock.port_handle, {}).get(streamblock.gateway)
+
+    def _verify(self, handles):
+        '''Return the handles that are not resolved.'''
+        status = self._session.perform('ArpNDVerifyResolved', handlelist=' '.join(handles))
+        if not status:
+            raise StcArpException('Error when getting ARP response status.')
+
+        if status.get('PassFailState') == 'PASSED':
+            return []
+
+        # Use the unresolved list if the server gives one, else bisect the handles, so a few
+        # unresolved ones are found without a call per handle.
+        for k, v in status.items():
+            if k.lower().startswith('unresolved') and v:
+                return [h for h in handles if h in v.split()]
+
+        if len(handles) == 1:
+            return handles
+
+        half = len(handles) // 2
+        return self._verify(handles[:half]) + self._verify(handles[half:])
+
+    def _update_cache(self, streamblocks):
+        ports = []
+        for sb in streamblocks:
+            if sb.port_handle not in ports:
+                ports.append(sb.port_handle)
+
+        self._session.perform('ArpNdUpdateArpCache', handlelist=' '.join(ports))
+        for port in ports:
+            data = self._session.stc.get(self._session.arpcache(port), 'ArpCacheData')
+            entries = re.findall(r'{([^}]*)}', data) if '{' in data else [data]
+            port_cache = self._cache().setdefault(port, {})
+            for sb in [s for s in streamblocks if s.port_handle == port]:
+                mac = ''
+                for entry in entries:
+                    m = StcArp._mac_re.search(entry)
+                    if sb.gateway in entry.split() and m:
+                        mac = m.group(1)
+
+                # only MACs that were found are kept, so a gateway not in the ARP cache is ARP'd next time.
+                if mac:
+                    port_cache[sb.gateway] = mac
+                    log.info('{} gateway {} is at {}'.format(port, sb.gateway, mac))
+                else:
+                    port_cache.pop(sb.gateway, None)
+                    log.info('{} gateway {} is not in the ARP cache. Not caching it.'.format(port, sb.gateway))
+
+    def resolve(self, streamblocks, deadline=None):
+        '''Resolve the gateways of the given streamblocks. deadline, if given, is a time.monotonic()
+        time to give up by if it is sooner than the timeout. StcArpException raised if any
+        gateway does not resolve in time.'''
+        pending = streamblocks
+        if self._use_cache:
+            pending = [sb for sb in streamblocks if self.cached(sb) is None]
+            if len(pending) < len(streamblocks):
+                log.info('Skipping ARP for {} streamblock(s) with cached gateway MACs.'.format(
+                    len(streamblocks) - len(pending)))
+
+        if not pending:
+            return
+
+        end = monotonic() + self._timeout
+        end = min(end, deadline) if deadline else end
+        handles = [sb.handle for sb in pending]
+        backoff = self._backoff
+        log.info('Doing ARP to resolve gateway addresses.')
+        self._session.perform('ArpNDStart', handlelist=' '.join(handles))
+        while True:
+            unresolved = self._verify(handles)
+            if not unresolved:
+                break
+
+            wait = min(backoff, end - monotonic())
+            if wait <= 0:
+                raise StcArpException('ARP failed. Unresolved after {}s: {}'.format(
+                    self._timeout, ' '.join(unresolved)))
+
+            log.info('ARP unresolved for {}. Retrying in {:.2f}s.'.format(' '.join(unresolved), wait))
+            sleep(wait)
+            backoff = min(backoff * 2, self._max_backoff)
+            handles = unresolved
+            self._session.perform('ArpNDStart', handlelist=' '.join(handles))
+
+        if self._use_cache:
+            # the cache only saves time later, so failing to fill it is not an ARP failure.
+            try:
+                self._update_cache(pending)
+            except Exception as e:
+                log.warning('Unable to cache gateway MACs: {}'.format(e))
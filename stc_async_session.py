@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import json
+from getpass import getuser
+from random import choice
+from string import ascii_lowercase as lowercase
+from urllib.parse import quote
+
+from stc_session import StcSession, StcSessionException
+from stc_streamblock import StcStreamblock
+from stc_ethernetII import StcEthernetII
+from stc_ipv4 import StcIPv4
+from stc_port_map import StcPortMap
+from stc_lease import StcSessionLease
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+log = logging.getLogger(__name__)
+
+class AsyncStcSession:
+    '''
+    asyncio version of StcSession. Same config and state (state files are interchangeable)
+    and the same connect / reserve_ports / create_streamblock / perform / disconnect
+    lifecycle, but every call is a coroutine that talks to the STC REST API directly over
+    an aiohttp client. Use it to drive sessions on several chassis from one process at the
+    same time:
+
+        async with aiohttp.ClientSession() as http:
+            sessions = [AsyncStcSession(c, http=http) for c in configs]
+            await asyncio.gather(*[s.connect() for s in sessions])
+            await asyncio.gather(*[s.reserve_ports() for s in sessions])
+
+    Sessions given the same aiohttp.ClientSession share its pool of keep-alive connections.
+    Otherwise each session creates (and closes) its own.
+
+    Like StcSession, the session is leased (see StcSessionLease) on every connect and, while
+    connected, renewed from a background task, so one left open by a process that went away
+    can be reaped.
+    '''
+
+    def __init__(self, config, state=None, user=None, keep_open=True, http=None):
+        if not aiohttp:
+            raise StcSessionException('AsyncStcSession needs the aiohttp package. pip install aiohttp.')
+
+        self._config = config.data[StcSession.config_key]
+        self._stc_config = config
+        self._state = state if state else self._config  # seed state with initial config settings.
+        self._state['user'] = getuser() if not user else user
+        if 'sid' not in self._state:
+            self._state['sid'] = None
+
+        self._state['keep_open'] = keep_open
+        self._port_map = StcPortMap(config.data[StcPortMap.config_key]['map'], self._state['chassis_addr'],
+                                    self._state['slot'])
+
+        self._lease = StcSessionLease(self)
+        self._beat = None      # the lease heartbeat task.
+
+        self._http = http
+        self._own_http = False
+        self._url = 'http://{}:{}/stcapi'.format(self._config['stc_server_addr'], self._config['stc_server_port'])
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type or exc_val or exc_tb:
+            log.warning('exception caught in AsyncStcSession context, disconnecting: {}, {}, {}'.format(
+                exc_type, exc_val, exc_tb))
+
+        await self.disconnect()
+        return False
+
+    @property
+    def project_handle(self):
+        return self._state.get('project_handle')
+
+    @property
+    def config(self):
+        return self._stc_config
+
+    @property
+    def state(self):
+        return self._state
+
+    async def _request(self, method, container, resource=None, params=None, query=None, session=True):
+        '''Make one REST call and return the decoded JSON response (or None).'''
+        url = '{}/{}'.format(self._url, container)
+        if resource:
+            url += '/' + quote(resource, safe=':')
+        if query:
+            url += '?' + '&'.join(query)
+
+        headers = {'Accept': 'application/json'}
+        if session:
+            if not self._state['sid']:
+                raise StcSessionException('session does not exist.')
+            headers['X-STC-API-Session'] = self._state['sid']
+
+        data = {k: str(v) for k, v in params.items()} if params else None
+        async with self._http.request(method, url, data=data, headers=headers) as rsp:
+            body = await rsp.read()
+            try:
+                result = json.loads(body) if body else None
+            except ValueError:
+                result = body.decode(errors='replace')
+
+            if rsp.status >= 300:
+                msg = result.get('message', result) if isinstance(result, dict) else result
+                raise StcSessionException('{} {} failed: {} {}'.format(method, url, rsp.status, msg))
+
+            return result
+
+    async def connect(self):
+        if not self._http:
+            self._http = aiohttp.ClientSession()
+            self._own_http = True
+
+        log.info('Connecting to: {}'.format(self._url))
+        if self._state['sid']:
+            log.info('Joining existing session {}'.format(self._state['sid']))
+            await self._request('GET', 'objects', 'system1', query=['version', 'name'])
+        else:
+            sid = ''.join([choice(lowercase) for i in range(10)])
+            log.info('Creating new session, "{}" for user {}.'.format(sid, self._state['user']))
+            data = await self._request('POST', 'sessions', params={'userid': self._state['user'],
+                                                                   'sessionname': sid}, session=False)
+            self._state['sid'] = data['session_id']
+
+        # as StcSession.connect(): nothing to apply here, and only chassis the session has not
+        # connected to yet are connected.
+        connected = self._state.setdefault('chassis_connected', [])
+        chassis = [c for c in self._port_map.chassis() if c not in connected]
+        if not chassis:
+            log.info('Session already connected to chassis at {}'.format(' '.join(connected)))
+        else:
+            log.info('Connecting to chassis at {}'.format(' '.join(chassis)))
+            if len(chassis) == 1:
+                await self._request('PUT', 'connections', chassis[0])
+            else:
+                params = {c: 'true' for c in chassis}
+                params['action'] = 'connect'
+                await self._request('POST', 'connections', params=params)
+            connected += chassis
+            log.info('Connected.')
+
+        if not self.project_handle:
+            log.info('creating new project.')
+            data = await self._request('POST', 'objects', params={'object_type': 'project'})
+            self._state['project_handle'] = data['handle']
+
+        if self._lease.enabled:
+            await self.renew_lease()
+            if self._lease.heartbeat and not self._beat:
+                self._beat = asyncio.ensure_future(self._heartbeat())
+
+    async def renew_lease(self):
+        '''Push the session's lease out to ttl seconds from now, as StcSessionLease.renew().
+        Returns the lease.'''
+        held = self._state.get('lease') or {}
+        lease = self._lease.fresh()
+        name = StcSessionLease.encode(lease)
+        if held.get('handle'):
+            await self._request('PUT', 'objects', held['handle'], params={'Name': name})
+            lease['handle'] = held['handle']
+        else:
+            data = await self._request('POST', 'objects', params={
+                'object_type': StcSessionLease.lease_type, 'under': self.project_handle, 'Name': name})
+            lease['handle'] = data['handle']
+        self._state['lease'] = lease
+        log.debug('Renewed lease on session {} until {:.0f}'.format(self._state['sid'], lease['expires']))
+        return lease
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self._lease.heartbeat)
+            if not self._lease.due():
+                continue
+
+            try:
+                await self.renew_lease()
+            except Exception as e:
+                log.warning('Unable to renew the session lease: {}'.format(e))
+
+    async def disconnect(self, timeout=30):
+        if self._beat:
+            self._beat.cancel()
+            self._beat = None
+
+        try:
+            if self._state['keep_open']:
+                log.info('Keeping session open...')
+                return
+
+            if self._state.get('ports'):
+                await self.detach_ports()
+
+            log.info('Deleting project {}.'.format(self.project_handle))
+            await self.delete(self.project_handle)
+            del self._state['project_handle']
+            for k in ['chassis_connected', 'dirty', 'port_children', 'arp_cache', 'generator_durations',
+                      'frame_cache', 'imix', 'lease']:
+                self._state.pop(k, None)
+
+            sid = self._state['sid']
+            log.info('Ending session.')
+            await self._request('DELETE', 'sessions', sid, session=False)
+            self._state['sid'] = None
+
+            # like StcHttp.end_session(), wait for the session to go away.
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while sid in (await self._request('GET', 'sessions', session=False) or []):
+                if loop.time() > deadline:
+                    raise StcSessionException('timeout waiting for session {} to end.'.format(sid))
+                await asyncio.sleep(1)
+        finally:
+            if self._own_http:
+                await self._http.close()
+                self._http = None
+                self._own_http = False
+
+    def keep_open(self, val=True):
+        self._state['keep_open'] = val
+
+    def mark_dirty(self):
+        '''Note that the session has config changes that have not been applied yet.'''
+        self._state['dirty'] = True
+
+    async def apply(self):
+        '''Send pending config changes to the chassis. Does nothing (and makes no REST call)
+        if nothing has changed since the last apply.'''
+        if not self._state.get('dirty'):
+            log.debug('Nothing to apply.')
+            return
+
+        await self._request('PUT', 'apply')
+        self._state['dirty'] = False
+
+    async def get(self, handle, *args):
+        return await self._request('GET', 'objects', handle, query=args)
+
+    async def config_obj(self, handle, **kwargs):
+        await self._request('PUT', 'objects', handle, params=kwargs)
+        self.mark_dirty()
+
+    async def delete(self, handle):
+        await self._request('DELETE', 'objects', handle)
+        self.mark_dirty()
+
+    async def create_obj(self, obj, under, attributes=None, **kwargs):
+        params = dict(attributes) if attributes else {}
+        params.update(kwargs)
+        params['object_type'] = obj
+        if under:
+            params['under'] = under
+
+        data = await self._request('POST', 'objects', params=params)
+        h = data['handle']
+        self.mark_dirty()
+        self._state.setdefault('obj_handles', []).append(h)
+        return h
+
+    async def perform(self, command, params=None, **kwargs):
+        params = dict(params) if params else {}
+        params.update(kwargs)
+        params['command'] = command
+        log.info('performing {}({})'.format(command, params))
+        data = await self._request('POST', 'perform', params=params)
+        log.debug('result: {}'.format(json.dumps(data, indent=4, sort_keys=True)))
+        return data
+
+    def port_location(self, addr):
+        '''Return the chassis port location that an IP address maps to (see StcPortMap).'''
+        return self._port_map.location(addr)
+
+    async def reserve_ports(self, addrs=None):
+        '''Reserve the ports that map to the given addresses, by default the source and destination
+        configurations. New ports are created concurrently and attached with one AttachPorts per
+        chassis, all chassis at once.
+        Returns the port handles in the order of the addresses given.'''
+        if not addrs:
+            addrs = [self._stc_config.data[StcIPv4.config_key]['sourceAddr'],
+                     self._stc_config.data[StcIPv4.config_key]['destAddr']]
+
+        locations = self._state.setdefault('port_locations', {})
+        new_locations = []
+        for location in [self.port_location(a) for a in addrs]:
+            if location not in locations and location not in new_locations:
+                new_locations.append(location)
+
+        if new_locations:
+            new_handles = await asyncio.gather(*[
+                self._request('POST', 'objects', params={'object_type': 'port', 'under': self.project_handle,
+                                                         'location': l})
+                for l in new_locations])
+            new_handles = [d['handle'] for d in new_handles]
+            locations.update(zip(new_locations, new_handles))
+            self.mark_dirty()
+
+            by_chassis = {}
+            for l, h in zip(new_locations, new_handles):
+                by_chassis.setdefault(StcPortMap.chassis_of(l), []).append(h)
+            log.info('Attaching to ports {}'.format(' '.join(new_handles)))
+            await asyncio.gather(*[self.perform('AttachPorts', portList=' '.join(handles))
+                                   for handles in by_chassis.values()])
+            self._state.setdefault('ports', [])
+            self._state['ports'] += new_handles
+
+        return [locations[self.port_location(a)] for a in addrs]
+
+    async def create_streamblock(self, port, config=None):
+        '''Create a streamblock with its EthernetII and IPv4 PDUs on the given port. Returns the
+        streamblock handle. The state entry is the one StcSession.create_streamblock() and
+        StcStreamblock write, so StcSession can reconfigure and stop the streamblock later.'''
+        config = config if config else self._stc_config
+        kwargs = config.data[StcStreamblock.config_key]
+        ipv4 = config.data[StcIPv4.config_key]
+        handle = await self.create_obj('streamBlock', port, kwargs)
+        # PDUs go in the frame in creation order, so these can not be done concurrently. 
+        # GTL - see StcStreamblock.create_ethernetII() on why the EthernetII config is not given.
+        eth = await self.create_obj('Ethernet:EthernetII', handle)
+        ip = await self.create_obj('ipv4:IPv4', handle, ipv4)
+        self._state.setdefault('streamblocks', []).append({
+            'handle': handle, 'port': port, 'running': False,
+            'pdus': {StcEthernetII.config_key: eth, StcIPv4.config_key: ip},
+            'config': {StcStreamblock.config_key: dict(kwargs), StcEthernetII.config_key: {},
+                       StcIPv4.config_key: dict(ipv4)},
+        })
+        return handle
+
+    async def destroy_streamblocks(self):
+        # streamblocks kept for reuse (see StcFrameCache) go with the rest.
+        await asyncio.gather(*[self.delete(sb['handle']) for sb in self._state.pop('frame_cache', [])])
+        if not self._state.get('streamblocks'):
+            return
+
+        handles = [sb['handle'] for sb in self._state['streamblocks']]
+        await self.perform('StreamBlockStop', streamblocklist=' '.join(handles))
+        await asyncio.gather(*[self.delete(h) for h in handles])
+        del self._state['streamblocks']
+
+    async def detach_ports(self):
+        if not self._state.get('ports'):
+            log.info('Attempt to detech from ports when we are not attached to any. Ignoring.')
+            return
+
+        ports = ' '.join(self._state['ports'])
+        log.info('Detaching from ports: {}'.format(ports))
+        await self.perform('DetachPorts', portlist=ports)
+        await asyncio.gather(*[self.delete(p) for p in self._state['ports']])
+        del self._state['ports']
+        for k in ['port_locations', 'port_children', 'arp_cache', 'generator_durations', 'frame_cache',
+                  'port_leases']:
+            self._state.pop(k, None)
+
+    def save_and_write_session(self, filehandle):
+        json.dump(self._state, filehandle, indent=4, sort_keys=True)
@@ -0,0 +1,249 @@
+import logging
+import json
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from io import StringIO
+from math import ceil
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+
+from stc_session import StcSession
+from stc_profile import StcTrafficProfile
+from stc_commands import run_command
+
+log = logging.getLogger(__name__)
+
+class StcBenchmarkException(Exception):
+    pass
+
+def percentile(values, p):
+    '''Nearest rank percentile of the values, None if there are none.'''
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = int(ceil(p / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+class StcCallRecorder:
+    '''
+    Record every HTTP request sent through the requests library (which is what stcrestclient
+    uses) while active, grouped by the current phase. For each request it keeps the method,
+    the /stcapi container, bytes sent and received, and how long it took.
+    '''
+
+    def __init__(self):
+        self._phase = None
+        self._calls = {}     # phase --> [(method, container, sent, received, seconds), ...]
+        self._walls = {}     # phase --> [seconds, ...]
+        self._send = None
+
+    def __enter__(self):
+        import requests
+        recorder = self
+        self._send = send = requests.Session.send
+
+        def _send(session, request, **kwargs):
+            start = monotonic()
+            rsp = send(session, request, **kwargs)
+            recorder._record(request, rsp, monotonic() - start)
+            return rsp
+
+        requests.Session.send = _send
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        import requests
+        requests.Session.send = self._send
+        return False
+
+    def _record(self, request, rsp, seconds):
+        if not self._phase:
+            return
+
+        body = request.body if request.body else b''
+        parts = urlsplit(request.url).path.strip('/').split('/')
+        container = parts[1] if len(parts) > 1 else ''
+        self._calls[self._phase].append((request.method, container, len(body), len(rsp.content), seconds))
+
+    @contextmanager
+    def phase(self, name):
+        self._calls.setdefault(name, [])
+        self._walls.setdefault(name, [])
+        self._phase = name
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self._walls[name].append(monotonic() - start)
+            self._phase = None
+
+    def report(self, iterations):
+        '''Return {phase: stats} with per iteration call counts and bytes, and p50/p99 of the
+        per call latency and of the phase wall time, in milliseconds.'''
+        report = {}
+        for name, calls in self._calls.items():
+            latencies = [c[4] * 1000 for c in calls]
+            walls = [w * 1000 for w in self._walls[name]]
+            by_call = {}
+            for c in calls:
+                key = '{} {}'.format(c[0], c[1])
+                by_call[key] = by_call.get(key, 0) + 1
+
+            report[name] = {
+                'calls': len(calls) / iterations,
+                'calls_by_type': {k: v / iterations for k, v in sorted(by_call.items())},
+                'bytes_sent': sum([c[2] for c in calls]) / iterations,
+                'bytes_received': sum([c[3] for c in calls]) / iterations,
+                'latency_ms': {'p50': percentile(latencies, 50), 'p99': percentile(latencies, 99)},
+                'wall_ms': {'p50': percentile(walls, 50), 'p99': percentile(walls, 99)},
+            }
+
+        return report
+
+class StcBenchmark:
+    '''
+    Run the control plane lifecycles against an STC REST server (real or stc_emulator.py)
+    and report REST round trips, bytes, and latency per lifecycle phase.
+
+    gen_traffic: the gen_traffic.py lifecycle in one session object, split into the connect,
+        reserve_ports, create_streamblock, start_traffic, stop_traffic, and disconnect phases.
+    spirent_session: the "create traffic_start traffic_stop destroy" sequence of
+        spirent_session.py, each command run as its own invocation would (load the state,
+        connect, run the command, write the state), one phase per command.
+    '''
+
+    scenarios = ['gen_traffic', 'spirent_session']
+
+    def __init__(self, config, iterations=5, traffic_time=0):
+        self._config = config
+        self._iterations = iterations
+        self._traffic_time = traffic_time
+
+    def _gen_traffic(self, rec):
+        sess = StcSession(config=self._config.copy(), keep_open=False)
+        with rec.phase('connect'):
+            sess.connect()
+        with rec.phase('reserve_ports'):
+            sess.reserve_ports()
+        profile = StcTrafficProfile(sess)
+        with rec.phase('create_streamblock'):
+            profile.create()
+        with rec.phase('start_traffic'):
+            profile.start_traffic()
+        sleep(self._traffic_time)
+        with rec.phase('stop_traffic'):
+            profile.stop_traffic()
+        with rec.phase('disconnect'):
+            sess.disconnect()
+
+    def _spirent_session(self, rec):
+        state = None
+        for command in ['create', 'traffic_start', 'traffic_stop', 'destroy']:
+            with rec.phase(command):
+                with StcSession(config=self._config.copy(), state=state) as session:
+                    run_command(session, command)
+                    # like the script, pass the state forward through the state file format.
+                    fd = StringIO()
+                    session.save_and_write_session(fd)
+                    state = json.loads(fd.getvalue())
+
+    def run(self, scenarios=None):
+        scenarios = scenarios if scenarios else StcBenchmark.scenarios
+        sc = self._config.data[StcSession.config_key]
+        report = {
+            'endpoint': '{}:{}'.format(sc['stc_server_addr'], sc['stc_server_port']),
+            'iterations': self._iterations,
+            'scenarios': {},
+        }
+        for scenario in scenarios:
+            if scenario not in StcBenchmark.scenarios:
+                raise StcBenchmarkException('Unknown scenario {}'.format(scenario))
+
+            log.info('Running {} x {}'.format(scenario, self._iterations))
+            with StcCallRecorder() as rec:
+                start = monotonic()
+                for i in range(self._iterations):
+                    getattr(self, '_{}'.format(scenario))(rec)
+                total = monotonic() - start
+
+            phases = rec.report(self._iterations)
+            report['scenarios'][scenario] = {
+                'phases': phases,
+                'calls': sum([p['calls'] for p in phases.values()]),
+                'wall_ms_per_iteration': total * 1000 / self._iterations,
+            }
+
+        return report
+
+class StcStartupBenchmark:
+    '''
+    Time how long the scripts take to start when they do not talk to the STC: writing configs,
+    printing help, and argument errors. Each command is run in a new interpreter, as the test
+    harness runs them, and its wall time is reported less that of an interpreter that does
+    nothing. Each command is also run once with -X importtime to list the slow to import
+    modules (the REST client, requests, numpy, pyarrow, ...) it imported, which should be none.
+    '''
+
+    # name --> script and its arguments.
+    commands = {
+        'import_config': ['-c', 'from stc_config import StcConfig; StcConfig()'],
+        'spirent_generate_config': ['spirent_generate_config.py', '-s', '10.0.0.1', '-d', '10.0.1.1'],
+        'gen_traffic_generate_config': ['gen_traffic.py', '--generate_config'],
+        'spirent_session_help': ['spirent_session.py', '-h'],
+        'spirent_session_bad_args': ['spirent_session.py', '-s', 'x.state', 'no_such_command'],
+    }
+
+    # top level packages that must only be imported once a session connects (or results are analyzed).
+    slow_modules = ['requests', 'urllib3', 'stcrestclient', 'aiohttp', 'numpy', 'pyarrow']
+
+    def __init__(self, iterations=10):
+        self._iterations = iterations
+        self._dir = os.path.dirname(os.path.abspath(__file__))
+
+    def _run(self, args, importtime=False):
+        argv = [sys.executable] + (['-X', 'importtime'] if importtime else [])
+        argv += ([os.path.join(self._dir, args[0])] + args[1:]) if args[0].endswith('.py') else args
+        start = monotonic()
+        p = subprocess.run(argv, cwd=self._dir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                           universal_newlines=True)
+        return monotonic() - start, p.stderr
+
+    def slow_imports(self, args):
+        '''The slow_modules the command imports.'''
+        _, err = self._run(args, importtime=True)
+        found = []
+        for line in err.splitlines():
+            if line.startswith('import time:') and line.count('|') == 2:
+                module = line.split('|')[2].strip().split('.')[0]
+                if module in StcStartupBenchmark.slow_modules and module not in found:
+                    found.append(module)
+
+        return found
+
+    def run(self, names=None):
+        names = names if names else list(StcStartupBenchmark.commands.keys())
+        for name in names:
+            if name not in StcStartupBenchmark.commands:
+                raise StcBenchmarkException('Unknown startup command {}'.format(name))
+
+        base = [self._run(['-c', 'pass'])[0] * 1000 for i in range(self._iterations)]
+        report = {
+            'iterations': self._iterations,
+            'interpreter_ms': {'p50': percentile(base, 50), 'p99': percentile(base, 99)},
+            'commands': {},
+        }
+        for name in names:
+            args = StcStartupBenchmark.commands[name]
+            log.info('Timing {} x {}'.format(name, self._iterations))
+            walls = [self._run(args)[0] * 1000 for i in range(self._iterations)]
+            startup = [w - report['interpreter_ms']['p50'] for w in walls]
+            report['commands'][name] = {
+                'wall_ms': {'p50': percentile(walls, 50), 'p99': percentile(walls, 99)},
+                'startup_ms': {'p50': percentile(startup, 50), 'p99': percentile(startup, 99)},
+                'slow_imports': self.slow_imports(args),
+            }
+
+        return report
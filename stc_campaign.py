@@ -0,0 +1,242 @@
+import logging
+from time import monotonic, sleep, time
+
+from stc_ipv4 import StcIPv4
+from stc_profile import StcTrafficProfile
+from stc_results import StcResults
+from stc_export import StcResultExporter
+from stc_frame_cache import StcFrameCache
+from stc_port_pool import StcPortPool
+
+log = logging.getLogger(__name__)
+
+class StcCampaignException(Exception):
+    pass
+
+class StcExperiment:
+    '''One queued run of a campaign: a config (StcConfig, the campaign's with the experiment's
+    overrides applied), how many seconds it sends traffic, and where its results go.'''
+    def __init__(self, name, config, duration, results=None):
+        self.name = name
+        self.config = config
+        self.duration = duration
+        self.results = results      # path to export the experiment's samples to.
+        self.status = 'queued'      # queued, running, settling, done, failed, or cancelled.
+        self.configs = []           # StcConfig of each flow.
+        self.locations = set()      # the chassis port locations of the flows.
+        self.profile = None
+        self.exporter = None
+        self.error = None
+        self.started = None         # time.time()
+        self.finished = None
+        self.end = None             # time.monotonic() time its traffic ends...
+        self.settled = None         # ...and that its counters are read.
+        self.tx_frames = None
+        self.rx_frames = None
+        self._baseline = {}
+
+    def report(self):
+        r = {
+            'name': self.name,
+            'status': self.status,
+            'duration': self.duration,
+            'ports': sorted(self.locations),
+            'started': self.started,
+            'finished': self.finished,
+            'results': self.exporter.path if self.exporter else None,
+        }
+        if self.tx_frames is not None:
+            r.update({'tx_frames': self.tx_frames, 'rx_frames': self.rx_frames,
+                      'lost_frames': self.tx_frames - self.rx_frames})
+        if self.error:
+            r['error'] = self.error
+
+        return r
+
+class StcCampaign:
+    '''
+    A queue of experiments run in one session, several at once where they do not share chassis
+    ports. Each experiment is a config on top of the campaign's (its own flows, loads, frame
+    sizes, ...), a duration, and a file for its results:
+
+        "campaign": {
+            "experiments": [
+                {"name": "a", "duration": 60, "results": "a.csv", "config": {"traffic_profile": {"flows": [...]}}},
+                {"name": "b", "duration": 30, "results": "b.bin", "config": {"ipv4": {...}}}
+            ]
+        }
+
+    Experiments are started in queue order whenever all the ports their flows map to are free
+    (and fewer than max_parallel are running), so a short experiment behind a blocked one fills
+    in the idle ports rather than waiting its turn. The ports are leased from the session's
+    StcPortPool, which is always enabled here, so they stay attached from one experiment to the
+    next, and the streamblocks of finished experiments are kept in the StcFrameCache for the
+    next experiment with the same flows.
+
+    Each experiment's traffic is timed by the chassis (see StcTrafficProfile.start_timed()).
+    One StcResults subscription covers the whole campaign; the samples of each experiment's
+    streamblocks go to its own StcResultExporter, "results" or, if not given, the "export"
+    section of its config. The port map is the session's; experiments can not change it.
+    '''
+
+    default_config = {
+        'experiments': [],    # {name, duration, results, config} to run, in order.
+        'max_parallel': 0,    # most experiments to run at once. 0 for no limit but the ports.
+        'settle_time': 2,     # seconds to wait after an experiment's traffic stops before reading its counters.
+        'timeout': 60,        # seconds past its end that an experiment's generators may still be running.
+    }
+    config_key = 'campaign'
+
+    def __init__(self, session, experiments=None, config=None):
+        self._stc_config = config if config else session.config
+        self._conf = self._stc_config.data[StcCampaign.config_key]
+        self._session = session
+        # the experiments' traffic profiles lease their ports from the pool, enabled here
+        # whatever the session's config says.
+        self._pool = StcPortPool(session, config=session.config.copy({StcPortPool.config_key: {'enabled': True}}))
+        self.experiments = []
+        for e in (experiments if experiments is not None else self._conf['experiments']):
+            self.add(e)
+
+    def add(self, experiment):
+        '''Queue an experiment, a dict in the "experiments" format. Returns its StcExperiment.
+        StcPortMapException is raised if its flows do not map to ports.'''
+        if 'duration' not in experiment:
+            raise StcCampaignException('Experiment {} has no duration.'.format(experiment))
+
+        name = experiment.get('name', 'experiment{}'.format(len(self.experiments) + 1))
+        if name in [e.name for e in self.experiments]:
+            raise StcCampaignException('There is already an experiment named {}.'.format(name))
+
+        exp = StcExperiment(name, self._stc_config.copy(experiment.get('config')), float(experiment['duration']),
+                            experiment.get('results'))
+        exp.configs = StcTrafficProfile(self._session).flow_configs(config=exp.config)
+        for config in exp.configs:
+            ipv4 = config.data[StcIPv4.config_key]
+            exp.locations |= {self._session.port_location(ipv4['sourceAddr']),
+                              self._session.port_location(ipv4['destAddr'])}
+
+        self.experiments.append(exp)
+        return exp
+
+    def _start(self, exp, results):
+        exp.status = 'running'
+        exp.started = time()
+        log.info('Starting experiment {} on {} for {}s.'.format(exp.name, ' '.join(sorted(exp.locations)),
+                                                               exp.duration))
+        exp.profile = StcTrafficProfile(self._session)
+        exp.profile.create(exp.configs, owner=exp.name, exclusive=False, pool=self._pool)
+        summary = results.summary()
+        exp._baseline = {h: summary.get(h, {}) for h in exp.profile.handles}
+        exp.exporter = (StcResultExporter(exp.results) if exp.results else
+                        StcResultExporter.from_config(exp.config))
+        exp.end = exp.profile.start_timed(exp.duration)
+
+    def _stop(self, exp):
+        log.info('Experiment {} traffic done.'.format(exp.name))
+        exp.profile.wait_timed(exp.end, timeout=self._conf['timeout'])
+        exp.status = 'settling'
+        exp.settled = monotonic() + self._conf['settle_time']
+
+    def _finish(self, exp, results, status='done'):
+        '''Record the experiment's counters and return its ports and streamblocks.'''
+        summary = results.summary()
+        tx = rx = 0
+        if exp.profile:
+            for h in exp.profile.handles:
+                s, base = summary.get(h, {}), exp._baseline.get(h, {})
+                tx += s.get('tx_frames', 0) - base.get('tx_frames', 0)
+                rx += s.get('rx_frames', 0) - base.get('rx_frames', 0)
+
+            StcFrameCache(self._session).retire([sb.state for sb in exp.profile.streamblocks])
+            exp.tx_frames, exp.rx_frames = tx, rx
+
+        self._pool.release(owner=exp.name)
+        if exp.exporter:
+            exp.exporter.close()
+
+        exp.status = status
+        exp.finished = time()
+        log.info('Experiment {} {}: tx {} rx {}'.format(exp.name, status, tx, rx))
+
+    def _route(self, samples):
+        '''StcResults hook: pass each running experiment the samples of its streamblocks.'''
+        for exp in self.experiments:
+            if exp.exporter and exp.status in ['running', 'settling']:
+                handles = exp.profile.handles
+                mine = [s for s in samples if s.handle in handles]
+                if mine:
+                    exp.exporter(mine)
+
+    def run(self, stop=None):
+        '''
+        Run the queued experiments. If the stop threading.Event is set, the running experiments
+        are stopped and the rest cancelled. Returns the report of each experiment, in queue order,
+        with its tx and rx frame counts.
+        '''
+        with StcResults(self._session, config=self._stc_config) as results:
+            results.add_hook(self._route)
+            try:
+                self._run(results, stop)
+            finally:
+                for exp in [e for e in self.experiments if e.status in ['running', 'settling']]:
+                    if exp.status == 'running':
+                        exp.profile.stop_traffic()
+                    self._finish(exp, results, status='cancelled')
+
+        for exp in [e for e in self.experiments if e.status == 'queued']:
+            exp.status = 'cancelled'
+
+        return self.report()
+
+    def _run(self, results, stop):
+        while True:
+            active = [e for e in self.experiments if e.status in ['running', 'settling']]
+            busy = set()
+            for exp in active:
+                busy |= exp.locations
+
+            for exp in [e for e in self.experiments if e.status == 'queued']:
+                if stop is not None and stop.is_set():
+                    return
+                if self._conf['max_parallel'] and len(active) >= self._conf['max_parallel']:
+                    break
+                if exp.locations & busy:
+                    continue
+
+                try:
+                    self._start(exp, results)
+                except Exception as e:
+                    log.error('Experiment {} failed to start: {}'.format(exp.name, e))
+                    exp.error = str(e)
+                    self._finish(exp, results, status='failed')
+                    continue
+
+                active.append(exp)
+                busy |= exp.locations
+
+            if not active:
+                return
+
+            # sleep until the next poll or until an experiment ends, whichever comes first.
+            self._pool.renew([p for e in active for p in e.profile.ports])
+            now = monotonic()
+            wake = min([e.end if e.status == 'running' else e.settled for e in active] +
+                       [now + results.interval])
+            if stop is not None:
+                if stop.wait(max(0, wake - now)):
+                    return
+            elif wake > now:
+                sleep(wake - now)
+
+            results.poll()
+            now = monotonic()
+            for exp in active:
+                if exp.status == 'running' and exp.end <= now:
+                    self._stop(exp)
+                elif exp.status == 'settling' and exp.settled <= now:
+                    self._finish(exp, results)
+
+    def report(self):
+        '''The report of each experiment, in queue order.'''
+        return [exp.report() for exp in self.experiments]
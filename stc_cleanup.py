@@ -0,0 +1,191 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from time import monotonic, time
+
+from stc_lease import StcSessionLease
+
+log = logging.getLogger(__name__)
+
+class StcSessionCleaner:
+    '''
+    End (possibly stale) sessions on an STC REST server. Sessions are ended concurrently by a
+    bounded pool of workers, each with its own REST client. Before a session is ended, its
+    attached ports are released with DetachPorts so they are free for the next user even if
+    ending the session is slow.
+
+    Sessions can be picked by user, by session name (a shell style pattern), and by age. STC
+    session IDs are "<session name> - <user>". The age comes from the server's session info;
+    sessions the server does not give a start time for never match an age filter.
+
+    With expired, only sessions whose lease (see stc_lease.py) ran out more than grace seconds
+    ago are picked: those whose client went away without ending them. Sessions without a lease
+    are never picked, as there is no telling if they are still in use, and the lease is read
+    again just before a session is ended, in case it was renewed in the meantime.
+    '''
+
+    # session info keys that may hold the session start time (seconds since the epoch)...
+    start_keys = ['started', 'start_time', 'created']
+    # ...or how long it has been up (seconds).
+    uptime_keys = ['up_time', 'uptime']
+
+    def __init__(self, addr, port, workers=8, users=None, name=None, older_than=None, detach=True,
+                 timeout=30, expired=False, grace=60):
+        self._addr = addr
+        self._port = port
+        self._workers = workers
+        self._users = users
+        self._name = name
+        self._older_than = older_than
+        self._detach = detach
+        self._timeout = timeout
+        self._expired = expired
+        self._grace = grace
+
+    def _client(self):
+        from stc_http import StcKeepAliveHttp
+        return StcKeepAliveHttp(self._addr, port=self._port)
+
+    @staticmethod
+    def split_sid(sid):
+        '''Return (session name, user) of a session ID.'''
+        name, sep, user = sid.rpartition(' - ')
+        return (name, user) if sep else (sid, '')
+
+    def _age(self, sid):
+        stc = self._client()
+        try:
+            info = stc.session_info(sid)
+        except Exception as e:
+            log.warning('Unable to get info for session {}: {}'.format(sid, e))
+            return None
+        finally:
+            stc.close()
+
+        info = {k.lower(): v for k, v in info.items()} if isinstance(info, dict) else {}
+        for k in StcSessionCleaner.start_keys:
+            if k in info:
+                return time() - float(info[k])
+        for k in StcSessionCleaner.uptime_keys:
+            if k in info:
+                return float(info[k])
+
+        return None
+
+    @staticmethod
+    def _read_lease(stc):
+        '''The lease of the session the client has joined, from its project(s). None if it has none.'''
+        leases = []
+        for project in stc.get('system1', 'children-project').split():
+            for h in stc.get(project, 'children-{}'.format(StcSessionLease.lease_type.lower())).split():
+                lease = StcSessionLease.decode(stc.get(h, 'Name'))
+                if lease:
+                    leases.append(lease)
+
+        return max(leases, key=lambda l: l['expires']) if leases else None
+
+    def _lease(self, sid):
+        stc = self._client()
+        try:
+            stc.join_session(sid)
+            return StcSessionCleaner._read_lease(stc)
+        except Exception as e:
+            log.warning('Unable to get the lease of session {}: {}'.format(sid, e))
+            return None
+        finally:
+            stc.close()
+
+    def _lapsed(self, lease):
+        return lease is not None and lease['expires'] + self._grace < time()
+
+    def sessions(self):
+        '''Return the sessions on the server that match the filters as a list of
+        {'sid', 'name', 'user', 'age', 'lease'} dicts. age is None unless filtering by age and
+        lease None unless picking expired sessions.'''
+        stc = self._client()
+        try:
+            sids = stc.sessions()
+        finally:
+            stc.close()
+
+        if not sids:
+            return []
+
+        matches = []
+        for sid in sids:
+            name, user = StcSessionCleaner.split_sid(sid)
+            if self._users and user not in self._users:
+                continue
+            if self._name and not fnmatch(name, self._name):
+                continue
+            matches.append({'sid': sid, 'name': name, 'user': user, 'age': None, 'lease': None})
+
+        if self._older_than is not None and matches:
+            with ThreadPoolExecutor(max_workers=self._workers) as pool:
+                ages = list(pool.map(self._age, [m['sid'] for m in matches]))
+            for m, age in zip(matches, ages):
+                m['age'] = age
+            matches = [m for m in matches if m['age'] is not None and m['age'] >= self._older_than]
+
+        if self._expired and matches:
+            with ThreadPoolExecutor(max_workers=self._workers) as pool:
+                leases = list(pool.map(self._lease, [m['sid'] for m in matches]))
+            for m, lease in zip(matches, leases):
+                m['lease'] = lease
+            matches = [m for m in matches if self._lapsed(m['lease'])]
+
+        return matches
+
+    def _detach_ports(self, stc):
+        ports = []
+        for project in stc.get('system1', 'children-project').split():
+            ports += stc.get(project, 'children-port').split()
+
+        if ports:
+            log.info('Detaching from ports: {}'.format(' '.join(ports)))
+            stc.perform('DetachPorts', portList=' '.join(ports))
+
+        return ports
+
+    def _clear(self, session):
+        '''End one session. Returns the result dict for it; never raises.'''
+        result = dict(session, status='ok', ports=[], seconds=0.0, error=None)
+        start = monotonic()
+        stc = self._client()
+        try:
+            log.info('Joining session {}'.format(session['sid']))
+            stc.join_session(session['sid'])
+            if self._expired:
+                lease = StcSessionCleaner._read_lease(stc)
+                if not self._lapsed(lease):
+                    log.info('Session {} renewed its lease. Leaving it.'.format(session['sid']))
+                    result['status'], result['lease'] = 'renewed', lease
+                    return result
+
+            if self._detach:
+                result['ports'] = self._detach_ports(stc)
+
+            log.info('Ending session {}'.format(session['sid']))
+            stc.end_session(end_tcsession=True, timeout=self._timeout)
+        except Exception as e:
+            log.error('Unable to clear session {}: {}'.format(session['sid'], e))
+            result['status'], result['error'] = 'error', str(e)
+        finally:
+            stc.close()
+            result['seconds'] = monotonic() - start
+
+        return result
+
+    def clear(self, dry_run=False):
+        '''End the matching sessions. Returns a result dict per session: the session dict plus
+        status ("ok", "error", "renewed" (expired, but renewed before it was ended), or
+        "dry_run"), ports detached, seconds taken, and error.'''
+        sessions = self.sessions()
+        if dry_run:
+            return [dict(s, status='dry_run', ports=[], seconds=0.0, error=None) for s in sessions]
+
+        if not sessions:
+            return []
+
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            return list(pool.map(self._clear, sessions))
@@ -0,0 +1,83 @@
+import logging
+
+from stc_profile import StcTrafficProfile
+from stc_frame_cache import StcFrameCache
+from stc_port_pool import StcPortPool
+
+log = logging.getLogger(__name__)
+
+class StcCommandException(Exception):
+    pass
+
+# The commands spirent_session.py (and the control daemon) know about, in no particular order.
+commands = ['create', 'load', 'save', 'traffic_start', 'traffic_stop', 'reconfigure', 'destroy']
+
+# The config stanza of the load and save commands.
+project_config_key = 'project'
+project_default_config = {
+    'file': None,        # local STC configuration (XML) file to load the project from or save it to.
+    'overrides': {},     # {section: {attribute: value}} set on every loaded streamblock, i.e. {"streamblock": {"Load": "20"}}.
+}
+
+def run_command(session, command):
+    '''Run one spirent_session.py command against a connected StcSession. Errors are raised
+    as whatever Stc*Exception the failing step raises.'''
+    if command == 'create':
+        # The "create" is done when the session connects if the session does not exist in the given state.
+        log.info('Created new session.')
+        pool = StcPortPool(session)
+        if pool.enabled:
+            # attach the pool's ports once, up front.
+            pool.attach()
+
+    elif command in ['load', 'save']:
+        path = session.config.data[project_config_key]['file']
+        if not path:
+            raise StcCommandException('No project file given for {}.'.format(command))
+        if command == 'load':
+            session.load_project(path, session.config.data[project_config_key]['overrides'])
+        else:
+            session.save_project(path)
+
+    elif command == 'traffic_start':
+        if session.state.get('project_file'):
+            # the streamblocks are the ones loaded from the project file.
+            profile = StcTrafficProfile.from_session(session)
+        else:
+            profile = StcTrafficProfile(session).create()
+        profile.start_traffic()
+
+    elif command == 'reconfigure':
+        # change the running streamblocks to match the (new) config, sending only what changed.
+        changes = StcTrafficProfile.from_session(session).update()
+        if not changes:
+            log.info('Nothing to reconfigure.')
+        for handle, c in changes.items():
+            log.info('Reconfigured {}: {}'.format(handle, c))
+
+    elif command == 'traffic_stop':
+        cache, pool = StcFrameCache(session), StcPortPool(session)
+        if cache.keep_ports and session.state.get('project_file'):
+            # loaded streamblocks can not be rebuilt from the config, so are only stopped.
+            StcTrafficProfile.from_session(session).stop_traffic()
+        elif cache.keep_ports:
+            # keep the streamblocks (stopped) and the ports for the next traffic_start.
+            cache.retire()
+            session.apply()
+        else:
+            session.destroy_streamblocks()
+            if not pool.enabled:
+                session.detach_ports()
+
+        if pool.enabled:
+            # the ports stay attached, for this or other flows, until the session is destroyed.
+            pool.release()
+
+    elif command == 'destroy':
+        # in the "destroy" case, we do nothing and let the session disconnect destory things
+        # when the session goes out of scope.
+        session.keep_open(False)
+        log.info('Closing existing session/project/ports.')
+
+    else:
+        raise StcCommandException('Command {} not supported.'.format(command))
@@ -1,11 +1,23 @@
 import logging
 import json
-import collections
+import collections.abc
 
 from stc_session import StcSession
 from stc_streamblock import StcStreamblock, StcStreamblockException
 from stc_ethernetII import StcEthernetII
 from stc_ipv4 import StcIPv4
+from stc_profile import StcTrafficProfile
+from stc_results import StcResults
+from stc_export import StcResultExporter
+from stc_arp import StcArp
+from stc_sweep import StcSweep
+from stc_frame_cache import StcFrameCache
+from stc_port_pool import StcPortPool
+from stc_port_map import StcPortMap
+from stc_modifier import StcModifiers
+from stc_campaign import StcCampaign
+from stc_lease import StcSessionLease
+from stc_commands import project_config_key, project_default_config
 
 log = logging.getLogger(__name__)
 
@@ -21,6 +33,18 @@ class StcConfig:
             StcEthernetII.config_key: StcEthernetII.default_config,
             StcStreamblock.config_key: StcStreamblock.default_config,
             StcSession.config_key: StcSession.default_config,
+            StcTrafficProfile.config_key: StcTrafficProfile.default_config,
+            StcResults.config_key: StcResults.default_config,
+            StcResultExporter.config_key: StcResultExporter.default_config,
+            StcArp.config_key: StcArp.default_config,
+            StcSweep.config_key: StcSweep.default_config,
+            StcFrameCache.config_key: StcFrameCache.default_config,
+            StcPortPool.config_key: StcPortPool.default_config,
+            StcPortMap.config_key: StcPortMap.default_config,
+            StcModifiers.config_key: StcModifiers.default_config,
+            StcCampaign.config_key: StcCampaign.default_config,
+            StcSessionLease.config_key: StcSessionLease.default_config,
+            project_config_key: project_default_config,
         }
 
     def apply_config(self, config):
@@ -29,7 +53,7 @@ class StcConfig:
         def _combine_dict(map1: dict, map2: dict):
             def update(d: dict, u: dict):
                 for k, v in u.items():
-                    if isinstance(v, collections.Mapping):
+                    if isinstance(v, collections.abc.Mapping):
                         r = update(d.get(k, {}), v)
                         d[k] = r
                     else:
@@ -45,6 +69,15 @@ class StcConfig:
         # Now merge the dicts.
         self._config = _combine_dict(self._config, config)
 
+    def copy(self, config=None):
+        '''Return a new config instance with this configuration and then the given config applied.'''
+        c = StcConfig()
+        c.apply_config(self._config)
+        if config:
+            c.apply_config(config)
+
+        return c
+
     @property
     def data(self):
         '''Get the curret configuration of this instance.'''
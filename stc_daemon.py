@@ -0,0 +1,165 @@
+import logging
+import json
+import os
+import socket
+import socketserver
+import threading
+
+from stc_commands import run_command
+from stc_config import StcConfig
+from stc_session import StcSessionException
+
+log = logging.getLogger(__name__)
+
+class StcDaemonException(Exception):
+    pass
+
+def daemon_socket_path(statefile):
+    '''The control socket of the daemon that owns the given state file.'''
+    return os.path.abspath(statefile) + '.sock'
+
+class _StcDaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return   # just checking we are here.
+
+        try:
+            request = json.loads(line.decode())
+        except ValueError as e:
+            response = {'status': 'error', 'message': 'bad request: {}'.format(e), 'exit': 2}
+        else:
+            response = self.server.stc_daemon.handle(request)
+
+        self.wfile.write((json.dumps(response) + '\n').encode())
+
+class StcDaemon:
+    '''
+    Long lived owner of a connected StcSession. spirent_session.py sends its commands to the
+    daemon over a unix socket instead of building a new REST client, joining the session, and
+    connecting to the chassis every time it runs. The daemon keeps its connection to the STC
+    server alive between commands and writes the state file after each one, as
+    spirent_session.py does, and each time the session's lease is renewed (see stc_lease.py),
+    so the session stays leased for as long as the daemon runs. It exits after a "destroy" command.
+    '''
+
+    def __init__(self, session, statefile, socket_path=None):
+        self._session = session
+        self._statefile = statefile
+        self._socket_path = socket_path if socket_path else daemon_socket_path(statefile)
+        self._server = None
+        # the lease heartbeat writes the state too, so not while a command is changing it.
+        self._state_lock = threading.RLock()
+        if session.lease:
+            session.lease.add_hook(self._lease_renewed)
+
+    @property
+    def socket_path(self):
+        return self._socket_path
+
+    def write_state(self):
+        with self._state_lock:
+            with open(self._statefile, 'w') as fd:
+                self._session.save_and_write_session(fd)
+
+    def _lease_renewed(self, lease):
+        # a command running now writes the state (and the new lease) when done. Waiting for it
+        # here could deadlock with "destroy" stopping the heartbeat.
+        if self._state_lock.acquire(blocking=False):
+            try:
+                self.write_state()
+            finally:
+                self._state_lock.release()
+
+    def handle(self, request):
+        '''Run the commands of one request. Returns the response to send back.'''
+        with self._state_lock:
+            return self._handle(request)
+
+    def _handle(self, request):
+        if request.get('config'):
+            config = StcConfig()
+            config.apply_config(request['config'])
+            self._session.config = config
+
+        for command in request.get('commands', []):
+            try:
+                run_command(self._session, command)
+            except StcSessionException as e:
+                log.critical('Critical StcSession Error: {}'.format(e))
+                return {'status': 'error', 'message': str(e), 'exit': 100}
+            except Exception as e:
+                log.error('Error running {}: {}'.format(command, e))
+                return {'status': 'error', 'message': str(e), 'exit': 1}
+
+            if command == 'destroy':
+                self._session.disconnect()
+                self.shutdown()
+                return {'status': 'ok', 'message': 'session destroyed'}
+
+            self.write_state()
+
+        return {'status': 'ok'}
+
+    def serve_forever(self):
+        if os.path.exists(self._socket_path):
+            if StcDaemonClient(self._socket_path).available():
+                raise StcDaemonException('A daemon is already running on {}'.format(self._socket_path))
+            os.unlink(self._socket_path)
+
+        self._server = socketserver.UnixStreamServer(self._socket_path, _StcDaemonHandler)
+        self._server.stc_daemon = self
+        log.info('Listening on {}'.format(self._socket_path))
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self._socket_path):
+                os.unlink(self._socket_path)
+
+    def shutdown(self):
+        # shutdown() waits for serve_forever() to exit, so it can not be called from the
+        # thread serving the request.
+        if self._server:
+            threading.Thread(target=self._server.shutdown).start()
+
+class StcDaemonClient:
+    '''Send spirent_session.py commands to a running StcDaemon.'''
+
+    def __init__(self, socket_path, timeout=None):
+        self._socket_path = socket_path
+        self._timeout = timeout
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self._timeout)
+        sock.connect(self._socket_path)
+        return sock
+
+    def available(self):
+        '''True if a daemon is listening on the socket.'''
+        if not os.path.exists(self._socket_path):
+            return False
+
+        try:
+            self._connect().close()
+        except OSError:
+            return False
+
+        return True
+
+    def run(self, commands, config=None):
+        '''Run the commands in the daemon. Returns the response dict. StcDaemonException raised
+        if the daemon can not be reached.'''
+        try:
+            with self._connect() as sock:
+                sock.sendall((json.dumps({'commands': commands, 'config': config}) + '\n').encode())
+                with sock.makefile('rb') as fd:
+                    line = fd.readline()
+        except OSError as e:
+            raise StcDaemonException('Unable to talk to daemon at {}: {}'.format(self._socket_path, e))
+
+        if not line:
+            raise StcDaemonException('No response from daemon at {}'.format(self._socket_path))
+
+        return json.loads(line.decode())
@@ -0,0 +1,805 @@
+#!/usr/bin/env python3
+
+import logging
+import json
+import re
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+from time import monotonic, sleep, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+log = logging.getLogger(__name__)
+
+class StcEmulatorException(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+class StcEmulatorSession:
+    '''The object tree of a single emulated test session. Handles are built the same
+    way the STC does it: lowercased object type plus a per type counter, i.e. project1,
+    port2, streamblock1, ipv4:ipv41.'''
+
+    def __init__(self, emulator, sid, user):
+        self.emulator = emulator
+        self.sid = sid
+        self.user = user
+        self.started = time()
+        self.objects = {}     # handle --> {'type': ..., 'parent': ..., 'children': [...], 'attrs': {...}}
+        self._counters = {}
+        self._running = {}    # streamblock handle --> monotonic time traffic started.
+        self._elapsed = {}    # streamblock handle --> seconds of traffic sent in earlier runs.
+        self._arp = {}        # streamblock handle --> monotonic time ARP was first started.
+        self._ends = {}       # streamblock handle --> monotonic time a timed run stops by itself.
+        self.files = {}       # file name --> bytes, uploaded or saved in the session.
+        self._add('system', None, {'version': '4.80.0000', 'name': 'StcSystem 1'}, handle='system1')
+
+    def _add(self, obj_type, under, attrs, handle=None):
+        obj_type = obj_type.lower()
+        if not handle:
+            self._counters[obj_type] = self._counters.get(obj_type, 0) + 1
+            handle = '{}{}'.format(obj_type, self._counters[obj_type])
+
+        self.objects[handle] = {'type': obj_type, 'parent': under, 'children': [],
+                                'attrs': {k.lower(): str(v) for k, v in attrs.items()}}
+        if under:
+            self.objects[under]['children'].append(handle)
+
+        return handle
+
+    def _obj(self, handle):
+        if handle not in self.objects:
+            raise StcEmulatorException('invalid handle: {}'.format(handle), status=404)
+
+        return self.objects[handle]
+
+    def create(self, obj_type, under, attrs):
+        if under:
+            self._obj(under)
+        elif obj_type.lower() == 'project':
+            under = 'system1'
+        else:
+            under = 'project1' if 'project1' in self.objects else 'system1'
+
+        handle = self._add(obj_type, under, attrs)
+
+        # ports come with their generator and analyzer already in place.
+        if obj_type.lower() == 'port':
+            gen = self._add('generator', handle, {'state': 'STOPPED'})
+            self._add('generatorconfig', gen, {'durationmode': 'CONTINUOUS', 'duration': '30'})
+            self._add('analyzer', handle, {'state': 'STOPPED'})
+            self._add('arpcache', handle, {'arpcachedata': ''})
+            self.objects[handle]['attrs'].setdefault('online', 'false')
+        elif obj_type.lower() == 'streamblock':
+            self.objects[handle]['attrs'].setdefault('runningstate', 'NOTRUNNING')
+        elif obj_type.lower() == 'project':
+            self.objects[handle]['attrs'].setdefault('name', 'Project 1')
+
+        return handle
+
+    def bulkcreate(self, obj_type, under, tree):
+        '''Create an object and the nested child objects in the attribute tree. Returns
+        all new handles in depth first creation order.'''
+        attrs = {k: v for k, v in tree.items() if not isinstance(v, (dict, list))}
+        handles = [self.create(obj_type, under, attrs)]
+        for child_type, subtrees in tree.items():
+            if isinstance(subtrees, dict):
+                subtrees = [subtrees]
+            if isinstance(subtrees, list):
+                for subtree in subtrees:
+                    handles += self.bulkcreate(child_type, handles[0], subtree)
+
+        return handles
+
+    def delete(self, handle):
+        obj = self._obj(handle)
+        for child in list(obj['children']):
+            self.delete(child)
+
+        if obj['type'] == 'port':
+            self.emulator.release(self, handle)
+
+        if obj['parent'] and obj['parent'] in self.objects:
+            self.objects[obj['parent']]['children'].remove(handle)
+
+        del self.objects[handle]
+
+    def config(self, handle, attrs):
+        self._obj(handle)['attrs'].update({k.lower(): str(v) for k, v in attrs.items()})
+
+    def _seconds(self, handle):
+        secs = self._elapsed.get(handle, 0.0)
+        if handle in self._running:
+            secs += min(monotonic(), self._ends.get(handle, float('inf'))) - self._running[handle]
+        return secs
+
+    def _is_running(self, handle):
+        return handle in self._running and monotonic() < self._ends.get(handle, float('inf'))
+
+    def _settle(self, handle):
+        '''Book a finished timed run of the streamblock as stopped.'''
+        if handle in self._running and not self._is_running(handle):
+            self._elapsed[handle] = self._seconds(handle)
+            del self._running[handle]
+            self._ends.pop(handle, None)
+            self.objects[handle]['attrs']['runningstate'] = 'STOPPED'
+
+    def _generator_config(self, port):
+        for gen in self.objects[port]['children']:
+            if self.objects[gen]['type'] == 'generator':
+                for c in self.objects[gen]['children']:
+                    if self.objects[c]['type'] == 'generatorconfig':
+                        return self.objects[c]['attrs']
+        return {}
+
+    def _start(self, handle):
+        '''Start a streamblock, for as long as its port's generator config says.'''
+        self._settle(handle)
+        if self.objects[handle]['attrs'].get('active', 'true').lower() == 'false':
+            return    # inactive streamblocks do not send.
+        now = monotonic()
+        self.objects[handle]['attrs']['runningstate'] = 'RUNNING'
+        self._running.setdefault(handle, now)
+        gc = self._generator_config(self.objects[handle]['parent'])
+        mode, duration = gc.get('durationmode', 'CONTINUOUS').upper(), float(gc.get('duration', 0))
+        if mode == 'SECONDS':
+            self._ends[handle] = now + duration
+        elif mode == 'BURSTS':
+            frames = duration * float(self.objects[handle]['attrs'].get('burstsize', 1))
+            self._ends[handle] = now + frames / self.tx_rate(handle)
+        else:
+            self._ends.pop(handle, None)
+
+    def _stop(self, handle):
+        self._settle(handle)
+        self.objects[handle]['attrs']['runningstate'] = 'STOPPED'
+        if handle in self._running:
+            self._elapsed[handle] = self._seconds(handle)
+            del self._running[handle]
+        self._ends.pop(handle, None)
+
+    def _port_streamblocks(self, generator):
+        port = self.objects[generator]['parent']
+        return [c for c in self.objects[port]['children'] if self.objects[c]['type'] == 'streamblock']
+
+    def generator_wait(self, params):
+        '''Seconds GeneratorWaitForStop would block for.'''
+        wait = 0.0
+        for gen in self.handles(params, 'generatorList'):
+            for sb in self._port_streamblocks(gen):
+                if self._is_running(sb):
+                    wait = max(wait, self._ends.get(sb, float('inf')) - monotonic())
+
+        return min(wait, float(params.get('waittimeout', 60)))
+
+    def tx_rate(self, handle):
+        '''Frames per second the streamblock sends when running.'''
+        attrs = self.objects[handle]['attrs']
+        load = float(attrs.get('load', 10))
+        frame_len = float(attrs.get('fixedframelength', 128))
+        unit = attrs.get('loadunit', 'PERCENT_LINE_RATE').upper()
+        if unit == 'FRAMES_PER_SECOND':
+            return load
+        if unit == 'BITS_PER_SECOND':
+            return load / (frame_len * 8)
+        # percent of a 1G line, preamble and inter frame gap included.
+        return (load / 100.0) * self.emulator.line_rate / ((frame_len + 20) * 8)
+
+    def rx_rate(self, handle):
+        rate = self.tx_rate(handle)
+        if self.emulator.capacity is not None:
+            rate = min(rate, self.emulator.capacity)
+        return rate * (1.0 - self.emulator.loss)
+
+    def _refresh_results(self, handle):
+        '''Fill in the counters of a result object from how long its streamblock(s) have run.'''
+        obj = self.objects[handle]
+        parent = obj['parent']
+        if obj['type'] in ('txstreamresults', 'rxstreamresults'):
+            running = self._is_running(parent)
+            secs = self._seconds(parent)
+            frame_len = float(self.objects[parent]['attrs'].get('fixedframelength', 128))
+            tx, rx = self.tx_rate(parent), self.rx_rate(parent)
+            rate = tx if obj['type'] == 'txstreamresults' else rx
+            frames = int(rate * secs)
+            obj['attrs'].update({
+                'framecount': str(frames),
+                'octetcount': str(int(frames * frame_len)),
+                'framerate': str(rate if running else 0),
+            })
+            if obj['type'] == 'rxstreamresults':
+                obj['attrs'].update({
+                    'droppedframecount': str(int(tx * secs) - frames),
+                    'minlatency': '10.0', 'avglatency': '12.5', 'maxlatency': '20.0',
+                    'outseqframecount': '0',
+                })
+        elif obj['type'] == 'analyzerportresults':
+            port = self.objects[parent]['parent']
+            frames = rate = octets = 0
+            for h, o in self.objects.items():
+                if o['type'] == 'streamblock' and o['parent'] != port:
+                    n = int(self.rx_rate(h) * self._seconds(h))
+                    frames += n
+                    octets += int(n * float(o['attrs'].get('fixedframelength', 128)))
+                    rate += self.rx_rate(h) if self._is_running(h) else 0
+            obj['attrs'].update({'totalframecount': str(frames), 'totaloctetcount': str(octets),
+                                 'totalframerate': str(rate)})
+
+    def get(self, handle, args):
+        obj = self._obj(handle)
+        if obj['type'].endswith('results'):
+            self._refresh_results(handle)
+        elif obj['type'] == 'resultdataset':
+            self._refresh_dataset(handle)
+        elif obj['type'] == 'generator' and obj['attrs']['state'] == 'RUNNING':
+            if not [sb for sb in self._port_streamblocks(handle) if self._is_running(sb)]:
+                obj['attrs']['state'] = 'STOPPED'
+        elif obj['type'] == 'streamblock':
+            self._settle(handle)
+
+        def _value(arg):
+            arg = arg.lower()
+            if arg == 'children':
+                return ' '.join(obj['children'])
+            if arg.startswith('children-'):
+                obj_type = arg.split('-', 1)[1]
+                return ' '.join([c for c in obj['children'] if self.objects[c]['type'] == obj_type])
+            if arg == 'parent':
+                return obj['parent'] or ''
+            if arg not in obj['attrs']:
+                raise StcEmulatorException('invalid attribute {} for {}'.format(arg, handle))
+            return obj['attrs'][arg]
+
+        if not args:
+            data = dict(obj['attrs'])
+            data['children'] = ' '.join(obj['children'])
+            data['parent'] = obj['parent'] or ''
+            return data
+
+        if len(args) == 1:
+            return _value(args[0])
+
+        return {a: _value(a) for a in args}
+
+    def bulkget(self, location, args):
+        '''Get the attributes of all objects at an xpath like location, e.g.
+        project1/port/streamblock/rxstreamresults. Predicates ([...]) are ignored.
+        Returns {handle: {attribute: value}}.'''
+        # live subscriptions cover objects created since the last read.
+        for h, obj in list(self.objects.items()):
+            if obj['type'] == 'resultdataset':
+                self._refresh_dataset(h)
+
+        steps = [re.sub(r'\[.*\]', '', step).lower() for step in location.strip('/').split('/')]
+        handles = [steps[0]] if steps[0] in self.objects else []
+        for step in steps[1:]:
+            handles = [c for h in handles for c in self.objects[h]['children'] if self.objects[c]['type'] == step]
+
+        objects = {}
+        for h in handles:
+            data = self.get(h, args)
+            objects[h] = data if isinstance(data, dict) else {args[0]: data}
+
+        return objects
+
+    def handles(self, params, key):
+        '''Return the list of handles in the (case insensitive) parameter key.'''
+        value = params.get(key.lower(), '')
+        handles = value.split()
+        for h in handles:
+            self._obj(h)
+
+        return handles
+
+    def perform(self, command, params):
+        params = {k.lower(): v for k, v in params.items()}
+        func = getattr(self, '_perform_{}'.format(command.lower()), None)
+        if not func:
+            raise StcEmulatorException('command not supported by emulator: {}'.format(command))
+
+        data = func(params)
+        data = data if data else {}
+        data.setdefault('State', 'COMPLETED')
+        return data
+
+    #
+    # Configuration files. The emulator's XML is not the STC's, but round trips the same way:
+    # an element per object with its attributes, types with a ":" in a namespace of their own.
+    #
+    # objects the STC makes by itself (so are not saved), and attributes that are run time state.
+    xml_skip_types = ['generator', 'generatorconfig', 'analyzer', 'arpcache', 'resultdataset']
+    xml_skip_attrs = ['runningstate', 'online']
+
+    @staticmethod
+    def _xml_tag(obj_type):
+        prefix, sep, name = obj_type.partition(':')
+        return '{{urn:stc:{}}}{}'.format(prefix, name) if sep else obj_type
+
+    @staticmethod
+    def _xml_type(tag):
+        if tag.startswith('{urn:stc:'):
+            prefix, name = tag[len('{urn:stc:'):].split('}', 1)
+            return '{}:{}'.format(prefix, name)
+        return tag
+
+    def _to_xml(self, handle, parent):
+        obj = self.objects[handle]
+        if obj['type'] in StcEmulatorSession.xml_skip_types or obj['type'].endswith('results'):
+            return
+
+        attrs = {k: v for k, v in obj['attrs'].items() if k not in StcEmulatorSession.xml_skip_attrs}
+        elem = ET.SubElement(parent, StcEmulatorSession._xml_tag(obj['type']), attrs)
+        for child in obj['children']:
+            self._to_xml(child, elem)
+
+    def _from_xml(self, elem, under):
+        handle = self.create(StcEmulatorSession._xml_type(elem.tag), under, dict(elem.attrib))
+        for child in elem:
+            self._from_xml(child, handle)
+
+    def _perform_saveasxml(self, params):
+        config = params.get('config') or 'system1'
+        root = ET.Element('stcsystem')
+        # saving the system saves its project(s).
+        for handle in self._obj(config)['children'] if self._obj(config)['type'] == 'system' else [config]:
+            self._to_xml(handle, root)
+        data = ET.tostring(root)
+        if params.get('filename'):
+            self.files[params['filename']] = data
+        return {'SavedConfigString': data.decode()}
+
+    def _perform_loadfromxml(self, params):
+        if params.get('inputconfigstring'):
+            data = params['inputconfigstring'].encode()
+        elif params.get('filename') in self.files:
+            data = self.files[params['filename']]
+        else:
+            raise StcEmulatorException('file not found: {}'.format(params.get('filename')))
+
+        try:
+            root = ET.fromstring(data)
+        except ET.ParseError as e:
+            raise StcEmulatorException('invalid configuration file: {}'.format(e))
+
+        # the loaded configuration replaces the current project.
+        for project in [c for c in self.objects['system1']['children'] if self.objects[c]['type'] == 'project']:
+            self.delete(project)
+        for elem in root:
+            self._from_xml(elem, 'system1')
+
+    #
+    # Emulated perform commands.
+    #
+    def _perform_attachports(self, params):
+        for port in self.handles(params, 'portList'):
+            self.emulator.reserve(self, port)
+            self.objects[port]['attrs']['online'] = 'true'
+
+    def _perform_detachports(self, params):
+        for port in self.handles(params, 'portList'):
+            self.emulator.release(self, port)
+            self.objects[port]['attrs']['online'] = 'false'
+
+    def _gateway(self, handle):
+        '''The gateway address of a streamblock, from its IPv4 PDU.'''
+        for c in self.objects[handle]['children']:
+            if self.objects[c]['type'] == 'ipv4:ipv4':
+                return self.objects[c]['attrs'].get('gateway')
+
+        return None
+
+    def _arp_resolved(self, handle):
+        # a gateway answers ARPs sent from arp_delay seconds after the first one on.
+        return handle in self._arp and monotonic() - self._arp[handle] >= self.emulator.arp_delay
+
+    def _perform_arpndstart(self, params):
+        for h in self.handles(params, 'handleList'):
+            self._arp.setdefault(h, monotonic())
+
+        return {'ArpNdState': 'SUCCESSFUL'}
+
+    def _perform_arpndverifyresolved(self, params):
+        handles = self.handles(params, 'handleList')
+        resolved = all([self._arp_resolved(h) for h in handles])
+        return {'PassFailState': 'PASSED' if resolved else 'FAILED'}
+
+    def _perform_arpndupdatearpcache(self, params):
+        for port in self.handles(params, 'handleList'):
+            entries = []
+            for sb in self.objects[port]['children']:
+                gw = self._gateway(sb) if self.objects[sb]['type'] == 'streamblock' else None
+                if gw and self._arp_resolved(sb):
+                    mac = '02:00:' + ':'.join(['{:02x}'.format(int(o)) for o in gw.split('.')])
+                    entries.append('{{{} {} {}}}'.format(self.objects[port]['attrs'].get('location', port),
+                                                         gw, mac))
+
+            for c in self.objects[port]['children']:
+                if self.objects[c]['type'] == 'arpcache':
+                    self.objects[c]['attrs']['arpcachedata'] = ' '.join(sorted(set(entries)))
+
+    def _perform_streamblockstart(self, params):
+        for h in self.handles(params, 'streamBlockList'):
+            self._start(h)
+
+    def _perform_streamblockstop(self, params):
+        for h in self.handles(params, 'streamBlockList'):
+            self._stop(h)
+
+    def _perform_resultssubscribe(self, params):
+        config_type = params.get('configtype', '').lower()
+        result_type = params.get('resulttype', '').lower()
+        parents = {'streamblock': 'streamblock', 'analyzer': 'analyzer'}
+        if config_type not in parents:
+            raise StcEmulatorException('config type not supported by emulator: {}'.format(config_type))
+
+        dataset = self._add('resultdataset', params.get('parent', 'project1'),
+                            {'configtype': parents[config_type], 'resulttype': result_type})
+        self._refresh_dataset(dataset)
+        return {'ReturnedDataSet': dataset}
+
+    def _perform_resultsclearall(self, params):
+        '''Zero the counters of the streamblocks on the ports in PortList, all ports if none.'''
+        ports = self.handles(params, 'portList') or [h for h, o in self.objects.items() if o['type'] == 'port']
+        for port in ports:
+            for sb in [c for c in self.objects[port]['children'] if self.objects[c]['type'] == 'streamblock']:
+                self._settle(sb)
+                self._elapsed.pop(sb, None)
+                if sb in self._running:
+                    self._running[sb] = monotonic()
+
+    def _refresh_dataset(self, handle):
+        '''Like the real thing, a subscription covers objects created after it too.'''
+        attrs = self.objects[handle]['attrs']
+        results = []
+        for h, obj in list(self.objects.items()):
+            if obj['type'] == attrs['configtype']:
+                existing = [c for c in obj['children'] if self.objects[c]['type'] == attrs['resulttype']]
+                results += existing if existing else [self._add(attrs['resulttype'], h, {})]
+
+        attrs['resulthandlelist'] = ' '.join(results)
+
+    def _perform_resultdatasetunsubscribe(self, params):
+        self.handles(params, 'resultDataSet')
+
+    def _perform_generatorstart(self, params):
+        for h in self.handles(params, 'generatorList'):
+            self.objects[h]['attrs']['state'] = 'RUNNING'
+            for sb in self._port_streamblocks(h):
+                self._start(sb)
+
+    def _perform_generatorstop(self, params):
+        for h in self.handles(params, 'generatorList'):
+            self.objects[h]['attrs']['state'] = 'STOPPED'
+            for sb in self._port_streamblocks(h):
+                self._stop(sb)
+
+    def _perform_generatorwaitforstop(self, params):
+        # the handler has already waited generator_wait() seconds.
+        for h in self.handles(params, 'generatorList'):
+            if [sb for sb in self._port_streamblocks(h) if self._is_running(sb)]:
+                raise StcEmulatorException('timeout waiting for {} to stop'.format(h))
+            self.objects[h]['attrs']['state'] = 'STOPPED'
+
+    def _perform_analyzerstart(self, params):
+        for h in self.handles(params, 'analyzerList'):
+            self.objects[h]['attrs']['state'] = 'RUNNING'
+
+    def _perform_analyzerstop(self, params):
+        for h in self.handles(params, 'analyzerList'):
+            self.objects[h]['attrs']['state'] = 'STOPPED'
+
+class StcEmulator:
+    '''A local stand-in for the STC REST API (the /stcapi sessions, objects, perform,
+    apply and connections endpoints). Runs in a background thread so tests and benchmarks
+    can point StcSession at it. Every request can be delayed by a fixed latency, and by
+    an extra per perform command latency, to model the link to the real server.'''
+
+    def __init__(self, addr='127.0.0.1', port=0, latency=0.0, command_latency=None, bulk=True,
+                 line_rate=1e9, capacity=None, loss=0.0, arp_delay=0.0):
+        self.latency = latency
+        self.arp_delay = arp_delay    # seconds after ArpNDStart before a gateway resolves.
+        self.bulk = bulk
+        self.line_rate = line_rate    # bits per second of every port.
+        self.capacity = capacity      # frames per second the path carries per stream, None for unlimited.
+        self.loss = loss              # fraction of received frames to drop.
+        self.command_latency = {k.lower(): v for k, v in (command_latency or {}).items()}
+        self.sessions = {}        # sid --> StcEmulatorSession
+        self.reserved = {}        # port location --> (sid, handle)
+        self.connected = set()
+        self.requests = []        # (method, container, bytes in, bytes out) for each request served.
+        self.lock = threading.RLock()
+        self._server = ThreadingHTTPServer((addr, port), _StcEmulatorHandler)
+        self._server.daemon_threads = True
+        self._server.emulator = self
+        self._thread = None
+
+    @property
+    def addr(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        log.info('STC emulator listening on {}:{}'.format(self.addr, self.port))
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = []
+
+    def calls(self):
+        '''Return {(method, container): count} of the requests served since the last reset_stats().'''
+        calls = {}
+        with self.lock:
+            for method, container, _, _ in self.requests:
+                calls[(method, container)] = calls.get((method, container), 0) + 1
+
+        return calls
+
+    def reserve(self, session, port):
+        location = session.objects[port]['attrs'].get('location', port)
+        with self.lock:
+            if location in self.reserved and self.reserved[location][0] != session.sid:
+                raise StcEmulatorException('port {} is reserved by session {}'.format(
+                    location, self.reserved[location][0]), status=409)
+            self.reserved[location] = (session.sid, port)
+
+    def release(self, session, port):
+        location = session.objects[port]['attrs'].get('location', port)
+        with self.lock:
+            if location in self.reserved and self.reserved[location][0] == session.sid:
+                del self.reserved[location]
+
+    def new_session(self, user, name):
+        sid = '{} - {}'.format(name, user)
+        with self.lock:
+            if sid in self.sessions:
+                raise StcEmulatorException('session already exists: {}'.format(sid), status=409)
+            self.sessions[sid] = StcEmulatorSession(self, sid, user)
+
+        return sid
+
+    def end_session(self, sid):
+        with self.lock:
+            if sid not in self.sessions:
+                raise StcEmulatorException('session not found: {}'.format(sid), status=404)
+            session = self.sessions.pop(sid)
+            for location, (owner, _) in list(self.reserved.items()):
+                if owner == session.sid:
+                    del self.reserved[location]
+
+class _StcEmulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes; with Nagle on, a kept alive connection
+    # waits out the client's delayed ACK (~40ms) on every response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        log.debug('{} - {}'.format(self.address_string(), fmt % args))
+
+    @property
+    def emulator(self):
+        return self.server.emulator
+
+    def _send(self, status, data=None, raw=None):
+        body = raw if raw is not None else (json.dumps(data).encode() if data is not None else b'')
+        self.send_response(status)
+        if raw is not None:
+            self.send_header('Content-Type', 'application/octet-stream')
+        else:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def _session(self):
+        sid = self.headers.get('X-STC-API-Session')
+        if not sid or sid not in self.emulator.sessions:
+            raise StcEmulatorException('session not found: {}'.format(sid), status=404)
+
+        return self.emulator.sessions[sid]
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.strip('/').split('/')]
+        if not parts or parts[0] != 'stcapi':
+            self._send(404, {'message': 'not found: {}'.format(url.path)})
+            return
+
+        parts = parts[1:]
+        container = parts[0] if parts else ''
+        resource = '/'.join(parts[1:]) if len(parts) > 1 else None
+        query = parse_qsl(url.query, keep_blank_values=True)
+
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        body = self.rfile.read(length) if length else b''
+
+        delay = self.emulator.latency
+        if container == 'perform':
+            params = dict(parse_qsl(body.decode(), keep_blank_values=True))
+            delay += self.emulator.command_latency.get(params.get('command', '').lower(), 0.0)
+        if delay:
+            sleep(delay)
+
+        try:
+            # like the real command, GeneratorWaitForStop blocks until the generators stop
+            # (or it times out). Wait outside the lock so other requests are served meanwhile.
+            if container == 'perform' and params.get('command', '').lower() == 'generatorwaitforstop':
+                with self.emulator.lock:
+                    wait = self._session().generator_wait({k.lower(): v for k, v in params.items()})
+                sleep(wait)
+
+            with self.emulator.lock:
+                status, data, raw = self._handle(method, container, resource, query, body)
+        except StcEmulatorException as e:
+            status, data, raw = e.status, {'code': e.status, 'message': str(e)}, None
+
+        sent = self._send(status, data, raw)
+        with self.emulator.lock:
+            self.emulator.requests.append((method, container, length, sent))
+
+    def _handle(self, method, container, resource, query, body):
+        form = dict(parse_qsl(body.decode(errors='replace'), keep_blank_values=True))
+        emulator = self.emulator
+
+        if container == 'sessions':
+            if method == 'GET' and not resource:
+                return 200, list(emulator.sessions.keys()), None
+            if method == 'GET':
+                if resource not in emulator.sessions:
+                    raise StcEmulatorException('session not found: {}'.format(resource), status=404)
+                session = emulator.sessions[resource]
+                return 200, {'session_id': session.sid, 'user_id': session.user,
+                             'started': session.started}, None
+            if method == 'POST':
+                sid = emulator.new_session(form.get('userid', ''), form.get('sessionname', ''))
+                return 201, {'session_id': sid}, None
+            if method == 'DELETE':
+                emulator.end_session(resource.split('/')[0])
+                return 204, None, None
+
+        if container == 'system':
+            return 200, {'stcapi_version': '3.0.0', 'features': ['bulk-api'] if emulator.bulk else []}, None
+
+        session = self._session()
+
+        if container == 'objects':
+            if method == 'GET':
+                return 200, session.get(resource, [k for k, _ in query]), None
+            if method == 'POST':
+                obj_type = form.pop('object_type')
+                under = form.pop('under', None)
+                return 201, {'handle': session.create(obj_type, under, form)}, None
+            if method == 'PUT':
+                session.config(resource, form)
+                return 204, None, None
+            if method == 'DELETE':
+                session.delete(resource)
+                return 204, None, None
+
+        if container == 'bulk' and (resource or '').startswith('objects/') and method == 'GET' and emulator.bulk:
+            location = resource.split('/', 1)[1]
+            return 200, {'status': 'success', 'objects': session.bulkget(location, [k for k, _ in query])}, None
+
+        if container == 'bulk' and resource == 'objects' and method == 'POST' and emulator.bulk:
+            tree = json.loads(body.decode())
+            obj_type = tree.pop('object_type')
+            under = tree.pop('under', None)
+            return 201, {'status': 'success', 'handles': session.bulkcreate(obj_type, under, tree)}, None
+
+        if container == 'files':
+            if method == 'PUT' and resource:
+                session.files[resource] = body
+                return 201, {'name': resource, 'size': len(body)}, None
+            if method == 'GET' and resource:
+                if resource not in session.files:
+                    raise StcEmulatorException('file not found: {}'.format(resource), status=404)
+                return 200, None, session.files[resource]
+            if method == 'GET':
+                return 200, [{'name': n, 'size': len(d)} for n, d in session.files.items()], None
+            if method == 'DELETE' and resource:
+                session.files.pop(resource, None)
+                return 204, None, None
+
+        if container == 'perform' and method == 'POST':
+            command = form.pop('command')
+            return 200, session.perform(command, form), None
+
+        if container == 'apply':
+            return 204, None, None
+
+        if container == 'connections':
+            if method == 'GET' and resource:
+                return 200, {'IsConnected': resource in emulator.connected}, None
+            if method == 'GET':
+                return 200, list(emulator.connected), None
+            if method == 'PUT':
+                emulator.connected.add(resource)
+                return 200, resource, None
+            if method == 'POST':
+                action = form.pop('action', 'connect')
+                if action == 'connect':
+                    emulator.connected.update(form.keys())
+                    return 200, list(form.keys()), None
+                if action == 'disconnect':
+                    emulator.connected.difference_update(form.keys())
+                return 204, None, None
+            if method == 'DELETE':
+                emulator.connected.discard(resource)
+                return 204, None, None
+
+        if container == 'chassis':
+            if resource:
+                return 200, {'addr': resource, 'connected': resource in emulator.connected}, None
+            return 200, list(emulator.connected), None
+
+        if container == 'log':
+            return 204, None, None
+
+        raise StcEmulatorException('{} {} not supported by emulator.'.format(method, container), status=405)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Run a local stand-in for the STC REST API server.')
+    ap.add_argument('-l', '--loglevel', choices=['all', 'debug', 'info', 'error', 'critical'],
+                    dest='loglevel', default='info')
+    ap.add_argument('-a', '--addr', default='127.0.0.1', help='Address to listen on.')
+    ap.add_argument('-p', '--port', default=8888, type=int, help='Port to listen on.')
+    ap.add_argument('--latency', default=0.0, type=float, help='Seconds to delay every request.')
+    ap.add_argument('--no_bulk', default=False, action='store_true',
+                    help='Do not advertise or support the bulk API.')
+    ap.add_argument('--arp_delay', default=0.0, type=float,
+                    help='Seconds after ArpNDStart before gateways resolve.')
+    ap.add_argument('--command_latency', default=[], action='append', metavar='COMMAND=SECONDS',
+                    help='Extra delay for a perform command, i.e. AttachPorts=1.5. May be given '
+                    'multiple times.')
+    args = ap.parse_args()
+
+    logging.basicConfig(level=args.loglevel.upper())
+
+    command_latency = {}
+    for cl in args.command_latency:
+        cmd, secs = cl.split('=')
+        command_latency[cmd] = float(secs)
+
+    emulator = StcEmulator(args.addr, args.port, args.latency, command_latency, bulk=not args.no_bulk,
+                           arp_delay=args.arp_delay)
+    try:
+        emulator.start()
+        emulator._thread.join()
+    except KeyboardInterrupt:
+        emulator.stop()
+
+    exit(0)
@@ -0,0 +1,253 @@
+import csv
+import json
+import logging
+import os
+import struct
+from time import monotonic
+
+# imported when the first arrow file is opened, not with this module, as it is slow to import.
+pyarrow = None
+
+log = logging.getLogger(__name__)
+
+def _import_pyarrow():
+    '''Import pyarrow, if installed and not imported yet. Returns whether it is available.'''
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow.ipc
+        except ImportError:
+            pass
+
+    return pyarrow is not None
+
+class StcExportException(Exception):
+    pass
+
+class StcResultExporter:
+    '''
+    Hook for StcResults that appends every sample read to a file as the run goes. Samples are
+    buffered and written in chunks, every flush_interval seconds or max_rows samples, whichever
+    comes first, so memory use is bounded and a crash loses at most one flush interval. Each
+    chunk is flushed (and, with fsync, synced) to disk once written. Existing csv and bin files
+    are appended to.
+
+    Formats, all with the columns of StcResultSample, one row per sample:
+
+        csv     - text with a header row.
+        bin     - fixed size little endian records that can be memory mapped as is. The record
+                  layout and the (handle, result_type) of each record's key are in "<path>.json":
+                      meta = json.load(open(path + '.json'))
+                      data = numpy.memmap(path, dtype=[tuple(f) for f in meta['dtype']], mode='r')
+                  A partly written last record (after a crash) is not part of any full record,
+                  so ignore the file's last len % itemsize bytes.
+        arrow   - Arrow IPC stream, one record batch per chunk. Needs pyarrow. Read it with
+                  pyarrow.ipc.open_stream(pyarrow.memory_map(path)).
+    '''
+
+    default_config = {
+        'path': None,           # no export if not given.
+        'format': 'csv',        # csv, bin, or arrow. Guessed from the path's extension if it has one of these.
+        'flush_interval': 5,    # seconds between writes to disk.
+        'max_rows': 10000,      # ...or after this many samples.
+        'fsync': True,          # sync each write so a machine crash does not lose it either.
+    }
+    config_key = 'export'
+
+    formats = ['csv', 'bin', 'arrow']
+
+    # the fields of stc_results.StcResultSample.
+    columns = ['time', 'handle', 'result_type', 'frames', 'bytes', 'frame_rate', 'dropped',
+               'latency_min', 'latency_avg', 'latency_max', 'out_of_seq']
+
+    # bin record layout: the sample columns with handle and result_type replaced by a key.
+    bin_columns = [
+        ('time', '<f8', 'd'),
+        ('key', '<u4', 'I'),
+        ('frames', '<u8', 'Q'),
+        ('bytes', '<u8', 'Q'),
+        ('frame_rate', '<f8', 'd'),
+        ('dropped', '<u8', 'Q'),
+        ('latency_min', '<f8', 'd'),
+        ('latency_avg', '<f8', 'd'),
+        ('latency_max', '<f8', 'd'),
+        ('out_of_seq', '<u8', 'Q'),
+    ]
+    bin_record = struct.Struct('<' + ''.join([c for _, _, c in bin_columns]))
+
+    def __init__(self, path, fmt=None, flush_interval=5, max_rows=10000, fsync=True):
+        ext = os.path.splitext(path)[1].lstrip('.').lower()
+        fmt = fmt if fmt else (ext if ext in StcResultExporter.formats else 'csv')
+        if fmt not in StcResultExporter.formats:
+            raise StcExportException('Unknown export format {}. Use one of {}.'.format(
+                fmt, ', '.join(StcResultExporter.formats)))
+        if fmt == 'arrow' and not _import_pyarrow():
+            raise StcExportException('Exporting to arrow needs the pyarrow package. pip install pyarrow.')
+
+        self._path = path
+        self._format = fmt
+        self._flush_interval = flush_interval
+        self._max_rows = max_rows
+        self._fsync = fsync
+        self._rows = []
+        self._last_flush = monotonic()
+        self._written = 0
+        self._keys = {}       # bin: (handle, result_type) --> key
+        self._fd = None
+        self._writer = None   # csv.writer or pyarrow.ipc stream writer.
+        self._schema = None   # arrow.
+        self._open()
+
+    @staticmethod
+    def from_config(config):
+        '''The exporter the "export" section of the given StcConfig asks for, None if no path.'''
+        conf = config.data.get(StcResultExporter.config_key, {})
+        if not conf.get('path'):
+            return None
+
+        return StcResultExporter(conf['path'], fmt=conf.get('format'),
+                                 flush_interval=conf.get('flush_interval', 5),
+                                 max_rows=conf.get('max_rows', 10000), fsync=conf.get('fsync', True))
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def format(self):
+        return self._format
+
+    @property
+    def written(self):
+        '''Number of samples written to disk so far.'''
+        return self._written
+
+    def _meta_path(self):
+        return self._path + '.json'
+
+    def _open(self):
+        if self._format == 'csv':
+            exists = os.path.isfile(self._path) and os.path.getsize(self._path) > 0
+            if exists:
+                with open(self._path, newline='') as fd:
+                    header = next(csv.reader(fd), [])
+                if header != StcResultExporter.columns:
+                    raise StcExportException('{} has different columns than the samples: {}'.format(
+                        self._path, ','.join(header)))
+
+            self._fd = open(self._path, 'a', newline='')
+            self._writer = csv.writer(self._fd)
+            if not exists:
+                self._writer.writerow(StcResultExporter.columns)
+                self._sync()
+
+        elif self._format == 'bin':
+            if os.path.isfile(self._meta_path()):
+                with open(self._meta_path()) as fd:
+                    meta = json.load(fd)
+                if meta['dtype'] != [[n, d] for n, d, _ in StcResultExporter.bin_columns]:
+                    raise StcExportException('{} has a different record layout.'.format(self._path))
+                self._keys = {tuple(k): i for i, k in enumerate(meta['keys'])}
+            else:
+                self._write_meta()
+
+            self._fd = open(self._path, 'ab')
+            # drop a partial record left by a crash so the records stay aligned.
+            extra = self._fd.tell() % StcResultExporter.bin_record.size
+            if extra:
+                log.warning('Dropping {} bytes of a partly written record at the end of {}'.format(
+                    extra, self._path))
+                self._fd.truncate(self._fd.tell() - extra)
+
+        else:
+            if os.path.exists(self._path):
+                raise StcExportException('Arrow streams can not be appended to and {} exists.'.format(self._path))
+
+            self._schema = pyarrow.schema([
+                ('time', pyarrow.float64()),
+                ('handle', pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+                ('result_type', pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+                ('frames', pyarrow.uint64()),
+                ('bytes', pyarrow.uint64()),
+                ('frame_rate', pyarrow.float64()),
+                ('dropped', pyarrow.uint64()),
+                ('latency_min', pyarrow.float64()),
+                ('latency_avg', pyarrow.float64()),
+                ('latency_max', pyarrow.float64()),
+                ('out_of_seq', pyarrow.uint64()),
+            ])
+            self._fd = open(self._path, 'wb')
+            self._writer = pyarrow.ipc.new_stream(self._fd, self._schema)
+
+    def _write_meta(self):
+        # written next to the file and renamed into place, so it is never seen half written.
+        meta = {
+            'dtype': [[n, d] for n, d, _ in StcResultExporter.bin_columns],
+            'keys': [list(k) for k, _ in sorted(self._keys.items(), key=lambda i: i[1])],
+        }
+        tmp = self._meta_path() + '.tmp'
+        with open(tmp, 'w') as fd:
+            json.dump(meta, fd)
+            fd.flush()
+            if self._fsync:
+                os.fsync(fd.fileno())
+        os.replace(tmp, self._meta_path())
+
+    def _sync(self):
+        self._fd.flush()
+        if self._fsync:
+            os.fsync(self._fd.fileno())
+
+    def __call__(self, samples):
+        self._rows += samples
+        if len(self._rows) >= self._max_rows or monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def flush(self):
+        '''Write the buffered samples to disk.'''
+        rows, self._rows = self._rows, []
+        self._last_flush = monotonic()
+        if not rows:
+            return
+
+        if self._format == 'csv':
+            self._writer.writerows(rows)
+
+        elif self._format == 'bin':
+            new_keys = False
+            for s in rows:
+                if (s.handle, s.result_type) not in self._keys:
+                    self._keys[(s.handle, s.result_type)] = len(self._keys)
+                    new_keys = True
+            # the keys must be on disk before any record that uses them.
+            if new_keys:
+                self._write_meta()
+
+            pack = StcResultExporter.bin_record.pack
+            self._fd.write(b''.join([pack(s.time, self._keys[(s.handle, s.result_type)], s.frames, s.bytes,
+                                          s.frame_rate, s.dropped, s.latency_min, s.latency_avg,
+                                          s.latency_max, s.out_of_seq) for s in rows]))
+
+        else:
+            arrays = []
+            for column, field in zip(zip(*rows), self._schema):
+                if pyarrow.types.is_dictionary(field.type):
+                    arrays.append(pyarrow.array(column, type=pyarrow.string()).dictionary_encode())
+                else:
+                    arrays.append(pyarrow.array(column, type=field.type))
+            self._writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=self._schema))
+
+        self._sync()
+        self._written += len(rows)
+        log.debug('Exported {} sample(s) to {}'.format(len(rows), self._path))
+
+    def close(self):
+        if not self._fd:
+            return
+
+        self.flush()
+        if self._format == 'arrow':
+            self._writer.close()
+        self._fd.close()
+        self._fd = None
+        log.info('Exported {} sample(s) to {}'.format(self._written, self._path))
@@ -0,0 +1,142 @@
+import logging
+from time import time
+
+log = logging.getLogger(__name__)
+
+class StcFrameCache:
+    '''
+    Streamblocks (with their PDUs) kept in the session for reuse, keyed by a hash of the
+    config sections they were built from (see StcStreamblock.frame_key()). A flow whose
+    streamblock, ethernetII, and ipv4 config hash to the key of a kept streamblock on the same
+    port gets that streamblock back instead of a new one: no REST calls to build it and, as the
+    port stayed attached, no ARP either.
+
+    Streamblocks no longer used by the traffic profile are stopped and set inactive (so a
+    GeneratorStart does not send them) and kept in the session state, most recently used
+    last. Past max_entries the least recently used are deleted. They are all gone when the
+    ports are detached or the session ends.
+
+    With keep_ports, traffic_stop sets the streamblocks aside here and leaves the ports
+    attached instead of deleting everything, so the next traffic_start with an unchanged
+    config only has to start traffic.
+    '''
+
+    default_config = {
+        'max_entries': 32,      # streamblocks kept aside. 0 to keep none.
+        'keep_ports': False,    # traffic_stop keeps the ports and streamblocks for the next traffic_start.
+    }
+    config_key = 'frame_cache'
+
+    def __init__(self, session, config=None):
+        conf = (config if config else session.config).data[StcFrameCache.config_key]
+        self._session = session
+        self._max_entries = conf['max_entries']
+        self._keep_ports = conf['keep_ports']
+
+    @property
+    def keep_ports(self):
+        return self._keep_ports
+
+    def _entries(self):
+        return self._session.state.setdefault('frame_cache', [])
+
+    def __len__(self):
+        return len(self._session.state.get('frame_cache', []))
+
+    def _set_active(self, entries, active):
+        for e in entries:
+            self._session.stc.config(e['handle'], {'Active': 'TRUE' if active else 'FALSE'})
+
+        if entries:
+            self._session.mark_dirty()
+
+    def claim(self, wanted, exclusive=True):
+        '''
+        Find a streamblock for each of the wanted (key, port) pairs, from the streamblocks the
+        session has now or, failing that, from the cache. Returns a list with the session state
+        entry of the streamblock for each pair, None where there is none to reuse. The session's
+        streamblocks become the ones returned; any others it had are set aside in the cache.
+        If not exclusive, the session's other streamblocks are left as they are, so several
+        traffic profiles can share the session.
+        '''
+        state = self._session.state
+        current = list(state.get('streamblocks', []))
+        found = [None] * len(wanted)
+
+        def _find(entries, key, port):
+            for e in entries:
+                if e.get('key') == key and e['port'] == port:
+                    entries.remove(e)
+                    return e
+            return None
+
+        for i, (key, port) in enumerate(wanted):
+            found[i] = _find(current, key, port)
+
+        if exclusive:
+            self.retire(current)
+
+        cached = self._entries()
+        revived = []
+        for i, (key, port) in enumerate(wanted):
+            if found[i] is None:
+                found[i] = _find(cached, key, port)
+                if found[i] is not None:
+                    revived.append(found[i])
+
+        if revived:
+            log.info('Reusing {} cached streamblock(s): {}'.format(len(revived), ' '.join([e['handle'] for e in revived])))
+            self._set_active(revived, True)
+
+        for e in revived:
+            e.pop('used', None)
+        if exclusive:
+            state['streamblocks'] = [e for e in found if e is not None]
+        else:
+            state['streamblocks'] = current + [e for e in found if e is not None]
+        return found
+
+    def retire(self, entries=None):
+        '''Stop the given session streamblock state entries (by default all the session's
+        streamblocks), set them inactive, and keep them in the cache.'''
+        state = self._session.state
+        entries = list(state.get('streamblocks', [])) if entries is None else entries
+        if not entries:
+            return
+
+        running = [e['handle'] for e in entries if e.get('running')]
+        if running:
+            log.info('Stopping streamblocks {}'.format(' '.join(running)))
+            self._session.perform('StreamBlockStop', streamblocklist=' '.join(running))
+
+        handles = [e['handle'] for e in entries]
+        state['streamblocks'] = [e for e in state.get('streamblocks', []) if e['handle'] not in handles]
+        # streamblocks without a key were not made by a traffic profile, so can not be matched.
+        keep = [e for e in entries if e.get('key')] if self._max_entries > 0 else []
+        self.evict([e for e in entries if e not in keep])
+
+        if keep:
+            log.info('Keeping {} streamblock(s) for reuse: {}'.format(len(keep), ' '.join([e['handle'] for e in keep])))
+        self._set_active(keep, False)
+        now = time()
+        for e in keep:
+            e['running'] = False
+            e['used'] = now
+            self._entries().append(e)
+
+        extra = len(self._entries()) - self._max_entries
+        if extra > 0:
+            self.evict(self._entries()[:extra])
+
+    def evict(self, entries=None):
+        '''Delete the given cache entries (by default all of them) from the session.'''
+        cached = self._entries()
+        entries = list(cached) if entries is None else entries
+        for e in entries:
+            log.info('Deleting cached streamblock {}/{}.'.format(e['handle'], e['port']))
+            self._session.stc.delete(e['handle'])
+            if e in cached:
+                cached.remove(e)
+
+        if entries:
+            self._session.mark_dirty()
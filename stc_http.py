@@ -0,0 +1,143 @@
+import logging
+import os
+import requests
+from stcrestclient import stchttp, resthttp
+
+log = logging.getLogger(__name__)
+
+class StcKeepAliveRest(resthttp.RestHttp):
+    '''
+    resthttp.RestHttp sends every request with the module level requests.get/post/...
+    calls, which open (and close) a new TCP connection each time. This version sends
+    them through one requests.Session so the connection to the STC server is kept
+    alive and reused.
+    '''
+
+    def __init__(self, rest):
+        # take over the settings (and session header) of an existing RestHttp.
+        self.__dict__.update(rest.__dict__)
+        self._session = requests.Session()
+        self.bytes_sent = 0        # request and response body bytes, for tracing.
+        self.bytes_received = 0
+
+    def _send(self, method, url, headers, **kwargs):
+        try:
+            rsp = self._session.request(method, url, headers=headers, verify=self._verify,
+                                        timeout=self._timeout, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            resthttp.RestHttp._raise_conn_error(e)
+
+        body = rsp.request.body if rsp.request.body else b''
+        if isinstance(body, (str, bytes)):    # uploads stream a file and count themselves.
+            self.bytes_sent += len(body.encode() if isinstance(body, str) else body)
+        if not kwargs.get('stream'):
+            self.bytes_received += len(rsp.content)
+
+        if self._dbg_print:
+            print('===> {} {}'.format(method, rsp.url))
+
+        return rsp
+
+    def _url(self, container, resource, query_items):
+        url = self.make_url(container, resource)
+        if query_items and isinstance(query_items, (list, tuple, set)):
+            url += resthttp.RestHttp._list_query_str(query_items)
+            query_items = None
+
+        return url, query_items
+
+    def get_request(self, container, resource=None, query_items=None, accept=None, to_lower=False):
+        url, query_items = self._url(container, resource, query_items)
+        rsp = self._send('GET', url, self._make_headers(accept), params=query_items)
+        return self._handle_response(rsp, to_lower)
+
+    def post_request(self, container, resource=None, params=None, accept=None):
+        rsp = self._send('POST', self.make_url(container, resource), self._make_headers(accept), data=params)
+        return self._handle_response(rsp)
+
+    def put_request(self, container, resource=None, params=None, accept=None):
+        rsp = self._send('PUT', self.make_url(container, resource), self._make_headers(accept), data=params)
+        return self._handle_response(rsp)
+
+    def delete_request(self, container, resource=None, query_items=None, accept=None):
+        url, query_items = self._url(container, resource, query_items)
+        rsp = self._send('DELETE', url, self._make_headers(accept), params=query_items)
+        return self._handle_response(rsp)
+
+    def bulk_get_request(self, container, resource=None, query_items=None, depth=1, accept=None, to_lower=False):
+        url, query_items = self._url(container, resource, query_items)
+        headers = dict(self._make_headers(accept))
+        headers['X-STC-API-Children-Depth'] = str(depth)
+        rsp = self._send('GET', url, headers, params=query_items)
+        return self._handle_response(rsp, to_lower)
+
+    def bulk_post_request(self, container, resource=None, params=None, accept=None):
+        headers = dict(self._make_headers(accept))
+        headers['content-type'] = 'application/json'
+        rsp = self._send('POST', self.make_url(container, resource), headers, data=params)
+        return self._handle_response(rsp)
+
+    def bulk_put_request(self, container, resource=None, params=None, accept=None):
+        headers = dict(self._make_headers(accept))
+        headers['content-type'] = 'application/json'
+        rsp = self._send('PUT', self.make_url(container, resource), headers, data=params)
+        return self._handle_response(rsp)
+
+    def upload_file(self, container, src_file_path, dst_name=None, put=True, content_type=None):
+        if not os.path.exists(src_file_path):
+            raise RuntimeError('file not found: ' + src_file_path)
+
+        dst_name = dst_name if dst_name else os.path.basename(src_file_path)
+        headers = dict(self._base_headers)
+        headers['content-length'] = str(os.path.getsize(src_file_path))
+        headers['content-disposition'] = 'attachment; filename=' + dst_name
+        url = self.make_url(container, dst_name if put else None)
+        with open(src_file_path, 'rb') as fd:
+            rsp = self._send('PUT' if put else 'POST', url, headers, data=fd)
+
+        self.bytes_sent += os.path.getsize(src_file_path)
+        return self._handle_response(rsp)
+
+    def download_file(self, container, resource, save_path=None, accept=None, query_items=None):
+        resource = resource.replace('\\', '/')
+        url, query_items = self._url(container, resource, query_items)
+        save_path = save_path if save_path else resource.split('/')[-1]
+        rsp = self._send('GET', url, self._make_headers(accept), params=query_items, stream=True)
+        try:
+            if rsp.status_code >= 300:
+                raise resthttp.RestHttpError(rsp.status_code, rsp.reason, rsp.text)
+
+            with open(save_path, 'wb') as fd:
+                for chunk in rsp.iter_content(chunk_size=65536):
+                    fd.write(chunk)
+                    self.bytes_received += len(chunk)
+        finally:
+            rsp.close()
+
+        return rsp.status_code, save_path, os.path.getsize(save_path)
+
+    def close(self):
+        self._session.close()
+
+class StcKeepAliveHttp(stchttp.StcHttp):
+    '''stchttp.StcHttp that keeps its connection to the STC server open between calls.'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rest = StcKeepAliveRest(self._rest)
+
+    def close(self):
+        self._rest.close()
+
+    def fork(self):
+        '''A client for the same server and session with a connection (and byte counts) of its
+        own, for another thread to use. No request is sent to make it.'''
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone._rest = StcKeepAliveRest(self._rest)
+        clone._rest._base_headers = dict(self._rest._base_headers)
+        return clone
+
+    def bytes_transferred(self):
+        '''Return (bytes sent, bytes received) in request and response bodies so far.'''
+        return self._rest.bytes_sent, self._rest.bytes_received
@@ -0,0 +1,193 @@
+import logging
+import os
+import re
+import socket
+import threading
+from getpass import getuser
+from time import time
+
+log = logging.getLogger(__name__)
+
+class StcSessionLease:
+    '''
+    A lease on an STC session, renewed for as long as the session is in use, so sessions left
+    behind by scripts that died (keep_open is the default) can be told from live ones and ended
+    by StcSessionCleaner(expired=True), i.e. "spirent_clear_sessions.py --expired".
+
+    The lease is an expiry time, ttl seconds after the last renewal, and who holds it. It is
+    kept in the state file ("lease") and, so a reaper on any machine can see it without the
+    state file, on the server as the Name of a Tag object of its own in the session's project:
+
+        stc-lease <expiry, seconds since the epoch> <user>@<host>:<pid>
+
+    The lease Tag is not part of the project as far as the user is concerned: save_project()
+    strips it from saved configurations and load_project() deletes any a loaded one brings
+    along, so a session can not pick up the (long expired) lease of the session it was saved
+    from.
+
+    StcSession renews the lease each time it connects (one REST call per spirent_session.py
+    run), so after any command the session is leased for the full ttl. While it stays connected
+    a background thread checks the lease every heartbeat seconds and renews it once less than
+    half of ttl is left. So a session held by a daemon or a long run stays leased, and one whose
+    client went away expires ttl seconds after the client was last heard from. Traffic left
+    running between commands without the daemon is only covered for ttl after the last one.
+    AsyncStcSession keeps a lease the same way.
+    '''
+
+    default_config = {
+        'enabled': True,      # lease the session.
+        'ttl': 14400,         # seconds a lease lasts unless renewed. Without the daemon, the longest gap between commands.
+        'heartbeat': 60,      # seconds between renewals while connected. 0 to only renew on connect.
+    }
+    config_key = 'lease'
+
+    prefix = 'stc-lease'
+    lease_type = 'Tag'      # the object the lease is kept in, under the session's project.
+    renew_at = 0.5          # renew once less than this part of ttl is left.
+
+    # a lease Tag element in a saved configuration.
+    lease_xml = re.compile(r'<(?P<tag>(\w+:)?{})\b[^>]*\bname="{} [^"]*"[^>]*?(/>|>\s*</(?P=tag)>)\s*'.format(
+        lease_type, prefix), re.IGNORECASE)
+
+    def __init__(self, session, config=None):
+        conf = (config if config else session.config).data[StcSessionLease.config_key]
+        self._session = session
+        self._enabled = conf['enabled']
+        self._ttl = conf['ttl']
+        self._heartbeat = conf['heartbeat']
+        self._hooks = []
+        self._stop = None
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @property
+    def heartbeat(self):
+        return self._heartbeat
+
+    def add_hook(self, hook):
+        '''Call hook with the lease dict after each renewal. Called from the heartbeat thread.'''
+        self._hooks.append(hook)
+
+    @staticmethod
+    def holder():
+        return '{}@{}:{}'.format(getuser(), socket.gethostname(), os.getpid())
+
+    @staticmethod
+    def encode(lease):
+        '''The lease Tag's Name for a lease.'''
+        return '{} {} {}'.format(StcSessionLease.prefix, int(lease['expires']), lease['holder'])
+
+    @staticmethod
+    def decode(name):
+        '''The lease dict of a lease Tag's Name, None if it is not a lease.'''
+        parts = name.split(' ', 2) if name else []
+        if len(parts) < 2 or parts[0] != StcSessionLease.prefix:
+            return None
+
+        try:
+            return {'expires': float(parts[1]), 'holder': parts[2] if len(parts) > 2 else ''}
+        except ValueError:
+            return None
+
+    def due(self):
+        '''True if the session has no lease or it is time to renew it.'''
+        lease = self._session.state.get('lease')
+        return (not lease or not lease.get('handle') or
+                lease['expires'] - time() < self._ttl * StcSessionLease.renew_at)
+
+    def keep(self, stc=None):
+        '''Renew the lease if it is due. Returns the lease if renewed, else None.'''
+        return self.renew(stc) if self.due() else None
+
+    def fresh(self):
+        '''A lease held by this process until ttl seconds from now, without its handle.'''
+        return {'holder': StcSessionLease.holder(), 'expires': time() + self._ttl}
+
+    def renew(self, stc=None):
+        '''Push the lease out to ttl seconds from now, on the server (with the given REST
+        client, by default the session's) and in the state. Returns the lease.'''
+        stc = stc if stc else self._session.stc
+        held = self._session.state.get('lease') or {}
+        lease = self.fresh()
+        name = StcSessionLease.encode(lease)
+        if held.get('handle'):
+            stc.config(held['handle'], {'Name': name})
+            lease['handle'] = held['handle']
+        else:
+            lease['handle'] = stc.create(StcSessionLease.lease_type, under=self._session.project_handle, Name=name)
+        self._session.state['lease'] = lease
+        log.debug('Renewed lease on session {} until {:.0f}'.format(self._session.state['sid'], lease['expires']))
+        for hook in self._hooks:
+            hook(lease)
+
+        return lease
+
+    def reset(self):
+        '''Delete the lease objects in the session's project, i.e. ones a loaded configuration
+        came with, and lease the session afresh if enabled.'''
+        stc = self._session.stc
+        project = self._session.project_handle
+        for h in stc.get(project, 'children-{}'.format(StcSessionLease.lease_type.lower())).split():
+            if StcSessionLease.decode(stc.get(h, 'Name')):
+                log.info('Deleting lease {} of the loaded project.'.format(h))
+                stc.delete(h)
+
+        self._session.state.pop('lease', None)
+        if self._enabled:
+            self.renew()
+
+    @staticmethod
+    def strip(path):
+        '''Remove the lease from the saved configuration (XML) file at path.'''
+        with open(path) as fd:
+            data = fd.read()
+
+        stripped = StcSessionLease.lease_xml.sub('', data)
+        if stripped != data:
+            with open(path, 'w') as fd:
+                fd.write(stripped)
+
+    def start(self):
+        '''Renew the lease every heartbeat seconds from a background thread until stop().'''
+        if not self._enabled or not self._heartbeat or self._thread:
+            return
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name='stc-lease', daemon=True)
+        self._thread.start()
+
+    def _beat(self):
+        # the session's client is not shared between threads, so the heartbeat has its own,
+        # made the first time the lease is due. Short lived scripts never get that far.
+        stc = None
+        while not self._stop.wait(self._heartbeat):
+            if not self.due():
+                continue
+
+            try:
+                if not stc:
+                    from stc_http import StcKeepAliveHttp
+                    conf = self._session.config.data['stc_session']
+                    stc = StcKeepAliveHttp(conf['stc_server_addr'], port=conf['stc_server_port'])
+                    stc.join_session(self._session.state['sid'])
+                self.renew(stc)
+            except Exception as e:
+                log.warning('Unable to renew the session lease: {}'.format(e))
+                if stc:
+                    stc.close()
+                stc = None
+
+        if stc:
+            stc.close()
+
+    def stop(self):
+        '''Stop renewing. The lease runs out ttl seconds after the last renewal.'''
+        if not self._thread:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,170 @@
+import logging
+import json
+
+from stc_ipv4 import StcIPv4
+
+log = logging.getLogger(__name__)
+
+class StcModifierException(Exception):
+    pass
+
+class StcModifiers:
+    '''
+    Modifiers that vary the IPv4 source and destination addresses, protocol, and frame length
+    of a streamblock's frames on the chassis, so one streamblock sends many flows. The number of
+    REST objects (and the setup time) stays the same however many flows there are: a modifier
+    is one more object in the streamblock's bulk create.
+
+    The "modifiers" config section maps a field to its modifier:
+
+        "modifiers": {
+            "sourceAddr": {"type": "range", "start": "10.8.1.25", "step": "0.0.0.1", "count": 1000},
+            "destAddr": {"type": "random", "mask": "0.0.3.255", "count": 1024},
+            "protocol": {"type": "table", "values": [6, 17]},
+            "frame_length": {"type": "imix", "slots": [[64, 7], [594, 4], [1518, 1]]}
+        }
+
+    IPv4 fields (sourceAddr, destAddr, protocol):
+        range   - start (default the ipv4 config value), step, count, mask, mode (INCR, DECR,
+                  or SHUFFLE), and repeat (times each value is sent before the next).
+        random  - mask (the bits to randomize) and count (values before starting over).
+        table   - values, sent in turn, and repeat.
+      Each may give "stream": true to make every value its own stream, with its own results,
+      instead of modifying frames on the fly.
+
+    frame_length:
+        range   - min, max, step, and mode (INCR or DECR).
+        random  - min and max.
+        imix    - slots, [length, weight] pairs, or the name of one in StcModifiers.imix. Each
+                  distinct IMIX is created once per session and shared by the streamblocks.
+    '''
+
+    default_config = {}     # field --> modifier. No modifiers by default.
+    config_key = 'modifiers'
+
+    # the IPv4 fields that can be modified, their mask and step, and the modifier types.
+    ipv4_fields = {
+        'sourceAddr': ('255.255.255.255', '0.0.0.1'),
+        'destAddr': ('255.255.255.255', '0.0.0.1'),
+        'protocol': ('255', '1'),
+    }
+    types = ['range', 'random', 'table']
+    frame_length_types = ['range', 'random', 'imix']
+
+    # named IMIX distributions, [frame length, weight] slots.
+    imix = {
+        'simple': [[64, 7], [594, 4], [1518, 1]],
+        'ipv6_simple': [[78, 7], [594, 4], [1518, 1]],
+    }
+
+    # the name given to a streamblock's IPv4 PDU, which the modifiers refer to its fields by.
+    ipv4_name = 'ipv4_1'
+
+    def __init__(self, session, config=None):
+        self._session = session
+        self._stc_config = config if config else session.config
+        self._conf = self._stc_config.data.get(StcModifiers.config_key, {})
+        for field, mod in self._conf.items():
+            types = StcModifiers.frame_length_types if field == 'frame_length' else StcModifiers.types
+            if field != 'frame_length' and field not in StcModifiers.ipv4_fields:
+                raise StcModifierException('Can not modify {}. Use one of {}.'.format(
+                    field, ', '.join(['frame_length'] + list(StcModifiers.ipv4_fields))))
+            if mod.get('type') not in types:
+                raise StcModifierException('Unknown {} modifier type {}. Use one of {}.'.format(
+                    field, mod.get('type'), ', '.join(types)))
+
+    @property
+    def ipv4(self):
+        '''True if any IPv4 field is modified.'''
+        return bool([f for f in self._conf if f in StcModifiers.ipv4_fields])
+
+    def flows(self):
+        '''How many source address, destination address, and protocol combinations the
+        streamblock sends.'''
+        n = 1
+        for field, mod in self._conf.items():
+            if field in StcModifiers.ipv4_fields:
+                n *= len(mod['values']) if mod['type'] == 'table' else int(mod.get('count', 1))
+
+        return n
+
+    def _slots(self, slots):
+        if isinstance(slots, str):
+            if slots not in StcModifiers.imix:
+                raise StcModifierException('Unknown IMIX {}. Use one of {}.'.format(
+                    slots, ', '.join(StcModifiers.imix)))
+            slots = StcModifiers.imix[slots]
+
+        return [[int(length), int(weight)] for length, weight in slots]
+
+    def distribution(self, slots):
+        '''The handle of the session's FrameLengthDistribution with the given [length, weight]
+        slots, created the first time it is asked for and kept in the session state.'''
+        slots = self._slots(slots)
+        key = json.dumps(slots)
+        known = self._session.state.setdefault('imix', {})
+        if key in known:
+            return known[key]
+
+        # made right away, not in a session batch, as the streamblocks refer to it when created.
+        stc = self._session.stc
+        h = stc.create('FrameLengthDistribution', under=self._session.project_handle)
+        for length, weight in slots:
+            stc.create('FrameLengthDistributionSlot', under=h, LengthType='FIXED',
+                       FixedFrameLength=str(length), Weight=str(weight))
+        self._session.mark_dirty()
+        log.info('Created frame length distribution {}: {}'.format(h, slots))
+        known[key] = h
+        return h
+
+    def streamblock_attrs(self):
+        '''The streamblock attributes of the frame length modifier, if any.'''
+        mod = self._conf.get('frame_length')
+        if not mod:
+            return {}
+
+        if mod['type'] == 'imix':
+            return {'FrameLengthMode': 'IMIX',
+                    'AffiliationFrameLengthDistribution-targets': self.distribution(mod['slots'])}
+
+        attrs = {
+            'FrameLengthMode': 'RANDOM' if mod['type'] == 'random' else mod.get('mode', 'INCR'),
+            'MinFrameLength': str(mod['min']),
+            'MaxFrameLength': str(mod['max']),
+        }
+        if mod['type'] == 'range':
+            attrs['StepFrameLength'] = str(mod.get('step', 1))
+
+        return attrs
+
+    def create(self, streamblock):
+        '''Create the IPv4 field modifiers under the given streamblock, with the session's
+        create_obj(), so in a batch they go in the streamblock's bulk create. Returns their handles.'''
+        handles = []
+        ipv4 = self._stc_config.data[StcIPv4.config_key]
+        for field, mod in self._conf.items():
+            if field not in StcModifiers.ipv4_fields:
+                continue
+
+            mask, step = StcModifiers.ipv4_fields[field]
+            attrs = {
+                'OffsetReference': '{}.{}'.format(StcModifiers.ipv4_name, field),
+                'EnableStream': bool(mod.get('stream', False)),
+            }
+            if mod['type'] == 'range':
+                obj = 'RangeModifier'
+                attrs.update({'Data': str(mod.get('start', ipv4[field])), 'StepValue': str(mod.get('step', step)),
+                              'Mask': str(mod.get('mask', mask)), 'RecycleCount': str(mod.get('count', 1)),
+                              'RepeatCount': str(mod.get('repeat', 0)), 'ModifierMode': mod.get('mode', 'INCR')})
+            elif mod['type'] == 'random':
+                obj = 'RandomModifier'
+                attrs.update({'Mask': str(mod.get('mask', mask)), 'RecycleCount': str(mod.get('count', 1))})
+            else:
+                obj = 'TableModifier'
+                attrs.update({'Data': ' '.join([str(v) for v in mod['values']]),
+                              'RepeatCount': str(mod.get('repeat', 0))})
+
+            log.debug('Adding {} on {} to {}'.format(obj, field, streamblock))
+            handles.append(self._session.create_obj(obj, streamblock, attrs))
+
+        return handles
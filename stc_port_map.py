@@ -0,0 +1,98 @@
+import logging
+from ipaddress import IPv4Network
+from socket import inet_aton
+from struct import unpack
+
+log = logging.getLogger(__name__)
+
+class StcPortMapException(Exception):
+    pass
+
+class StcPortMap:
+    '''
+    Which chassis port an address's traffic goes through: a table of IPv4 subnets (or single
+    addresses) to chassis port locations, "//chassis/slot/port". An address maps to the port of
+    the longest prefix that holds it, so a /24 can be carved out of a /16 on another port.
+    The ports may be on any slot of any number of chassis.
+
+        "port_map": {"map": {"10.8.0.0/16": "//10.237.192.20/5/8",
+                             "10.9.0.0/16": "//10.237.192.21/1/2",
+                             "10.9.7.0/24": "//10.237.192.22/3/1"}}
+
+    Lookups check one dict per distinct prefix length in the table, longest first, and the
+    result for each address is remembered, so mapping the addresses of thousands of flows is
+    cheap. An empty map is the ilab rule: port number = the address's second octet, on the
+    "slot" of the "chassis_addr" of the stc_session config.
+    '''
+
+    default_config = {
+        'map': {},      # subnet or address --> chassis port location.
+    }
+    config_key = 'port_map'
+
+    def __init__(self, table=None, chassis_addr=None, slot=None):
+        self._chassis_addr = chassis_addr
+        self._slot = slot
+        self._by_len = {}    # prefix length --> {network as int: location}
+        self._found = {}     # address --> location
+        self._chassis = [chassis_addr] if not table else []
+        for prefix, location in (table if table else {}).items():
+            if not location.startswith('//') or len(location[2:].split('/')) != 3:
+                raise StcPortMapException('Bad port location {} for {}. Use //chassis/slot/port.'.format(
+                    location, prefix))
+            try:
+                net = IPv4Network(prefix, strict=False)
+            except ValueError as e:
+                raise StcPortMapException('Bad subnet {}: {}'.format(prefix, e))
+
+            self._by_len.setdefault(net.prefixlen, {})[int(net.network_address)] = location
+            if StcPortMap.chassis_of(location) not in self._chassis:
+                self._chassis.append(StcPortMap.chassis_of(location))
+
+        # (prefix length, mask) longest first.
+        self._masks = [(n, (0xffffffff << (32 - n)) & 0xffffffff) for n in sorted(self._by_len, reverse=True)]
+
+    @staticmethod
+    def from_config(config):
+        '''The port map of the given StcConfig's "port_map" and "stc_session" sections.'''
+        session_conf = config.data.get('stc_session', {})
+        return StcPortMap(config.data.get(StcPortMap.config_key, {}).get('map'),
+                          session_conf.get('chassis_addr'), session_conf.get('slot'))
+
+    def __len__(self):
+        return sum([len(nets) for nets in self._by_len.values()])
+
+    def location(self, addr):
+        '''The chassis port location that an IP address maps to.'''
+        if addr in self._found:
+            return self._found[addr]
+
+        if not self._by_len:
+            # IP addresses map directly to port in our VERY VERY SPECIFIC setup.
+            location = '//{}/{}/{}'.format(self._chassis_addr, self._slot, addr.split('.')[1])
+        else:
+            try:
+                ip = unpack('!I', inet_aton(addr))[0]
+            except OSError:
+                raise StcPortMapException('Bad address {}'.format(addr))
+
+            location = None
+            for n, mask in self._masks:
+                location = self._by_len[n].get(ip & mask)
+                if location:
+                    break
+
+            if not location:
+                raise StcPortMapException('No port for {} in the port map.'.format(addr))
+
+        self._found[addr] = location
+        return location
+
+    @staticmethod
+    def chassis_of(location):
+        '''The chassis address of a port location.'''
+        return location[2:].split('/')[0]
+
+    def chassis(self):
+        '''The chassis addresses of the ports in the map, in the order they first appear.'''
+        return list(self._chassis)
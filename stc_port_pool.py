@@ -0,0 +1,107 @@
+import logging
+from time import time
+
+log = logging.getLogger(__name__)
+
+class StcPortPoolException(Exception):
+    pass
+
+class StcPortPool:
+    '''
+    Chassis ports kept attached in the session for as long as it lasts, and leased out to
+    traffic profiles as they need them. AttachPorts is one of the slowest chassis operations,
+    so with the pool enabled traffic_stop returns the ports of its flows to the pool instead of
+    detaching them, and the next traffic_start, for the same flows or for other enclave pairs,
+    only attaches ports the session does not have yet.
+
+    The configured locations are attached up front, all with one AttachPorts, by "create" (or
+    the first lease). Other ports are attached the first time they are leased and stay in the
+    pool from then on. Leases are kept in the session state file, port handle --> owner and
+    expiry time, so they last across spirent_session.py runs. A lease lasts lease_time seconds
+    and is renewed each time the port is leased again; when it runs out (i.e. the experiment
+    that held it died without a traffic_stop) the port is detached, so it comes back fresh the
+    next time it is needed. Ports with no lease stay attached until the session is destroyed.
+    '''
+
+    default_config = {
+        'enabled': False,     # traffic_start leases ports from the pool and traffic_stop returns them.
+        'locations': [],      # chassis port locations, i.e. "//10.237.192.20/5/8", to attach up front.
+        'lease_time': 3600,   # seconds until an unreturned lease expires and its port is detached.
+    }
+    config_key = 'port_pool'
+
+    def __init__(self, session, config=None):
+        conf = (config if config else session.config).data[StcPortPool.config_key]
+        self._session = session
+        self._enabled = conf['enabled']
+        self._locations = conf['locations']
+        self._lease_time = conf['lease_time']
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @property
+    def leases(self):
+        '''{port handle: {'owner': owner, 'expires': time}} of the current leases.'''
+        return self._session.state.setdefault('port_leases', {})
+
+    @property
+    def idle(self):
+        '''Handles of the attached ports that are not leased.'''
+        return [p for p in self._session.state.get('ports', []) if p not in self.leases]
+
+    def attach(self, workers=1):
+        '''Attach the configured locations the session does not have yet. Returns their port handles.'''
+        self.reap()
+        if not self._locations:
+            return []
+
+        return self._session.reserve_locations(self._locations, workers=workers)
+
+    def lease(self, addrs, owner=None, workers=1):
+        '''Lease the ports that map to the given addresses, attaching any the session does not
+        have yet. Returns the port handles in the order of the addresses, like
+        StcSession.reserve_ports(). A port leased to another owner raises StcPortPoolException.'''
+        self.attach(workers=workers)
+        handles = self._session.reserve_ports(addrs, workers=workers)
+
+        leases = self.leases
+        for port in handles:
+            held = leases.get(port)
+            if held and held['owner'] != owner:
+                raise StcPortPoolException('Port {} is leased to {} until {}.'.format(
+                    port, held['owner'], held['expires']))
+
+        expires = time() + self._lease_time
+        for port in set(handles):
+            if port not in leases:
+                log.info('Leasing port {}{}'.format(port, ' to {}'.format(owner) if owner else ''))
+            leases[port] = {'owner': owner, 'expires': expires}
+
+        return handles
+
+    def renew(self, ports):
+        '''Extend the leases of the given ports by another lease_time from now.'''
+        expires = time() + self._lease_time
+        for port in ports:
+            if port in self.leases:
+                self.leases[port]['expires'] = expires
+
+    def release(self, ports=None, owner=None):
+        '''Return the given leased ports (by default all the owner's) to the pool. They stay attached.'''
+        leases = self.leases
+        ports = [p for p, l in leases.items() if l['owner'] == owner] if ports is None else ports
+        for port in ports:
+            if leases.pop(port, None) is not None:
+                log.info('Returned port {} to the pool.'.format(port))
+
+    def reap(self):
+        '''Detach the ports of expired leases. Returns their handles.'''
+        now = time()
+        expired = [p for p, l in self.leases.items() if l['expires'] <= now]
+        if expired:
+            log.warning('Leases of ports {} expired. Detaching them.'.format(' '.join(expired)))
+            self._session.detach_ports(expired)
+
+        return expired
@@ -0,0 +1,249 @@
+import logging
+from time import monotonic
+
+from stc_streamblock import StcStreamblock, StcStreamblockException
+from stc_ipv4 import StcIPv4
+from stc_arp import StcArp, StcArpException
+from stc_frame_cache import StcFrameCache
+from stc_port_pool import StcPortPool
+
+log = logging.getLogger(__name__)
+
+class StcTrafficProfileException(Exception):
+    pass
+
+class StcTrafficProfile:
+    '''
+    A set of streamblocks, one per flow, spread across many ports. The streamblocks are
+    ARP'd, started, and stopped together with one REST call each regardless of the number
+    of flows, so all flows start in step.
+
+    The flows come from the "flows" list in the traffic_profile config. Each flow holds the
+    same sections as the top level config (ipv4, streamblock, ...) and is applied on top of
+    it. An empty list is a single flow from the top level config.
+    '''
+
+    default_config = {
+        'flows': [],
+    }
+    config_key = 'traffic_profile'
+
+    def __init__(self, session, streamblocks=None):
+        self._session = session
+        self._streamblocks = streamblocks if streamblocks else []
+
+    @classmethod
+    def from_session(cls, session):
+        '''The profile of the streamblocks already in the session (i.e. from its state file).'''
+        return cls(session, session.streamblocks())
+
+    @property
+    def streamblocks(self):
+        return self._streamblocks
+
+    @property
+    def handles(self):
+        return [sb.handle for sb in self._streamblocks]
+
+    @property
+    def ports(self):
+        ports = []
+        for sb in self._streamblocks:
+            if sb.port_handle not in ports:
+                ports.append(sb.port_handle)
+
+        return ports
+
+    def flow_configs(self, flows=None, config=None):
+        '''Return a full config (StcConfig) for each flow in the profile, or in the given list
+        of flows (in the "flows" format). The flows are applied on top of the given config, by
+        default the session's.'''
+        base = config if config else self._session.config
+        flows = flows if flows is not None else base.data[StcTrafficProfile.config_key]['flows']
+        if not flows:
+            return [base]
+
+        configs = []
+        for flow in flows:
+            config = base.copy(flow)
+            ipv4 = flow.get(StcIPv4.config_key, {})
+            if 'sourceAddr' in ipv4 and 'gateway' not in ipv4:
+                # hardcoded for ilab. A.B.C.D --> A.B.C.1
+                gw = '.'.join(ipv4['sourceAddr'].split('.')[:3]+['1'])
+                config.data[StcIPv4.config_key]['gateway'] = gw
+
+            configs.append(config)
+
+        return configs
+
+    def create(self, configs=None, workers=1, owner=None, exclusive=True, pool=None):
+        '''Reserve the ports for all flows (leased to owner from the given StcPortPool, by default
+        the session's, if it is enabled) and create a streamblock (with PDUs) per flow. The flows
+        are the given configs (StcConfig), by default flow_configs(). Up to workers ports or
+        streamblocks are created at a time. A streamblock the session already has, or has kept in
+        its StcFrameCache, for an identical flow on the same port is reused instead. If not
+        exclusive, the session's other streamblocks are left alone rather than set aside, so
+        other profiles in the session keep theirs (see StcFrameCache.claim()).'''
+        configs = configs if configs else self.flow_configs()
+        addrs = []
+        for config in configs:
+            addrs += [config.data[StcIPv4.config_key]['sourceAddr'], config.data[StcIPv4.config_key]['destAddr']]
+
+        pool = pool if pool else StcPortPool(self._session)
+        if pool.enabled:
+            ports = pool.lease(addrs, owner=owner, workers=workers)
+        else:
+            ports = self._session.reserve_ports(addrs, workers=workers)
+
+        keys = [StcStreamblock.frame_key(config) for config in configs]
+        reused = StcFrameCache(self._session).claim([(k, ports[2*i]) for i, k in enumerate(keys)],
+                                                 exclusive=exclusive)
+
+        log.info('Creating {} streamblock(s).'.format(len([e for e in reused if e is None])))
+        with self._session.batch(workers=workers):
+            for i, config in enumerate(configs):
+                if reused[i] is not None:
+                    sb = StcStreamblock(reused[i]['handle'], reused[i]['port'], self._session, config)
+                else:
+                    sb = self._session.create_streamblock(ports[2*i], config=config)
+                    sb.create_ethernetII()
+                    sb.create_ipv4()
+                    sb.create_modifiers()
+                    sb.state['key'] = keys[i]
+                self._streamblocks.append(sb)
+
+        return self
+
+    def start_traffic(self):
+        '''Start traffic on all streamblocks in the profile. StcStreamblockException raised on errors.'''
+        if not self._streamblocks:
+            raise StcTrafficProfileException('No streamblocks in traffic profile.')
+
+        handles = ' '.join(self.handles)
+        # StreamBlockStart runs for as long as the generator is set to; make that forever.
+        self._session.set_duration(self.ports)
+        self._session.apply()
+
+        generators = [self._session.generator(p) for p in self.ports]
+
+        # stop to get to known state
+        log.info('Stopping generators to get to known state.')
+        self._session.perform('GeneratorStop', generatorlist=' '.join(generators))
+
+        try:
+            StcArp(self._session).resolve(self._streamblocks)
+        except StcArpException as e:
+            raise StcStreamblockException(str(e))
+
+        log.info('Starting streamblocks {}'.format(handles))
+        self._session.perform('StreamBlockStart', streamblocklist=handles)
+        for sb in self._streamblocks:
+            sb._set_running(True)
+
+    def start_timed(self, duration, mode='SECONDS'):
+        '''
+        Start a timed run: the port generators are set to run for duration seconds (mode
+        SECONDS) or bursts (mode BURSTS) and started. The chassis stops them, so the run
+        length does not depend on REST round trips or the host clock. Returns the
+        time.monotonic() time the run should end, None for BURSTS. See wait_timed().
+        '''
+        if not self._streamblocks:
+            raise StcTrafficProfileException('No streamblocks in traffic profile.')
+
+        ports = self.ports
+        generators = ' '.join([self._session.generator(p) for p in ports])
+        self._session.set_duration(ports, mode, duration)
+        self._session.apply()
+
+        log.info('Stopping generators to get to known state.')
+        self._session.perform('GeneratorStop', generatorlist=generators)
+
+        try:
+            StcArp(self._session).resolve(self._streamblocks)
+        except StcArpException as e:
+            raise StcStreamblockException(str(e))
+
+        log.info('Starting generators {} for {} {}'.format(generators, duration, mode.lower()))
+        self._session.perform('GeneratorStart', generatorlist=generators)
+        start = monotonic()
+        for sb in self._streamblocks:
+            sb._set_running(True)
+
+        return start + duration if mode == 'SECONDS' else None
+
+    def wait_timed(self, end=None, stop=None, timeout=60):
+        '''Wait for a timed run to finish. end is what start_timed() returned. If the stop 
+        threading.Event is set, the run is cut short. StcStreamblockException raised (and the
+        run stopped) if it has not finished timeout seconds after end. Returns True if the run
+        finished, False if cancelled.'''
+        deadline = (end if end else monotonic()) + timeout
+        result = self._session.wait_generators(self.ports, end=end, deadline=deadline, stop=stop)
+        for sb in self._streamblocks:
+            sb._set_running(False)
+
+        if result == 'timeout':
+            raise StcStreamblockException('Generators still running {}s after the end of the timed run.'.format(
+                timeout))
+
+        return result == 'stopped'
+
+    def run_timed(self, duration, mode='SECONDS', stop=None, timeout=60):
+        '''Run traffic for duration seconds (or bursts) timed by the chassis. See start_timed().'''
+        return self.wait_timed(self.start_timed(duration, mode), stop=stop, timeout=timeout)
+
+    def stop_traffic(self):
+        handles = ' '.join(self.handles)
+        log.info('Stopping streamblocks {}'.format(handles))
+        self._session.perform('StreamBlockStop', streamblocklist=handles)
+        for sb in self._streamblocks:
+            sb._set_running(False)
+
+        return True
+
+    def update(self, configs=None):
+        '''
+        Change the streamblocks in place to match the given flow configs (StcConfig), by default
+        flow_configs(), sending only the attributes that changed. Flows match streamblocks in
+        order. Load changes are made with traffic running. Streamblocks with other changes are
+        stopped (with one StreamBlockStop), changed, and, if they were running, started again
+        (with one StreamBlockStart). Returns the changes made per streamblock handle.
+
+        Adding or removing flows, or moving one to other ports, needs a traffic_stop and 
+        traffic_start; StcTrafficProfileException is raised for those.
+        '''
+        configs = configs if configs else self.flow_configs()
+        if len(configs) != len(self._streamblocks):
+            raise StcTrafficProfileException('Can not change the number of flows ({} to {}) in place.'.format(
+                len(self._streamblocks), len(configs)))
+
+        locations = self._session.state.get('port_locations', {})
+        changes = []
+        for sb, config in zip(self._streamblocks, configs):
+            location = self._session.port_location(config.data[StcIPv4.config_key]['sourceAddr'])
+            if locations.get(location) != sb.port_handle:
+                raise StcTrafficProfileException('Can not move streamblock {} to port {} in place.'.format(
+                    sb.handle, location))
+            changes.append(sb.changes(config))
+
+        restart = [sb for sb, c in zip(self._streamblocks, changes) if c and StcStreamblock.needs_stop(c)]
+        running = [sb for sb in restart if sb.running]
+        if running:
+            handles = ' '.join([sb.handle for sb in running])
+            log.info('Stopping streamblocks {} to change them.'.format(handles))
+            self._session.perform('StreamBlockStop', streamblocklist=handles)
+
+        for sb, c in zip(self._streamblocks, changes):
+            sb.configure(c)
+
+        self._session.apply()
+
+        if running:
+            try:
+                StcArp(self._session).resolve(running)
+            except StcArpException as e:
+                raise StcStreamblockException(str(e))
+
+            log.info('Starting streamblocks {}'.format(handles))
+            self._session.perform('StreamBlockStart', streamblocklist=handles)
+
+        return {sb.handle: c for sb, c in zip(self._streamblocks, changes) if c}
@@ -0,0 +1,302 @@
+import logging
+from array import array
+from collections import namedtuple
+from time import monotonic, sleep, time
+
+from stc_export import StcResultExporter
+
+log = logging.getLogger(__name__)
+
+class StcResultsException(Exception):
+    pass
+
+# One reading of one result object. handle is the object the results belong to (the
+# streamblock for stream results, the port for port results).
+StcResultSample = namedtuple('StcResultSample', ['time', 'handle', 'result_type', 'frames', 'bytes',
+                                                 'frame_rate', 'dropped', 'latency_min', 'latency_avg',
+                                                 'latency_max', 'out_of_seq'])
+
+class StcResultRing:
+    '''
+    Fixed size ring buffer of result samples. Samples are stored column-wise in typed arrays
+    that are allocated up front, so memory use does not grow however long a run is. Once full,
+    the oldest samples are overwritten. The most recent sample of each (handle, result_type)
+    is also kept aside as it is appended, so latest() does not have to walk the ring.
+    '''
+    columns = [
+        ('time', 'd'),
+        ('frames', 'Q'),
+        ('bytes', 'Q'),
+        ('frame_rate', 'd'),
+        ('dropped', 'Q'),
+        ('latency_min', 'd'),
+        ('latency_avg', 'd'),
+        ('latency_max', 'd'),
+        ('out_of_seq', 'Q'),
+    ]
+
+    def __init__(self, size):
+        if size < 1:
+            raise StcResultsException('Result buffer size must be at least 1, not {}'.format(size))
+
+        self._size = size
+        self._cols = {name: array(code, [0]) * size for name, code in StcResultRing.columns}
+        self._keys = array('I', [0]) * size     # index into self._names
+        self._names = []                        # (handle, result_type) for each key.
+        self._name_index = {}
+        self._latest = {}                       # (handle, result_type) --> most recent sample.
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def size(self):
+        return self._size
+
+    def append(self, sample):
+        name = (sample.handle, sample.result_type)
+        if name not in self._name_index:
+            self._name_index[name] = len(self._names)
+            self._names.append(name)
+
+        i = self._next
+        self._keys[i] = self._name_index[name]
+        for col, _ in StcResultRing.columns:
+            self._cols[col][i] = getattr(sample, col)
+
+        self._next = (i + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+        self._latest[name] = sample
+
+    def _sample(self, i):
+        handle, result_type = self._names[self._keys[i]]
+        values = {col: self._cols[col][i] for col, _ in StcResultRing.columns}
+        return StcResultSample(handle=handle, result_type=result_type, **values)
+
+    def __iter__(self):
+        '''Iterate over the buffered samples, oldest first.'''
+        start = (self._next - self._count) % self._size
+        for n in range(self._count):
+            yield self._sample((start + n) % self._size)
+
+    def latest(self):
+        '''Return a dict of (handle, result_type) --> the most recent sample for it.'''
+        return dict(self._latest)
+
+class StcResults:
+    '''
+    Live traffic statistics. Subscribes to the configured result types via ResultsSubscribe
+    and reads the result objects back at a fixed interval, all the objects of a result type
+    with one bulk get if the server has bulk operations. Every sample read is kept in a
+    fixed size ring buffer and passed, as the list of samples of each poll, to the hooks
+    added with add_hook(). If the config has an "export" path, an StcResultExporter hook
+    writes the samples to that file as they come in (see stc_export.py).
+
+        with StcResults(session) as results:
+            profile.start_traffic()
+            for sample in results.samples(duration=60):
+                ...
+    '''
+
+    default_config = {
+        'interval': 1,
+        'buffer_size': 3600,
+        'result_types': ['TxStreamResults', 'RxStreamResults'],
+    }
+    config_key = 'results'
+
+    # result type --> (config type to subscribe to, {sample field: result attribute})
+    result_types = {
+        'TxStreamResults': ('StreamBlock', {
+            'frames': 'FrameCount',
+            'bytes': 'OctetCount',
+            'frame_rate': 'FrameRate',
+        }),
+        'RxStreamResults': ('StreamBlock', {
+            'frames': 'FrameCount',
+            'bytes': 'OctetCount',
+            'frame_rate': 'FrameRate',
+            'dropped': 'DroppedFrameCount',
+            'latency_min': 'MinLatency',
+            'latency_avg': 'AvgLatency',
+            'latency_max': 'MaxLatency',
+            'out_of_seq': 'OutSeqFrameCount',
+        }),
+        'AnalyzerPortResults': ('Analyzer', {
+            'frames': 'TotalFrameCount',
+            'bytes': 'TotalOctetCount',
+            'frame_rate': 'TotalFrameRate',
+        }),
+    }
+
+    def __init__(self, session, config=None):
+        conf = (config if config else session.config).data[StcResults.config_key]
+        for rt in conf['result_types']:
+            if rt not in StcResults.result_types:
+                raise StcResultsException('Unsupported result type {}. Supported: {}'.format(
+                    rt, ', '.join(StcResults.result_types.keys())))
+
+        self._session = session
+        self._interval = conf['interval']
+        self._result_types = conf['result_types']
+        self._datasets = {}    # result type --> result dataset handle.
+        self._parents = {}     # result object handle --> handle of the object the results are for.
+        self._summary = {}     # handle --> running stream frame counts, see summary().
+        self.buffer = StcResultRing(conf['buffer_size'])
+        self._hooks = []
+        self._exporter = StcResultExporter.from_config(config if config else session.config)
+        if self._exporter:
+            self.add_hook(self._exporter)
+
+    def __enter__(self):
+        self.subscribe()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.unsubscribe()
+        return False
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def exporter(self):
+        return self._exporter
+
+    def add_hook(self, hook):
+        '''Call hook with the list of samples read by every poll.'''
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def subscribe(self):
+        for rt in self._result_types:
+            if rt in self._datasets:
+                continue
+
+            config_type, _ = StcResults.result_types[rt]
+            data = self._session.perform('ResultsSubscribe', Parent=self._session.project_handle,
+                                         ConfigType=config_type, ResultType=rt, RecordsPerPage=256,
+                                         Interval=self._interval)
+            if not data or 'ReturnedDataSet' not in data:
+                raise StcResultsException('Unable to subscribe to {}: {}'.format(rt, data))
+
+            self._datasets[rt] = data['ReturnedDataSet']
+            log.info('Subscribed to {} as {}'.format(rt, self._datasets[rt]))
+
+    def unsubscribe(self):
+        for rt, dataset in self._datasets.items():
+            log.info('Unsubscribing from {} ({})'.format(rt, dataset))
+            self._session.perform('ResultDataSetUnsubscribe', ResultDataSet=dataset)
+            self._session.stc.delete(dataset)
+
+        self._datasets = {}
+        self._parents = {}
+        if self._exporter:
+            self._exporter.close()
+
+    def _read(self, rt, dataset):
+        '''Return {result object handle: {attribute (lower case): value}} for the objects of
+        result type rt, parent included.'''
+        config_type, fields = StcResults.result_types[rt]
+        attrs = ['parent'] + list(fields.values())
+        stc = self._session.stc
+        if self._session.bulk_ops():
+            # every result object of the type, in one call. Both config types live under ports.
+            location = '{}/port/{}/{}'.format(self._session.project_handle, config_type, rt).lower()
+            objects = (stc.bulkget(location, attrs) or {}).get('objects', {})
+            if isinstance(objects, list):
+                objects = {o.get('handle'): o for o in objects}
+            return {h: {k.lower(): v for k, v in data.items()} for h, data in objects.items()}
+
+        # one get per object, with its parent the first time it is seen.
+        data = {}
+        for h in stc.get(dataset, 'ResultHandleList').split():
+            values = stc.get(h, *(attrs[1:] if h in self._parents else attrs))
+            data[h] = {k.lower(): v for k, v in values.items()}
+
+        return data
+
+    def poll(self):
+        '''Read all subscribed results once. Returns the samples read, which are also added
+        to the ring buffer.'''
+        if not self._datasets:
+            raise StcResultsException('Not subscribed to any results.')
+
+        def _num(value):
+            try:
+                return float(value) if value not in (None, '', 'N/A') else 0
+            except ValueError:
+                return 0
+
+        now = time()
+        samples = []
+        for rt, dataset in self._datasets.items():
+            _, fields = StcResults.result_types[rt]
+            for h, data in self._read(rt, dataset).items():
+                if data.get('parent'):
+                    self._parents[h] = data['parent']
+
+                values = {f: 0 for f, _ in StcResultRing.columns}
+                values.update({f: _num(data.get(attr.lower())) for f, attr in fields.items()})
+                values['time'] = now
+                for f in ['frames', 'bytes', 'dropped', 'out_of_seq']:
+                    values[f] = int(values[f])
+
+                sample = StcResultSample(handle=self._parents.get(h, h), result_type=rt, **values)
+                self.buffer.append(sample)
+                self._count(sample)
+                samples.append(sample)
+
+        for hook in list(self._hooks):
+            try:
+                hook(samples)
+            except Exception as e:
+                log.error('results hook {} failed: {}'.format(hook, e))
+
+        return samples
+
+    def _count(self, sample):
+        '''Update the running summary() counts with a sample.'''
+        key = {'TxStreamResults': 'tx_frames', 'RxStreamResults': 'rx_frames'}.get(sample.result_type)
+        if not key:
+            return
+
+        s = self._summary.setdefault(sample.handle, {})
+        s[key] = sample.frames
+        if 'tx_frames' in s and 'rx_frames' in s:
+            s['lost_frames'] = s['tx_frames'] - s['rx_frames']
+
+    def samples(self, duration=None, stop=None):
+        '''
+        Generator that polls the results every interval and yields each sample. Polls are
+        scheduled against a monotonic clock so slow REST calls do not make them drift. Runs
+        until duration seconds have passed or, if given, the stop threading.Event is set.
+        Without either it runs forever.
+        '''
+        start = monotonic()
+        n = 0
+        while True:
+            for sample in self.poll():
+                yield sample
+
+            n += 1
+            next_poll = start + n * self._interval
+            if duration is not None and next_poll > start + duration:
+                return
+
+            wait = max(0, next_poll - monotonic())
+            if stop:
+                if stop.wait(wait):
+                    return
+            elif wait:
+                sleep(wait)
+
+    def summary(self):
+        '''Return {handle: {'tx_frames': ..., 'rx_frames': ..., 'lost_frames': ...}} from the latest
+        stream samples read. The counts are kept up to date by poll(), so this is cheap to call.'''
+        return {handle: dict(s) for handle, s in self._summary.items()}
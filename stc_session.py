@@ -2,13 +2,21 @@
 
 import logging
 import json
-from functools import wraps
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from getpass import getuser
 from random import choice
 from string import ascii_lowercase as lowercase
-from stcrestclient import stchttp
+from time import monotonic, sleep
+from stc_trace import StcTracedHttp
 from stc_streamblock import StcStreamblock
 from stc_ipv4 import StcIPv4
+from stc_ethernetII import StcEthernetII
+from stc_port_map import StcPortMap
+from stc_modifier import StcModifiers
+from stc_lease import StcSessionLease
 
 log = logging.getLogger(__name__)
 
@@ -43,7 +51,7 @@ class StcSession:   # py3.x inherits from object by default
     }
     config_key = 'stc_session'
 
-    def __init__(self, config, state=None, user=None, verbose=False, keep_open=True):
+    def __init__(self, config, state=None, user=None, verbose=False, keep_open=True, hooks=None):
 
         self._config = config.data[StcSession.config_key]
         self._stc_config = config
@@ -58,6 +66,13 @@ class StcSession:   # py3.x inherits from object by default
         self._objects = {}   # dict of handle to data. i.e. {'streamblock1': {sb data/config}, ...}
         self._state['keep_open'] = keep_open
 
+        self._batch = None     # list of queued creates while in a batch() block.
+        self._batch_workers = 1
+        self._handles = {}     # placeholder handle --> real handle for objects created in a batch.
+        self._hooks = list(hooks) if hooks else []   # called with an StcCall after each REST client call.
+        self._port_map = None
+        self._lease = None
+
     #
     # Context manager.
     #
@@ -90,10 +105,17 @@ class StcSession:   # py3.x inherits from object by default
     # create a session and project. If False, assume these already exist and do not create them.
     # a project.
     #
-    def connect(self):
+    def connect(self, stc=None):
+        '''Connect to the STC server, with the given REST client if any (i.e. an StcPlanRecorder,
+        see StcTopology.compile()), and to the chassis, and lease the session.'''
         addr, port = self._config['stc_server_addr'], self._config['stc_server_port']
         log.info('Connecting to: {}:{}'.format(addr, port))
-        self._stc = stchttp.StcHttp(addr, port=port, debug_print=self._verbose)
+        if not stc:
+            # the REST client (and requests) are imported on first connect, so scripts that only
+            # parse arguments or write configs start fast.
+            from stc_http import StcKeepAliveHttp
+            stc = StcKeepAliveHttp(addr, port=port, debug_print=self._verbose)
+        self._stc = StcTracedHttp(stc, self._hooks)
 
         if self._state['sid']:
             log.info('Joining existing session {}'.format(self._state['sid']))
@@ -103,13 +125,20 @@ class StcSession:   # py3.x inherits from object by default
             log.info('Creating new session, "{}" for user {}.'.format(sid, self._state['user']))
             self._state['sid'] = self._stc.new_session(self._state['user'], sid)
 
-        self._stc.apply()
+        # Nothing to apply here; pending changes are applied by whatever needs them on the
+        # chassis (i.e. starting traffic) via apply().
 
-        chas_addr = self._state['chassis_addr']
-        log.info('Connecting to chassis at {}'.format(chas_addr))
-        # stc.connect wants a list of addresses for some reason.
-        self._stc.connect([chas_addr])
-        log.info('Connected.')
+        # The chassis connections belong to the session, so a joined session that connected
+        # before does not need to do it again. All the others are connected with one call.
+        connected = self._state.setdefault('chassis_connected', [])
+        chassis = [c for c in self.port_map.chassis() if c not in connected]
+        if not chassis:
+            log.info('Session already connected to chassis at {}'.format(' '.join(connected)))
+        else:
+            log.info('Connecting to chassis at {}'.format(' '.join(chassis)))
+            self._stc.connect(chassis)
+            connected += chassis
+            log.info('Connected.')
 
         # If not configured with an existing project, create a new one.
         if not self.project_handle:
@@ -118,16 +147,168 @@ class StcSession:   # py3.x inherits from object by default
             log.info('created project: {}'.format(json.dumps(data, indent=4, sort_keys=True)))
             self._state['project_handle'] = data['handle']
 
+        # lease the session for as long as it is in use, so it is not taken for one left behind.
+        self._lease = StcSessionLease(self)
+        if self._lease.enabled:
+            self._lease.renew()
+            self._lease.start()
+
     @property
     def stc(self):
         return self._stc
 
+    @property
+    def lease(self):
+        '''The session's StcSessionLease, once connected.'''
+        return self._lease
+
+    @property
+    def state(self):
+        return self._state
+
     @property
     def config(self):
         return self._stc_config
 
+    def add_hook(self, hook):
+        '''Call hook(call) after every call made to the STC REST client, with an StcCall giving 
+        the method, target object or command, duration, bytes, and outcome. See stc_trace.py.'''
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    @config.setter
+    def config(self, config):
+        '''Use a new config for objects created from here on. Session (stc_session) settings 
+        of a connected session are not changed.'''
+        self._stc_config = config
+
+    def mark_dirty(self):
+        '''Note that the session has config changes that have not been applied yet.'''
+        self._state['dirty'] = True
+
+    def apply(self):
+        '''Send pending config changes to the chassis. Does nothing (and makes no REST call) 
+        if nothing has changed since the last apply.'''
+        if not self._state.get('dirty'):
+            log.debug('Nothing to apply.')
+            return
+
+        log.info('Applying config changes.')
+        self._stc.apply()
+        self._state['dirty'] = False
+
+    def _port_child(self, port, child):
+        children = self._state.setdefault('port_children', {}).setdefault(port, {})
+        if child not in children:
+            children[child] = self._stc.get(port, 'children-{}'.format(child))
+
+        return children[child]
+
+    @stc_connected
+    def generator(self, port):
+        '''Return the handle of the port's generator. Looked up once per port and then cached 
+        in the state.'''
+        return self._port_child(port, 'generator')
+
+    @stc_connected
+    def analyzer(self, port):
+        '''Return the handle of the port's analyzer. Looked up once per port and then cached 
+        in the state.'''
+        return self._port_child(port, 'analyzer')
+
+    @stc_connected
+    def generator_config(self, port):
+        '''Return the handle of the port's generator config. Looked up once per port and then 
+        cached in the state.'''
+        children = self._state.setdefault('port_children', {}).setdefault(port, {})
+        if 'generatorconfig' not in children:
+            children['generatorconfig'] = self._stc.get(self.generator(port), 'children-generatorconfig')
+
+        return children['generatorconfig']
+
+    @stc_connected
+    def set_duration(self, ports, mode='CONTINUOUS', duration=None):
+        '''Set how long the generators of the ports run once started: DurationMode CONTINUOUS, 
+        SECONDS, or BURSTS, and the Duration in those units. The setting of each port is kept 
+        in the state and only ports set differently are changed. Changes need an apply().'''
+        durations = self._state.setdefault('generator_durations', {})
+        for port in ports:
+            # chassis default is continuous.
+            if durations.get(port, ['CONTINUOUS', None]) == [mode, duration]:
+                continue
+
+            attrs = {'DurationMode': mode}
+            if duration is not None:
+                attrs['Duration'] = duration
+
+            log.info('Setting {} generator duration to {}'.format(port, attrs))
+            self._stc.config(self.generator_config(port), attrs)
+            durations[port] = [mode, duration]
+            self.mark_dirty()
+
+    @stc_connected
+    def wait_generators(self, ports, end=None, deadline=None, stop=None, poll=5):
+        '''
+        Wait for the generators of the ports to stop by themselves (after a timed run, see 
+        set_duration()). end is the time.monotonic() time they are expected to stop; nothing is
+        sent to the chassis until then. After that GeneratorWaitForStop is sent, at most poll
+        seconds at a time, until deadline. If the stop threading.Event is set, or the deadline
+        passes, the generators are stopped with GeneratorStop.
+
+        Returns "stopped" if they stopped by themselves, "cancelled", or "timeout".
+        '''
+        generators = ' '.join([self.generator(p) for p in ports])
+
+        def _cancelled(seconds):
+            if seconds <= 0:
+                return stop is not None and stop.is_set()
+            if stop is not None:
+                return stop.wait(seconds)
+            sleep(seconds)
+            return False
+
+        result = None
+        if end is not None and _cancelled(end - monotonic()):
+            result = 'cancelled'
+
+        while not result:
+            if stop is not None and stop.is_set():
+                result = 'cancelled'
+                break
+
+            timeout = poll if deadline is None else min(poll, deadline - monotonic())
+            if timeout <= 0:
+                result = 'timeout'
+                break
+
+            start = monotonic()
+            try:
+                self._stc.perform('GeneratorWaitForStop', generatorlist=generators, waittimeout=max(1, int(timeout)))
+                return 'stopped'
+            except Exception as e:
+                # the command fails when the wait times out. If it failed sooner, wait out the
+                # rest of the timeout here rather than asking again straight away.
+                log.debug('generators still running: {}'.format(e))
+                if _cancelled(timeout - (monotonic() - start)):
+                    result = 'cancelled'
+
+        log.info('Stopping generators ({}).'.format(result))
+        self._stc.perform('GeneratorStop', generatorlist=generators)
+        return result
+
+    @stc_connected
+    def arpcache(self, port):
+        '''Return the handle of the port's ARP cache. Looked up once per port and then cached 
+        in the state.'''
+        return self._port_child(port, 'arpcache')
+
     @stc_connected
     def disconnect(self):
+        if self._lease:
+            self._lease.stop()
+
         if self._state['keep_open']:
             log.info('Keeping session open...')
             return 
@@ -138,90 +319,360 @@ class StcSession:   # py3.x inherits from object by default
         log.info('Deleting project {}.'.format(self.project_handle))
         self._stc.delete(self.project_handle)
         del self._state['project_handle']
+        for k in ['chassis_connected', 'dirty', 'port_children', 'arp_cache', 'generator_durations', 'frame_cache',
+                  'imix', 'lease']:
+            self._state.pop(k, None)
 
         log.info('Ending session.')
         self._stc.end_session(end_tcsession=True)
+        self._stc.close()
 
     def keep_open(self, val=True):
         self._state['keep_open'] = val
 
+    @property
+    def port_map(self):
+        '''The StcPortMap of the "port_map" config. Without one, the chassis and slot of the state.'''
+        if not self._port_map:
+            self._port_map = StcPortMap(self._stc_config.data[StcPortMap.config_key]['map'],
+                                        self._state['chassis_addr'], self._state['slot'])
+
+        return self._port_map
+
+    def port_location(self, addr):
+        '''Return the chassis port location that an IP address maps to (see StcPortMap).'''
+        return self.port_map.location(addr)
+
     @stc_connected
-    def reserve_ports(self):
-        '''Reserve the ports that map to the source and destination configurations.'''
-        # IP addresses map directly to port in our VERY VERY SPECIFIC setup. 
-        # oh so dangerous:
-        sport = self._stc_config.data[StcIPv4.config_key]['sourceAddr'].split('.')[1]
-        dport = self._stc_config.data[StcIPv4.config_key]['destAddr'].split('.')[1]
-        port_handles = []
-        for p in [sport, dport]:
-            # create a port and set the location. 
-            location = '//{}/{}/{}'.format(self._state['chassis_addr'], self._state['slot'], p)
-            h = self._stc.create('port', under=self.project_handle, location=location)
-            port_handles.append(h)
+    def reserve_ports(self, addrs=None, workers=1):
+        '''Reserve the ports that map to the given addresses, by default the source and destination
+        configurations. Ports are created once per location, up to workers at a time, and attached
+        with a single AttachPorts call. Returns the port handles in the order of the addresses given.'''
+        if not addrs:
+            addrs = [self._stc_config.data[StcIPv4.config_key]['sourceAddr'],
+                     self._stc_config.data[StcIPv4.config_key]['destAddr']]
+
+        return self.reserve_locations([self.port_location(a) for a in addrs], workers=workers)
+
+    @stc_connected
+    def reserve_locations(self, port_locations, workers=1):
+        '''Reserve the ports at the given chassis port locations, i.e. "//10.237.192.20/5/8", as
+        reserve_ports() does. Ports already attached are left as they are. Returns the port handles
+        in the order of the locations given.'''
+        if 'port_locations' not in self._state:
+            self._state['port_locations'] = {}
+
+        locations = self._state['port_locations']
+        new_locations = []
+        for location in port_locations:
+            if location not in locations and location not in new_locations:
+                new_locations.append(location)
+
+        # create a port and set the location. 
+        def _create(location, stc=None):
+            return (stc if stc else self._stc).create('port', under=self.project_handle, location=location)
+
+        if workers > 1 and len(new_locations) > 1:
+            with self._workers(workers) as (pool, client):
+                new_handles = list(pool.map(lambda l: _create(l, client()), new_locations))
+        else:
+            new_handles = [_create(l) for l in new_locations]
+
+        for location, h in zip(new_locations, new_handles):
+            self.mark_dirty()
+            locations[location] = h
             log.info('Created port "{}"'.format(h))
-            log.debug('Port Data Pre-Attach: {}'.format(json.dumps(self._stc.get(h), indent=4, sort_keys=True)))
+            self._log_obj('Port Data Pre-Attach', h)
 
-        log.info('Attaching to ports {}'.format(' '.join(port_handles)))
-        self._stc.perform('AttachPorts', portList=' '.join(port_handles))
+        if new_handles:
+            self._attach_ports(list(zip(new_locations, new_handles)))
 
-        for h in port_handles:
-            log.debug('Port Data Post-Attach: {}'.format(json.dumps(self._stc.get(h), indent=4, sort_keys=True)))
+            for h in new_handles:
+                self._log_obj('Port Data Post-Attach', h)
 
         if 'ports' not in self._state:
             self._state['ports'] = []
 
-        self._state['ports'] += port_handles
+        self._state['ports'] += new_handles
+
+        return [locations[l] for l in port_locations]
 
-        return port_handles
+    def _attach_ports(self, ports):
+        '''Attach the given (location, handle) ports with one AttachPorts per chassis, all
+        chassis at the same time.'''
+        by_chassis = {}
+        for location, h in ports:
+            by_chassis.setdefault(StcPortMap.chassis_of(location), []).append(h)
+
+        def _attach(handles, stc=None):
+            log.info('Attaching to ports {}'.format(' '.join(handles)))
+            (stc if stc else self._stc).perform('AttachPorts', portList=' '.join(handles))
+
+        if len(by_chassis) > 1:
+            with self._workers(len(by_chassis)) as (pool, client):
+                list(pool.map(lambda handles: _attach(handles, client()), by_chassis.values()))
+        else:
+            for handles in by_chassis.values():
+                _attach(handles)
     
-    @stc_connected
-    def create_obj(self, obj, under, *args, **kwargs):
-        h = self._stc.create(obj, under, *args, **kwargs)
-        data = self._stc.get(h)
+    @contextmanager
+    def _workers(self, workers):
+        '''
+        A ThreadPoolExecutor of up to workers threads, and a function that returns the REST
+        client of the thread calling it. The session's client (and its connection) is not
+        shared between threads, so each worker gets one of its own, forked from the session's
+        (see StcKeepAliveHttp.fork()) and traced by the same hooks. They are closed afterwards.
+
+            with self._workers(4) as (pool, client):
+                handles = list(pool.map(lambda l: client().create('port', ...), locations))
+        '''
+        local = threading.local()
+        clients = []
+        lock = threading.Lock()
+
+        def _client():
+            if not hasattr(local, 'stc'):
+                local.stc = StcTracedHttp(self._stc.fork(), self._hooks)
+                with lock:
+                    clients.append(local.stc)
+            return local.stc
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                yield pool, _client
+        finally:
+            for stc in clients:
+                stc.close()
+
+    def _log_obj(self, msg, handle):
+        '''Dump the object at debug level. The object is only fetched if debug logging is
+        on as it costs a REST round trip.'''
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('{} {}:\n{}'.format(msg, handle, json.dumps(self._stc.get(handle), indent=4, sort_keys=True)))
+
+    def _track_obj(self, handle):
         if 'obj_handles' not in self._state:
             self._state['obj_handles'] = []
-        
-        self._state['obj_handles'].append(h)
-        log.debug('created {}:\n{}'.format(h, json.dumps(data, indent=4, sort_keys=True)))
 
+        self._state['obj_handles'].append(handle)
+        self._log_obj('created', handle)
+
+    @stc_connected
+    def create_obj(self, obj, under, attributes=None, **kwargs):
+        '''Create an object under the given parent and return its handle. Inside a batch()
+        block the create is queued and a placeholder handle is returned instead.'''
+        attrs = dict(attributes) if attributes else {}
+        attrs.update(kwargs)
+        if self._batch is not None:
+            h = 'pending{}'.format(len(self._handles) + len(self._batch) + 1)
+            self._batch.append((h, obj, under, attrs))
+            return h
+
+        h = self._stc.create(obj, self.resolve(under), attrs)
+        self.mark_dirty()
+        self._track_obj(h)
         return h
 
+    @contextmanager
+    def batch(self, workers=1):
+        '''Queue the create_obj() calls made in this block and send them when the block 
+        exits. If the server supports the bulk API, each tree of new objects (i.e. a 
+        streamblock and its PDUs) is created in a single REST call, up to workers trees at
+        a time. Handles returned inside the block are placeholders until then; use resolve()
+        to get the real handle. Nested batches are folded into the outermost one.'''
+        if self._batch is not None:
+            yield self
+            return
+
+        self._batch = []
+        self._batch_workers = workers
+        try:
+            yield self
+            self._flush_batch()
+        finally:
+            self._batch = None
+            self._batch_workers = 1
+
+    def resolve(self, handle):
+        '''Return the real handle for a placeholder handle given out inside a batch.'''
+        return self._handles.get(handle, handle)
+
     @stc_connected
-    def create_streamblock(self, port):
-        kwargs = self._stc_config.data[StcStreamblock.config_key]
-        handle = self.create_obj('streamBlock', port, **kwargs)
-        self._state['streamblock_handle'] = handle
-        self._state['streamblock_port'] = port
-        return StcStreamblock(handle, port, self)
+    def bulk_ops(self):
+        '''True if the server has the bulk API. Asked once per session and then kept in the state.'''
+        if 'bulk_ops' not in self._state:
+            self._state['bulk_ops'] = self._stc.has_bulk_ops()
+
+        return self._state['bulk_ops']
+
+    def _flush_batch(self):
+        queue, self._batch = self._batch, None
+        if not queue:
+            return
+
+        pending = {h for h, _, _, _ in queue}
+        children = {}
+        for entry in queue:
+            children.setdefault(entry[2], []).append(entry)
+
+        if self.bulk_ops():
+            # build a nested attribute tree for each object whose parent already exists
+            # and create the whole tree in one call. The server hands back the handles
+            # in depth first creation order.
+            def _tree(entry, order):
+                h, obj, under, attrs = entry
+                order.append(h)
+                tree = dict(attrs)
+                for child in children.get(h, []):
+                    subtree = _tree(child, order)
+                    if child[1] in tree:
+                        if not isinstance(tree[child[1]], list):
+                            tree[child[1]] = [tree[child[1]]]
+                        tree[child[1]].append(subtree)
+                    else:
+                        tree[child[1]] = subtree
+                return tree
+
+            def _create(root, stc=None):
+                stc = stc if stc else self._stc
+                order = []
+                tree = _tree(root, order)
+                tree['under'] = self.resolve(root[2])
+                log.info('bulk creating {} object(s) under {}'.format(len(order), tree['under']))
+                data = stc.bulkcreate(root[1], tree)
+                handles = data.get('handles', []) if isinstance(data, dict) else []
+                if len(handles) != len(order):
+                    raise StcSessionException('Bulk create of {} returned unexpected handles: {}'.format(
+                        root[1], data))
+                return zip(order, handles)
+
+            roots = [e for e in queue if e[2] not in pending]
+            if self._batch_workers > 1 and len(roots) > 1:
+                # the trees are independent of each other, so can be created at the same time.
+                with self._workers(self._batch_workers) as (pool, client):
+                    created = list(pool.map(lambda r: _create(r, client()), roots))
+            else:
+                created = [_create(r) for r in roots]
+
+            for c in created:
+                self._handles.update(c)
+        else:
+            # no bulk API, queue order is parent first so plain creates work.
+            for h, obj, under, attrs in queue:
+                self._handles[h] = self._stc.create(obj, self.resolve(under), attrs)
+
+        self.mark_dirty()
+        for h, _, _, _ in queue:
+            self._track_obj(self._handles[h])
+
+        # swap any placeholders already written to the state for the real handles.
+        def _swap(v):
+            if isinstance(v, str):
+                return self.resolve(v)
+            elif isinstance(v, list):
+                return [_swap(i) for i in v]
+            elif isinstance(v, dict):
+                return {k: _swap(i) for k, i in v.items()}
+            return v
+
+        for k, v in self._state.items():
+            self._state[k] = _swap(v)
 
     @stc_connected
-    def destroy_streamblock(self):
-        '''Destroy an existing streamblock. If active, the traffic in the streamblock will be stopped before destruction.'''
-        handle = self._state['streamblock_handle'] if 'streamblock_handle' in self._config else None
-        port = self._state['streamblock_port'] if 'streamblock_port' in self._config else None
-        if handle and port:
-            sb = StcStreamblock(handle, port, self)
-            sb.stop_traffic()
-            log.info('Deleting object {}/{}.'.format(handle, port))
-            self._stc.delete(handle)
-            del self._config['streamblock_handle']
-            del self._config['streamblock_port']
+    def create_streamblock(self, port, config=None):
+        '''Create a streamblock on the given port. The streamblock is configured from the 
+        given config (an StcConfig), or the session config if not given, with the frame length
+        of its modifiers (see StcModifiers) if it has one.'''
+        config = config if config else self._stc_config
+        kwargs = config.data[StcStreamblock.config_key]
+        modifiers = config.data.get(StcModifiers.config_key, {})
+        attrs = dict(kwargs)
+        attrs.update(StcModifiers(self, config).streamblock_attrs())
+        handle = self.create_obj('streamBlock', port, attrs)
+        if 'streamblocks' not in self._state:
+            self._state['streamblocks'] = []
+
+        # what the streamblock (and later its PDUs) was configured with, so later config 
+        # changes can be sent as just the differences. See StcStreamblock.update().
+        recorded = {StcStreamblock.config_key: dict(kwargs)}
+        if modifiers:
+            recorded[StcModifiers.config_key] = json.loads(json.dumps(modifiers))
+        self._state['streamblocks'].append({'handle': handle, 'port': port, 'pdus': {}, 'running': False,
+                                            'config': recorded})
+        return StcStreamblock(handle, port, self, config)
+
+    def streamblocks(self):
+        '''Return an StcStreamblock for each streamblock in the session state. Each is configured
+        with the session config plus the config the streamblock was last given.'''
+        return [StcStreamblock(sb['handle'], sb['port'], self, self._stc_config.copy(sb.get('config')))
+                for sb in self._state.get('streamblocks', [])]
 
     @stc_connected
-    def detach_ports(self):
+    def destroy_streamblocks(self):
+        '''Destroy all streamblocks in this session, including any kept for reuse (see
+        StcFrameCache). Active traffic is stopped, with a single StreamBlockStop, before destruction.'''
+        # streamblocks loaded from a project go with the rest.
+        self._state.pop('project_file', None)
+        cached = self._state.pop('frame_cache', [])
+        for sb in cached:
+            log.info('Deleting cached object {}/{}.'.format(sb['handle'], sb['port']))
+            self._stc.delete(sb['handle'])
+
+        if 'streamblocks' not in self._state or not self._state['streamblocks']:
+            if cached:
+                self.mark_dirty()
+            return
+
+        handles = [sb['handle'] for sb in self._state['streamblocks']]
+        log.info('Stopping streamblocks {}'.format(' '.join(handles)))
+        self.perform('StreamBlockStop', streamblocklist=' '.join(handles))
+        for sb in self._state['streamblocks']:
+            log.info('Deleting object {}/{}.'.format(sb['handle'], sb['port']))
+            self._stc.delete(sb['handle'])
+
+        self.mark_dirty()
+        del self._state['streamblocks']
+
+    @stc_connected
+    def detach_ports(self, ports=None):
+        '''Detach and delete the given ports, by default all of the session's. Streamblocks on
+        the ports, and what the state keeps per port, go with them.'''
         if 'ports' not in self._state or not self._state['ports']:
             log.info('Attempt to detech from ports when we are not attached to any. Ignoring.')
             return
 
-        ports = ' '.join(self._state['ports'])
-        log.info('Detaching from ports: {}'.format(ports))
-        self._stc.perform('DetachPorts', portlist=ports)
+        attached = self._state['ports']
+        ports = list(attached) if ports is None else [p for p in attached if p in ports]
+        if not ports:
+            return
+
+        log.info('Detaching from ports: {}'.format(' '.join(ports)))
+        self._stc.perform('DetachPorts', portlist=' '.join(ports))
 
-        for port in self._state['ports']:
+        for port in ports:
             log.info('Deleting port {}'.format(port))
             self._stc.delete(port)
 
+        self.mark_dirty()
+        if len(ports) < len(attached):
+            self._state['ports'] = [p for p in attached if p not in ports]
+            self._state['port_locations'] = {l: h for l, h in self._state.get('port_locations', {}).items()
+                                              if h not in ports}
+            for key in ['port_children', 'arp_cache', 'generator_durations', 'port_leases']:
+                for port in ports:
+                    self._state.get(key, {}).pop(port, None)
+            for key in ['streamblocks', 'frame_cache']:
+                if key in self._state:
+                    self._state[key] = [sb for sb in self._state[key] if sb['port'] not in ports]
+            return
+
         del self._state['ports']
+        self._state.pop('port_locations', None)
+        self._state.pop('port_children', None)
+        self._state.pop('arp_cache', None)    # resolved gateways go with the ports.
+        self._state.pop('generator_durations', None)
+        self._state.pop('frame_cache', None)     # streamblocks kept for reuse go with the ports too.
+        self._state.pop('port_leases', None)
 
     @stc_connected
     def perform(self, command, params=None, **kwargs):
@@ -230,6 +681,98 @@ class StcSession:   # py3.x inherits from object by default
         log.debug('result: {}'.format(json.dumps(data, indent=4, sort_keys=True)))
         return data
 
+    # PDU config section --> handle prefix of the PDU objects, for finding the PDUs of loaded streamblocks.
+    pdu_types = {
+        StcEthernetII.config_key: 'ethernet:ethernetii',
+        StcIPv4.config_key: 'ipv4:ipv4',
+    }
+
+    @stc_connected
+    def load_project(self, path, overrides=None):
+        '''
+        Replace the session's project with the STC configuration (XML, as written by
+        save_project() or the STC application) in the local file at path. The file is uploaded
+        and loaded with one LoadFromXml, instead of creating the objects one at a time, and the
+        ports in it are attached with one AttachPorts per chassis. Streamblocks and ports the
+        session had are deleted first. The loaded streamblocks go in the session state, so
+        traffic_start starts them (instead of building streamblocks from the config) until they
+        are destroyed.
+
+        overrides, {section: {attribute: value}} for the streamblock and ipv4 sections, are then
+        set on every loaded streamblock with one config call per object changed (see
+        StcStreamblock.configure()). Returns the loaded streamblocks as StcStreamblock.
+        '''
+        overrides = {s: a for s, a in (overrides or {}).items() if a}
+        for section in overrides:
+            if section != StcStreamblock.config_key and section not in StcSession.pdu_types:
+                raise StcSessionException('Can not override {} of loaded streamblocks.'.format(section))
+
+        self.destroy_streamblocks()
+        if self._state.get('ports'):
+            self.detach_ports()
+
+        name = os.path.basename(path)
+        log.info('Uploading {} to the session as {}'.format(path, name))
+        self._stc.upload(path, name)
+        self.perform('LoadFromXml', FileName=name)
+        self.mark_dirty()
+
+        # the loaded project replaces the session's, and what was made in it.
+        self._state.pop('imix', None)
+        projects = self._stc.get('system1', 'children-project').split()
+        if not projects:
+            raise StcSessionException('No project in {}.'.format(path))
+        self._state['project_handle'] = projects[0]
+        log.info('Loaded project {}'.format(projects[0]))
+        if self._lease:
+            # the lease is not part of the project (and a loaded one is somebody else's).
+            self._lease.reset()
+
+        ports = self._stc.get(projects[0], 'children-port').split()
+        locations = {}
+        entries = []
+        for port in ports:
+            data = {k.lower(): v for k, v in self._stc.get(port, 'location', 'children-streamblock').items()}
+            locations[data['location']] = port
+            for sb in data['children-streamblock'].split():
+                entries.append({'handle': sb, 'port': port, 'pdus': {}, 'running': False,
+                                'config': {s: {} for s in overrides}})
+
+        if ports:
+            self._attach_ports(list(locations.items()))
+
+        self._state['ports'] = ports
+        self._state['port_locations'] = locations
+        self._state['streamblocks'] = entries
+        self._state['project_file'] = path
+        log.info('Loaded {} port(s) and {} streamblock(s).'.format(len(ports), len(entries)))
+
+        # PDU handles are only looked up if there are PDU overrides to send.
+        if [s for s in overrides if s in StcSession.pdu_types]:
+            for e in entries:
+                for h in self._stc.get(e['handle'], 'children').split():
+                    for section, prefix in StcSession.pdu_types.items():
+                        if h.startswith(prefix) and section not in e['pdus']:
+                            e['pdus'][section] = h
+
+        streamblocks = self.streamblocks()
+        if overrides:
+            for sb in streamblocks:
+                sb.configure(overrides)
+
+        return streamblocks
+
+    @stc_connected
+    def save_project(self, path):
+        '''Save the session's project as an STC configuration (XML) to the local file at path,
+        with one SaveAsXml and one download. load_project() loads it again.'''
+        name = os.path.basename(path)
+        log.info('Saving project {} as {}'.format(self.project_handle, name))
+        self.perform('SaveAsXml', Config=self.project_handle, FileName=name)
+        self._stc.download(name, save_as=path)
+        StcSessionLease.strip(path)
+        log.info('Saved project to {}'.format(path))
+
     def save_and_write_session(self, filehandle):
         json.dump(self._state, filehandle, indent=4, sort_keys=True)
 
@@ -1,9 +1,13 @@
 import logging
-from sys import maxsize
-from time import sleep
+import json
+from hashlib import sha1
+from threading import Event
+from time import monotonic
 
 from stc_ipv4 import StcIPv4
 from stc_ethernetII import StcEthernetII
+from stc_arp import StcArp, StcArpException
+from stc_modifier import StcModifiers
 
 log = logging.getLogger(__name__)
 
@@ -50,73 +54,248 @@ class StcStreamblock:
     }
     config_key = 'streamblock'
 
-    def __init__(self, handle, port_handle, session):
+    # streamblock attributes that can be changed while traffic is running. Changing anything 
+    # else stops the streamblock for the change and starts it again.
+    live_attributes = ['Load', 'LoadUnit']
+
+    # the config sections a streamblock's frames are built from.
+    frame_sections = [config_key, StcEthernetII.config_key, StcIPv4.config_key, StcModifiers.config_key]
+
+    def __init__(self, handle, port_handle, session, config=None):
         self._handle = handle
         self._port_handle = port_handle
         self._session = session
-        self._config = session.config.data[StcStreamblock.config_key]
+        self._stc_config = config if config else session.config
+        self._config = self._stc_config.data[StcStreamblock.config_key]
+
+    @staticmethod
+    def frame_key(config):
+        '''Hash of the parts of the given StcConfig that a streamblock is built from. Streamblocks
+        built from configs with the same key send the same frames. See StcFrameCache.'''
+        frames = {s: config.data.get(s, {}) for s in StcStreamblock.frame_sections}
+        return sha1(json.dumps(frames, sort_keys=True, default=str).encode()).hexdigest()
+
+    @property
+    def port_handle(self):
+        return self._port_handle
+
+    @property
+    def handle(self):
+        # the handle may be a placeholder if this streamblock was created in a session batch.
+        self._handle = self._session.resolve(self._handle)
+        return self._handle
+
+    @property
+    def gateway(self):
+        return self._stc_config.data[StcIPv4.config_key]['gateway']
+
+    @property
+    def state(self):
+        '''This streamblock's entry in the session state, None if it has none.'''
+        for sb in self._session.state.get('streamblocks', []):
+            if self._session.resolve(sb['handle']) == self.handle:
+                return sb
+
+        return None
+
+    @property
+    def running(self):
+        state = self.state
+        return bool(state and state.get('running'))
+
+    def _set_running(self, running):
+        if self.state is not None:
+            self.state['running'] = running
+
+    def _track_pdu(self, section, handle, config):
+        state = self.state
+        if state is not None:
+            state.setdefault('pdus', {})[section] = handle
+            state.setdefault('config', {})[section] = dict(config)
 
     def create_ethernetII(self, **kwargs):
         # GTL - not sure why giving args to ethII causes things to break...
         # GTL - look into this.
-        # kwargs = self._session.config.data[StcEthernetII.config_key]
+        # kwargs = self._stc_config.data[StcEthernetII.config_key]
         # return self._session.create_obj('Ethernet:EthernetII', self._handle, None, **kwargs)
-        return self._session.create_obj('Ethernet:EthernetII', self._handle)
+        h = self._session.create_obj('Ethernet:EthernetII', self.handle)
+        self._track_pdu(StcEthernetII.config_key, h, {})
+        return h
 
     def create_ipv4(self, **kwargs):
-        kwargs = self._session.config.data[StcIPv4.config_key]
-        return self._session.create_obj('ipv4:IPv4', self._handle, None, **kwargs)
+        kwargs = self._stc_config.data[StcIPv4.config_key]
+        attrs = dict(kwargs)
+        if StcModifiers(self._session, self._stc_config).ipv4:
+            # the modifiers refer to the PDU's fields by its name.
+            attrs['Name'] = StcModifiers.ipv4_name
+        h = self._session.create_obj('ipv4:IPv4', self.handle, attrs)
+        self._track_pdu(StcIPv4.config_key, h, kwargs)
+        return h
+
+    def create_modifiers(self):
+        '''Create the IPv4 field modifiers of the config (see StcModifiers), after create_ipv4().
+        Returns their handles.'''
+        modifiers = StcModifiers(self._session, self._stc_config)
+        handles = modifiers.create(self.handle)
+        if handles:
+            log.info('Streamblock on {} sends {} flow(s).'.format(self._port_handle, modifiers.flows()))
+
+        return handles
+
+    def changes(self, config):
+        '''Return the attributes of the given config (StcConfig) that differ from what this 
+        streamblock was last configured with, as {section: {attribute: value}}. Only the
+        streamblock and its IPv4 PDU are compared; see create_ethernetII() on EthernetII.'''
+        state = self.state
+        if not state or 'config' not in state:
+            raise StcStreamblockException('No config recorded for streamblock {}. Restart traffic to'
+                                          ' change it.'.format(self.handle))
+
+        # modifiers are objects of their own, made with the streamblock.
+        old = state['config'].get(StcModifiers.config_key, {})
+        if json.dumps(old, sort_keys=True) != json.dumps(config.data.get(StcModifiers.config_key, {}), sort_keys=True):
+            raise StcStreamblockException('Modifiers of streamblock {} changed. Restart traffic to'
+                                          ' change them.'.format(self.handle))
+
+        changes = {}
+        for section in [StcStreamblock.config_key, StcIPv4.config_key]:
+            if section not in state['config']:
+                continue
+            old = state['config'][section]
+            new = config.data[section]
+            diff = {k: v for k, v in new.items() if k not in old or str(old[k]) != str(v)}
+            if diff:
+                changes[section] = diff
+
+        return changes
+
+    @staticmethod
+    def needs_stop(changes):
+        '''True if the changes can not be made while traffic is running.'''
+        for section, attrs in changes.items():
+            if section != StcStreamblock.config_key:
+                return True
+            if [a for a in attrs if a not in StcStreamblock.live_attributes]:
+                return True
+
+        return False
 
-    def generate_traffic(self):
+    def configure(self, changes):
+        '''Send the changes (from changes()) to the streamblock and its PDUs, one config call per 
+        object changed, and record them. They are not applied; see StcSession.apply().'''
+        state = self.state
+        for section, attrs in changes.items():
+            h = self.handle if section == StcStreamblock.config_key else state['pdus'].get(section)
+            if not h:
+                raise StcStreamblockException('No {} PDU recorded for streamblock {}.'.format(section, self.handle))
+
+            log.info('Changing {} {}: {}'.format(h, section, attrs))
+            self._session.stc.config(h, attrs)
+            state['config'][section].update(attrs)
+
+        if changes:
+            self._session.mark_dirty()
+
+        self._stc_config = self._stc_config.copy(changes)
+        self._config = self._stc_config.data[StcStreamblock.config_key]
+        if changes and state.get('key'):
+            state['key'] = StcStreamblock.frame_key(self._stc_config)
+
+    def update(self, config=None):
+        '''
+        Change this streamblock to match the given config (StcConfig), by default the session 
+        config, sending only the attributes that changed. Load changes are made with traffic
+        running; other changes stop the streamblock, if running, and start it again after. 
+        Returns the changes made.
+        '''
+        config = config if config else self._session.config
+        changes = self.changes(config)
+        if not changes:
+            log.info('No changes for streamblock {}.'.format(self.handle))
+            return changes
+
+        restart = self.running and StcStreamblock.needs_stop(changes)
+        if restart:
+            log.info('Stopping streamblock {} to change it.'.format(self.handle))
+            self._session.perform('StreamBlockStop', streamblocklist=self.handle)
+
+        self.configure(changes)
+        self._session.apply()
+
+        if restart:
+            self.resolve_arp()
+            self._session.perform('StreamBlockStart', streamblocklist=self.handle)
+
+        return changes
+
+    def resolve_arp(self):
+        '''Resolve the gateway of this streamblock. StcStreamblockException raised on failure.'''
+        try:
+            StcArp(self._session, self._stc_config).resolve([self])
+        except StcArpException as e:
+            raise StcStreamblockException(str(e))
+
+    def generate_traffic(self, stop=None):
+        '''
+        Run traffic on this streamblock for the "traffic_duration" seconds in the stc_session
+        config. The port's generator is set to run for that long and the chassis stops it, so
+        the run length does not include REST round trips. Without a traffic_duration, traffic
+        runs until the stop threading.Event is set (forever if not given). Setting stop also
+        cuts a timed run short. StcStreamblockException raised on errors.
+        '''
         # GTL - FIX THIS STUPID CLASS DESIGN that req. hardcoding these strings.
         sess_conf_key = 'stc_session'
         traf_time_key = 'traffic_duration'
         if traf_time_key not in self._session.config.data[sess_conf_key]:
-            t = maxsize
-        else:
-            t = self._session.config.data[sess_conf_key][traf_time_key]
+            self.start_traffic()
+            (stop if stop else Event()).wait()
+            self.stop_traffic()
+            return
 
-        self.start_traffic()
-
-        log.info('Sleeping {} seconds'.format(t))
-        sleep(t)
+        t = self._session.config.data[sess_conf_key][traf_time_key]
+        ports = [self._port_handle]
+        self._session.set_duration(ports, 'SECONDS', t)
+        self._session.apply()
+        generator = self._session.generator(self._port_handle)
+        self._session.perform('GeneratorStop', generatorlist=generator)
+        self.resolve_arp()
 
-        self.stop_traffic()
+        log.info('Running generator {} for {} seconds'.format(generator, t))
+        self._session.perform('GeneratorStart', generatorlist=generator)
+        end = monotonic() + t
+        self._set_running(True)
+        result = self._session.wait_generators(ports, end=end, deadline=end + 60, stop=stop)
+        self._set_running(False)
+        if result == 'timeout':
+            raise StcStreamblockException('Generator {} still running after the timed run.'.format(generator))
 
     def start_traffic(self):
         '''
-        Given this stream block, generate traffic via our session for the time given.
+        Start traffic on this stream block via our session. It runs until stop_traffic().
 
-        This method will block until the the time has passed. If seconds is zero, it will
-        block for a very long time.
-
-        StcStreamblockException raised on errors. True returned on sucess.
+        StcStreamblockException raised on errors.
 
         '''
-        # GTL is this needed?
-        self._session.stc.apply()
+        # StreamBlockStart runs for as long as the generator is set to; make that forever.
+        self._session.set_duration([self._port_handle])
+        # Only applies if there are changes since the last apply.
+        self._session.apply()
 
-        generator = self._session.stc.get(self._port_handle, 'children-generator')  # ugh. just ugh.
+        generator = self._session.generator(self._port_handle)
 
         # stop to get to known state
         log.info('Stopping generator to get to known state.')
         self._session.perform('GeneratorStop', generatorlist=generator)
 
-        # do ARP
-        log.info('Doing ARP to resolve gateway addresses.')
-        self._session.perform('ArpNDStart', handlelist=self._handle)
-        status = self._session.perform('ArpNDVerifyResolved', handlelist=self._handle)
-        if not status:
-            raise StcStreamblockException('Error when getting ARP response status.')
-
-        if 'PassFailState' not in status or status['PassFailState'] != 'PASSED':
-            raise StcStreamblockException('ARP failed. Status: {}'.format(status))
+        self.resolve_arp()
 
-        log.info('Starting streamblock {}'.format(self._handle))
-        status = self._session.perform('StreamBlockStart', streamblocklist=self._handle)
+        log.info('Starting streamblock {}'.format(self.handle))
+        status = self._session.perform('StreamBlockStart', streamblocklist=self.handle)
+        self._set_running(True)
 
     def stop_traffic(self):
-        log.info('Stopping streamblock {}'.format(self._handle))
-        status = self._session.perform('StreamBlockStop', streamblocklist=self._handle)
+        log.info('Stopping streamblock {}'.format(self.handle))
+        status = self._session.perform('StreamBlockStop', streamblocklist=self.handle)
+        self._set_running(False)
 
         return True
@@ -0,0 +1,148 @@
+import logging
+from time import sleep
+
+from stc_streamblock import StcStreamblock
+from stc_profile import StcTrafficProfile
+from stc_results import StcResults
+
+log = logging.getLogger(__name__)
+
+class StcSweepException(Exception):
+    pass
+
+class StcSweep:
+    '''
+    Load sweep and throughput search (RFC 2544 style) over a traffic profile. For each frame
+    size, trials are run at different loads and the Tx and Rx frame counts of each trial are
+    compared. A trial passes if no more than loss_threshold percent of the frames are lost.
+
+    step mode runs the loads in the "loads" list, lowest first, and stops at the first trial
+    that fails. binary mode runs max_load and, if that fails, binary searches between
+    min_load and max_load until the passing and failing loads are within resolution.
+
+    All trials run in the same session on the same ports and streamblocks. Between trials only
+    the changed streamblock attributes are sent (see StcTrafficProfile.update()).
+    '''
+
+    default_config = {
+        'mode': 'binary',
+        'frame_sizes': [64, 128, 256, 512, 1024, 1280, 1518],
+        'loads': [10, 20, 30, 40, 50, 60, 70, 80, 90, 100],   # step mode.
+        'min_load': 0,       # binary mode. Assumed to pass.
+        'max_load': 100,
+        'resolution': 1,
+        'load_unit': 'PERCENT_LINE_RATE',
+        'trial_time': 10,    # seconds of traffic per trial.
+        'settle_time': 2,    # seconds to wait after stopping traffic for frames in flight.
+        'loss_threshold': 0.0,
+    }
+    config_key = 'sweep'
+
+    def __init__(self, session, profile=None, config=None):
+        self._session = session
+        self._conf = (config if config else session.config).data[StcSweep.config_key]
+        if self._conf['mode'] not in ['step', 'binary']:
+            raise StcSweepException('Unknown sweep mode {}. Use step or binary.'.format(self._conf['mode']))
+
+        self._profile = profile if profile else StcTrafficProfile(session)
+        self._flow_configs = self._profile.flow_configs()
+        self.trials = []
+
+    def _counts(self, results):
+        results.poll()
+        summary = results.summary()
+        tx = rx = 0
+        for handle in self._profile.handles:
+            s = summary.get(handle, {})
+            tx += s.get('tx_frames', 0)
+            rx += s.get('rx_frames', 0)
+
+        return tx, rx
+
+    def _latency(self, results):
+        lat = [s for (h, rt), s in results.buffer.latest().items()
+               if rt == 'RxStreamResults' and h in self._profile.handles]
+        if not lat:
+            return None, None
+
+        return sum([s.latency_avg for s in lat]) / len(lat), max([s.latency_max for s in lat])
+
+    def trial(self, results, frame_size, load):
+        '''Run one trial and return its row of the results table.'''
+        self._profile.update([c.copy({StcStreamblock.config_key: {
+            'FixedFrameLength': str(frame_size), 'Load': str(load), 'LoadUnit': self._conf['load_unit']}})
+            for c in self._flow_configs])
+
+        # the latency counters run for as long as the results do, so every trial starts them
+        # (and the frame counts) from zero on all ports, the receiving ones included. Otherwise
+        # a trial would report the worst latency of any trial before it.
+        self._session.perform('ResultsClearAll', PortList=' '.join(self._session.state.get('ports', [])))
+        tx0, rx0 = self._counts(results)
+        # timed by the chassis, so REST round trips do not count as trial time.
+        self._profile.run_timed(self._conf['trial_time'])
+        sleep(self._conf['settle_time'])
+        tx1, rx1 = self._counts(results)
+
+        tx, rx = tx1 - tx0, rx1 - rx0
+        loss = 100.0 * (tx - rx) / tx if tx else 100.0
+        lat_avg, lat_max = self._latency(results)
+        secs = float(self._conf['trial_time'])
+        row = {
+            'frame_size': frame_size,
+            'load': load,
+            'load_unit': self._conf['load_unit'],
+            'tx_frames': tx,
+            'rx_frames': rx,
+            'loss_pct': loss,
+            'rx_fps': rx / secs,
+            'rx_mbps': rx * frame_size * 8 / secs / 1e6,
+            'latency_avg': lat_avg,
+            'latency_max': lat_max,
+            'passed': tx > 0 and loss <= self._conf['loss_threshold'],
+        }
+        log.info('frame size {} load {}: tx {} rx {} loss {:.3f}% {}'.format(
+            frame_size, load, tx, rx, loss, 'PASS' if row['passed'] else 'FAIL'))
+        self.trials.append(row)
+        return row
+
+    def _step(self, results, frame_size):
+        best = None
+        for load in sorted(self._conf['loads']):
+            row = self.trial(results, frame_size, load)
+            if not row['passed']:
+                break
+            best = row
+
+        return best
+
+    def _binary(self, results, frame_size):
+        lo, hi = self._conf['min_load'], self._conf['max_load']
+        row = self.trial(results, frame_size, hi)
+        if row['passed']:
+            return row
+
+        best = None
+        while hi - lo > self._conf['resolution']:
+            mid = (lo + hi) / 2.0
+            row = self.trial(results, frame_size, mid)
+            if row['passed']:
+                lo, best = mid, row
+            else:
+                hi = mid
+
+        return best
+
+    def run(self):
+        '''Run the sweep. Returns a list with, per frame size, the highest passing trial's row
+        (throughput), or a row with load None if no trial passed. All trials are in .trials.'''
+        if not self._profile.streamblocks:
+            self._profile.create()
+
+        search = self._step if self._conf['mode'] == 'step' else self._binary
+        summary = []
+        with StcResults(self._session) as results:
+            for frame_size in self._conf['frame_sizes']:
+                best = search(results, frame_size)
+                summary.append(best if best else {'frame_size': frame_size, 'load': None, 'passed': False})
+
+        return summary
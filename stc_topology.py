@@ -0,0 +1,301 @@
+import logging
+import json
+import threading
+from math import ceil
+
+from stc_streamblock import StcStreamblock
+from stc_ipv4 import StcIPv4
+from stc_profile import StcTrafficProfile
+from stc_session import StcSession
+from stc_lease import StcSessionLease
+
+log = logging.getLogger(__name__)
+
+class StcTopologyException(Exception):
+    pass
+
+class StcPlan:
+    '''
+    The REST calls needed to bring up a topology, in order, grouped in stages. The calls of a
+    concurrent stage do not depend on each other and are sent up to workers at a time. Every
+    call is a dict with the method, what it creates or performs, and its arguments. Handles of
+    objects that do not exist yet are written as "type(n)".
+    '''
+
+    def __init__(self, stages, configs, workers):
+        self.stages = stages     # [{'name': ..., 'concurrent': bool, 'calls': [...]}, ...]
+        self.configs = configs   # StcConfig per flow, in streamblock order.
+        self.workers = workers
+
+    def calls(self):
+        '''Total number of REST calls in the plan.'''
+        return sum([len(s['calls']) for s in self.stages])
+
+    def round_trips(self):
+        '''Estimated number of REST round trips in a row (concurrent calls overlap).'''
+        trips = 0
+        for s in self.stages:
+            n = len(s['calls'])
+            trips += int(ceil(n / float(self.workers))) if s['concurrent'] else n
+
+        return trips
+
+    def to_dict(self):
+        return {
+            'stages': self.stages,
+            'flows': len(self.configs),
+            'workers': self.workers,
+            'calls': self.calls(),
+            'round_trips': self.round_trips(),
+        }
+
+    def __str__(self):
+        lines = []
+        for s in self.stages:
+            lines.append('{} ({} call(s){}):'.format(s['name'], len(s['calls']),
+                                                     ', concurrent' if s['concurrent'] else ''))
+            for c in s['calls']:
+                args = ' '.join(['{}={}'.format(k, v) for k, v in sorted(c.get('args', {}).items())])
+                lines.append('    {} {} {}'.format(c['method'], c['target'], args).rstrip())
+
+        lines.append('{} REST call(s), about {} round trip(s) with {} worker(s).'.format(
+            self.calls(), self.round_trips(), self.workers))
+        return '\n'.join(lines)
+
+class StcPlanRecorder:
+    '''
+    Stand-in for an StcHttp that records the calls made through it, as StcPlan stages, instead
+    of sending them. Objects it creates get "type(n)" handles, gets return empty values, and
+    has_bulk_ops() returns bulk. Calls made from worker threads, on clients from fork(), go in
+    a concurrent stage, one per batch of workers (until the clients are closed); the rest go
+    in sequential stages. Stages are named after the methods (or commands) they call.
+    '''
+
+    def __init__(self, bulk=True, book=None):
+        self._bulk = bulk
+        self._forked = book is not None
+        # shared with the forks: the stages, the open concurrent stage, and the handle counts.
+        self._book = book if book else {'stages': [], 'stage': None, 'counts': {}, 'lock': threading.Lock()}
+
+    @property
+    def stages(self):
+        for s in self._book['stages']:
+            names = []
+            for c in s['calls']:
+                name = c['target'] if c['method'] == 'perform' else c['method']
+                if name not in names:
+                    names.append(name)
+            s['name'] = ', '.join(names)
+
+        return self._book['stages']
+
+    def clear(self):
+        '''Forget the calls recorded so far.'''
+        self._book['stages'], self._book['stage'] = [], None
+
+    def _record(self, method, target, args=None):
+        call = {'method': method, 'target': target}
+        if args:
+            call['args'] = args
+
+        book = self._book
+        with book['lock']:
+            if self._forked:
+                if not book['stage']:
+                    book['stage'] = {'concurrent': True, 'calls': []}
+                    book['stages'].append(book['stage'])
+                stage = book['stage']
+            else:
+                book['stage'] = None
+                if not book['stages'] or book['stages'][-1]['concurrent']:
+                    book['stages'].append({'concurrent': False, 'calls': []})
+                stage = book['stages'][-1]
+            stage['calls'].append(call)
+
+    def _handle(self, obj_type):
+        obj_type = obj_type.lower()
+        with self._book['lock']:
+            n = self._book['counts'].get(obj_type, 0) + 1
+            self._book['counts'][obj_type] = n
+
+        return '{}({})'.format(obj_type, n)
+
+    def fork(self):
+        return StcPlanRecorder(self._bulk, self._book)
+
+    def close(self):
+        if self._forked:
+            self._book['stage'] = None
+
+    def started(self):
+        return True
+
+    def new_session(self, user_name, session_name=None, *args, **kwargs):
+        self._record('new_session', user_name)
+        return session_name if session_name else 'session(new)'
+
+    def join_session(self, sid):
+        self._record('join_session', sid)
+        return sid
+
+    def connect(self, chassis_list):
+        self._record('connect', ' '.join(chassis_list))
+
+    def has_bulk_ops(self):
+        self._record('has_bulk_ops', 'system')
+        return self._bulk
+
+    def createx(self, object_type, under=None, attributes=None, **kwattrs):
+        args = dict(attributes) if attributes else {}
+        args.update(kwattrs)
+        if under:
+            args['under'] = under
+        self._record('createx', object_type, args)
+        return {'handle': self._handle(object_type)}
+
+    def create(self, object_type, under=None, attributes=None, **kwattrs):
+        args = dict(attributes) if attributes else {}
+        args.update(kwattrs)
+        if under:
+            args['under'] = under
+        self._record('create', object_type, args)
+        return self._handle(object_type)
+
+    def bulkcreate(self, object_type, attributes=None, **kwattrs):
+        args = dict(attributes) if attributes else {}
+        args.update(kwattrs)
+        self._record('bulkcreate', object_type, args)
+
+        def _handles(obj_type, tree):
+            handles = [self._handle(obj_type)]
+            for child_type, subtrees in tree.items():
+                for subtree in (subtrees if isinstance(subtrees, list) else [subtrees]):
+                    if isinstance(subtree, dict):
+                        handles += _handles(child_type, subtree)
+            return handles
+
+        return {'status': 'success', 'handles': _handles(object_type, args)}
+
+    def config(self, handle, attributes=None, **kwattrs):
+        args = dict(attributes) if attributes else {}
+        args.update(kwattrs)
+        self._record('config', handle, args)
+
+    def get(self, handle, *args):
+        self._record('get', handle, {'attributes': ' '.join(args)} if args else None)
+        return '' if len(args) == 1 else {a: '' for a in args}
+
+    def perform(self, command, params=None, **kwargs):
+        args = dict(params) if params else {}
+        args.update(kwargs)
+        self._record('perform', command, args)
+        return {}
+
+    def delete(self, handle):
+        self._record('delete', handle)
+
+    def apply(self):
+        self._record('apply', '')
+
+class StcTopology:
+    '''
+    A whole test topology: named enclaves and any number of flows between them, each with its
+    own frame size, load, and protocol. execute() brings it up in a session with few REST calls:
+    every port is created once however many flows use it, the ports of each chassis are attached
+    with one call, all chassis at once, and the streamblocks are created one bulk call each,
+    concurrently. It returns the StcTrafficProfile of the flows. compile() returns the StcPlan
+    of the calls execute() will make, without sending any.
+
+        {
+            "enclaves": {"a": "10.1.1.25", "b": "10.2.1.25"},
+            "defaults": {"streamblock": {"Load": "5"}},
+            "flows": [
+                {"src": "a", "dst": "b", "frame_size": 512, "load": 20, "protocol": 6},
+                {"src": "b", "dst": "a", "ipv4": {"ttl": 64}}
+            ]
+        }
+
+    src and dst are enclave names or addresses. defaults and the per flow config sections
+    (streamblock, ipv4, ...) are applied on top of the session config, then the per flow
+    shorthands below. Identical flows are only created once.
+    '''
+
+    # flow shorthand --> (config section, attribute)
+    flow_keys = {
+        'frame_size': (StcStreamblock.config_key, 'FixedFrameLength'),
+        'load': (StcStreamblock.config_key, 'Load'),
+        'load_unit': (StcStreamblock.config_key, 'LoadUnit'),
+        'protocol': (StcIPv4.config_key, 'protocol'),
+    }
+
+    def __init__(self, topology):
+        self._enclaves = topology.get('enclaves', {})
+        self._defaults = topology.get('defaults', {})
+        self._flows = topology.get('flows', [])
+        if not self._flows:
+            raise StcTopologyException('Topology has no flows.')
+
+    def _addr(self, name):
+        return self._enclaves.get(name, name)
+
+    def flows(self):
+        '''Return the distinct flows of the topology in the traffic_profile "flows" format.'''
+        flows = []
+        for f in self._flows:
+            if 'src' not in f or 'dst' not in f:
+                raise StcTopologyException('Flow without a src and dst: {}'.format(f))
+
+            flow = json.loads(json.dumps(self._defaults))   # deep copy.
+            for section, attrs in f.items():
+                if isinstance(attrs, dict):
+                    flow.setdefault(section, {}).update(attrs)
+
+            ipv4 = flow.setdefault(StcIPv4.config_key, {})
+            ipv4['sourceAddr'], ipv4['destAddr'] = self._addr(f['src']), self._addr(f['dst'])
+            for key, (section, attr) in StcTopology.flow_keys.items():
+                if key in f:
+                    flow.setdefault(section, {})[attr] = str(f[key])
+
+            if flow in flows:
+                log.warning('Ignoring duplicate flow {} --> {}'.format(f['src'], f['dst']))
+                continue
+
+            flows.append(flow)
+
+        return flows
+
+    def compile(self, session, bulk=None, workers=8):
+        '''Return the StcPlan for bringing up the topology in the given session (connected or
+        not). The plan is what execute() does, dry run on a copy of the session whose calls are
+        recorded by an StcPlanRecorder, so work the session state says is done already (connecting,
+        ports, cached streamblocks, ...) is left out. bulk says if the server has the bulk API,
+        None to use what the session knows.'''
+        configs = StcTrafficProfile(session).flow_configs(self.flows())
+        bulk = session.state.get('bulk_ops', True) if bulk is None else bulk
+        recorder = StcPlanRecorder(bulk)
+        # the copy never renews its lease from a background thread.
+        config = session.config.copy({StcSessionLease.config_key: {'heartbeat': 0}})
+        dry = StcSession(config, state=json.loads(json.dumps(session.state)), keep_open=True)
+        dry.connect(stc=recorder)
+        if session.stc:
+            recorder.clear()     # execute() does not connect a connected session.
+
+        StcTopology.bring_up(dry, configs, workers)
+        return StcPlan(recorder.stages, configs, workers)
+
+    @staticmethod
+    def bring_up(session, configs, workers):
+        '''Create the ports and streamblocks of the flow configs in the (connected) session and
+        apply them. Returns their StcTrafficProfile.'''
+        profile = StcTrafficProfile(session).create(configs, workers=workers)
+        session.apply()
+        return profile
+
+    @staticmethod
+    def execute(plan, session):
+        '''Bring up the plan in the session, connecting it first if need be. Returns the
+        StcTrafficProfile of the plan's flows, ready to start.'''
+        if not session.stc:
+            session.connect()
+
+        return StcTopology.bring_up(session, plan.configs, plan.workers)
@@ -0,0 +1,148 @@
+import atexit
+import logging
+import json
+import sys
+from collections import namedtuple
+from time import monotonic, time
+
+log = logging.getLogger(__name__)
+
+# One call made to the STC REST client. target is the command for perform, the object type
+# for creates, and the handle (or other first argument) for everything else. sent and received
+# are request and response body bytes. outcome is "ok" or the name of the exception raised.
+StcCall = namedtuple('StcCall', ['time', 'method', 'target', 'seconds', 'sent', 'received', 'outcome', 'error'])
+
+class StcTracedHttp:
+    '''
+    Stand-in for an StcHttp that times every call made through it and passes an StcCall
+    for each one to every hook in the given list. Hooks are plain callables, added to
+    and removed from the list at any time. A hook that raises is logged and ignored.
+    '''
+
+    # StcHttp methods that do not talk to the server, so are not traced.
+    untraced = ['started', 'session_id', 'debug_print', 'enable_debug_print', 'disable_debug_print',
+                'set_timeout', 'timeout', 'close', 'bytes_transferred', 'fork']
+
+    def __init__(self, stc, hooks):
+        self._stc = stc
+        self._hooks = hooks
+
+    def __getattr__(self, name):
+        attr = getattr(self._stc, name)
+        if name.startswith('_') or name in StcTracedHttp.untraced or not callable(attr):
+            return attr
+
+        def _traced(*args, **kwargs):
+            return self._call(name, attr, args, kwargs)
+
+        return _traced
+
+    def _bytes(self):
+        return self._stc.bytes_transferred() if hasattr(self._stc, 'bytes_transferred') else (0, 0)
+
+    def _call(self, name, method, args, kwargs):
+        if not self._hooks:
+            return method(*args, **kwargs)
+
+        target = args[0] if args else kwargs.get('command', kwargs.get('handle', ''))
+        if isinstance(target, (list, tuple)):
+            target = ' '.join([str(t) for t in target])
+
+        sent, received = self._bytes()
+        start, start_time = monotonic(), time()
+        outcome, error = 'ok', None
+        try:
+            return method(*args, **kwargs)
+        except Exception as e:
+            outcome, error = type(e).__name__, str(e)
+            raise
+        finally:
+            seconds = monotonic() - start
+            end_sent, end_received = self._bytes()
+            call = StcCall(start_time, name, str(target), seconds, end_sent - sent, end_received - received,
+                           outcome, error)
+            for hook in list(self._hooks):
+                try:
+                    hook(call)
+                except Exception as e:
+                    log.warning('trace hook {} failed: {}'.format(hook, e))
+
+class StcTraceFile:
+    '''Hook that appends each call to a file as one line of JSON.'''
+
+    def __init__(self, path):
+        self._fd = open(path, 'a')
+
+    def __call__(self, call):
+        self._fd.write(json.dumps(call._asdict(), sort_keys=True) + '\n')
+        self._fd.flush()
+
+    def close(self):
+        self._fd.close()
+
+class StcTraceSummary:
+    '''
+    Hook that keeps the count, total, max, and a latency histogram of the calls made, per
+    method (per command for perform, so a slow command stands out). Histogram buckets are
+    powers of two in milliseconds.
+    '''
+
+    buckets = [2 ** i for i in range(15)]    # upper bounds, 1ms to ~16s. Anything slower is its own bucket.
+
+    def __init__(self):
+        self._stats = {}
+
+    def __call__(self, call):
+        key = '{} {}'.format(call.method, call.target) if call.method == 'perform' else call.method
+        s = self._stats.setdefault(key, {'count': 0, 'errors': 0, 'seconds': 0.0, 'max': 0.0,
+                                         'histogram': [0] * (len(StcTraceSummary.buckets) + 1)})
+        ms = call.seconds * 1000
+        s['count'] += 1
+        s['errors'] += 0 if call.outcome == 'ok' else 1
+        s['seconds'] += call.seconds
+        s['max'] = max(s['max'], call.seconds)
+        i = 0
+        while i < len(StcTraceSummary.buckets) and ms > StcTraceSummary.buckets[i]:
+            i += 1
+        s['histogram'][i] += 1
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def report(self):
+        '''Return the summary as text, slowest (by total time) first.'''
+        if not self._stats:
+            return 'No STC REST calls made.'
+
+        labels = ['<={}ms'.format(b) for b in StcTraceSummary.buckets] + ['>{}ms'.format(StcTraceSummary.buckets[-1])]
+        lines = ['{:<36} {:>6} {:>6} {:>10} {:>10} {:>10}'.format('call', 'count', 'errors', 'total ms',
+                                                                  'avg ms', 'max ms')]
+        for key, s in sorted(self._stats.items(), key=lambda i: i[1]['seconds'], reverse=True):
+            lines.append('{:<36} {:>6} {:>6} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+                key, s['count'], s['errors'], s['seconds'] * 1000, s['seconds'] * 1000 / s['count'],
+                s['max'] * 1000))
+            top = max(s['histogram'])
+            for label, n in zip(labels, s['histogram']):
+                if n:
+                    lines.append('    {:>9} {:>6} {}'.format(label, n, '#' * max(1, int(40 * n / top))))
+
+        return '\n'.join(lines)
+
+    def write(self, fd=None):
+        fd = fd if fd else sys.stderr
+        fd.write(self.report() + '\n')
+
+def trace_session(session, path):
+    '''Trace all REST calls of the session to the JSON lines file at path and write a summary
+    of them to stderr when the process exits.'''
+    trace, summary = StcTraceFile(path), StcTraceSummary()
+    session.add_hook(trace)
+    session.add_hook(summary)
+
+    def _done():
+        trace.close()
+        summary.write()
+
+    atexit.register(_done)
+    return summary
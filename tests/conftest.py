@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# the modules live at the top of the repository, not in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stc_config import StcConfig
+from stc_emulator import StcEmulator
+
+@pytest.fixture
+def emulator(request):
+    '''An StcEmulator running in this process. Parametrize indirectly with a dict of
+    StcEmulator arguments, i.e. {"bulk": False}, to change it.'''
+    with StcEmulator(**getattr(request, 'param', {})) as emu:
+        yield emu
+
+@pytest.fixture
+def config(emulator):
+    '''A config (StcConfig) for sessions on the emulator. The lease is not renewed from a
+    background thread, so tests do not leave threads behind.'''
+    config = StcConfig()
+    config.apply_config({
+        'stc_session': {'stc_server_addr': emulator.addr, 'stc_server_port': str(emulator.port)},
+        'lease': {'heartbeat': 0},
+        'arp': {'backoff': 0.05},
+    })
+    return config
@@ -0,0 +1,46 @@
+import pytest
+
+from stc_results import StcResultSample
+
+numpy = pytest.importorskip('numpy')
+from stc_analysis import StcAnalysis
+
+def sample(t, frames, handle='streamblock1', result_type='TxStreamResults'):
+    return StcResultSample(time=t, handle=handle, result_type=result_type, frames=frames, bytes=frames * 100,
+                           frame_rate=0.0, dropped=0, latency_min=0.0, latency_avg=10.0, latency_max=20.0,
+                           out_of_seq=0)
+
+def run(handle='streamblock1', start=0.0, rx_lost=0):
+    '''Ten seconds of 1000 frames a second, tx and rx.'''
+    samples = []
+    for i in range(11):
+        samples.append(sample(start + i, 1000 * i, handle))
+        samples.append(sample(start + i, 1000 * i - (rx_lost if i else 0), handle, 'RxStreamResults'))
+    return samples
+
+def test_totals_and_rates():
+    streams = StcAnalysis.from_samples(run()).streams()
+    tx = streams[('streamblock1', 'TxStreamResults')]
+    assert tx['samples'] == 11
+    assert tx['duration'] == 10.0
+    assert tx['frames'] == 10000
+    assert tx['fps_avg'] == tx['fps_p50'] == 1000.0
+
+def test_counter_restart():
+    samples = [sample(0.0, 0), sample(1.0, 500), sample(2.0, 100), sample(3.0, 600)]
+    assert StcAnalysis.from_samples(samples).streams()[('streamblock1', 'TxStreamResults')]['frames'] == 1100
+
+def test_summary_loss():
+    flow = StcAnalysis.from_samples(run(rx_lost=100)).summary()['flows']['streamblock1']
+    assert flow['lost_frames'] == 100
+    assert flow['loss_pct'] == pytest.approx(1.0)
+
+def test_concat_keeps_runs_apart():
+    a, b = StcAnalysis.from_samples(run()), StcAnalysis.from_samples(run(start=3600.0))
+    flows = StcAnalysis.concat([a, b], names=['a.csv', 'b.csv']).summary()['flows']
+    assert sorted(flows) == ['a.csv:streamblock1', 'b.csv:streamblock1']
+    assert flows['b.csv:streamblock1']['rx']['duration'] == 10.0
+
+def test_concat_distinct_handles_unlabeled():
+    a, b = StcAnalysis.from_samples(run('streamblock1')), StcAnalysis.from_samples(run('streamblock2'))
+    assert sorted(StcAnalysis.concat([a, b]).summary()['flows']) == ['streamblock1', 'streamblock2']
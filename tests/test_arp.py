@@ -0,0 +1,68 @@
+from collections import namedtuple
+
+import pytest
+
+from stc_arp import StcArp, StcArpException
+from stc_config import StcConfig
+
+Streamblock = namedtuple('Streamblock', ['handle', 'port_handle', 'gateway'])
+
+class Session:
+    '''Just enough of an StcSession for StcArp: handles in unresolved resolve after that
+    many ArpNDStarts, and the ARP cache of every port holds the resolved gateways.'''
+    def __init__(self, unresolved=None, **arp):
+        self.config = StcConfig().copy({'arp': dict({'backoff': 0.01, 'max_backoff': 0.01}, **arp)})
+        self.state = {}
+        self.unresolved = dict(unresolved or {})
+        self.calls = []
+        self.stc = self
+
+    def perform(self, command, **params):
+        handles = params['handlelist'].split()
+        self.calls.append((command, handles))
+        if command == 'ArpNDStart':
+            for h in handles:
+                if h in self.unresolved:
+                    self.unresolved[h] -= 1
+        elif command == 'ArpNDVerifyResolved':
+            failed = [h for h in handles if self.unresolved.get(h, 0) > 0]
+            return {'PassFailState': 'FAILED' if failed else 'PASSED'}
+        return {'State': 'COMPLETED'}
+
+    def arpcache(self, port):
+        return port + '-arpcache'
+
+    def get(self, handle, attr):
+        return '{//c/1/1 10.8.1.1 00:10:94:00:00:01} {//c/1/1 10.8.2.1 00:10:94:00:00:02}'
+
+def streamblocks(n):
+    return [Streamblock('sb{}'.format(i), 'port1', '10.8.{}.1'.format(i + 1)) for i in range(n)]
+
+def test_retries_only_the_unresolved():
+    session = Session({'sb1': 2})
+    StcArp(session).resolve(streamblocks(2))
+    starts = [h for c, h in session.calls if c == 'ArpNDStart']
+    assert starts == [['sb0', 'sb1'], ['sb1']]
+
+def test_times_out():
+    session = Session({'sb0': 100}, timeout=0.05)
+    with pytest.raises(StcArpException):
+        StcArp(session).resolve(streamblocks(1))
+
+def test_bisects_without_an_unresolved_list():
+    session = Session({'sb3': 100, 'sb12': 100})
+    handles = ['sb{}'.format(i) for i in range(16)]
+    assert StcArp(session)._verify(handles) == ['sb3', 'sb12']
+    assert len(session.calls) < len(handles)
+
+def test_caches_found_macs_only():
+    session = Session()
+    arp = StcArp(session)
+    sbs = streamblocks(3)
+    arp.resolve(sbs)
+    assert session.state['arp_cache']['port1'] == {'10.8.1.1': '00:10:94:00:00:01', '10.8.2.1': '00:10:94:00:00:02'}
+    assert arp.cached(sbs[2]) is None
+
+    session.calls = []
+    arp.resolve(sbs)
+    assert [h for c, h in session.calls if c == 'ArpNDStart'] == [['sb2']]
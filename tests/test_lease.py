@@ -0,0 +1,35 @@
+from time import time
+
+from stc_config import StcConfig
+from stc_lease import StcSessionLease
+
+def test_encode_decode():
+    lease = {'holder': 'user@host:123', 'expires': 1700000000.5}
+    name = StcSessionLease.encode(lease)
+    assert name == 'stc-lease 1700000000 user@host:123'
+    assert StcSessionLease.decode(name) == {'holder': 'user@host:123', 'expires': 1700000000.0}
+
+def test_decode_not_a_lease():
+    for name in [None, '', 'Project 1', 'stc-lease', 'stc-lease soon user@host:1']:
+        assert StcSessionLease.decode(name) is None
+
+def test_strip(tmp_path):
+    path = tmp_path / 'project.xml'
+    path.write_text('<StcSystem>\n<Project id="2" Name="Project 1">\n'
+                    '<Tag id="9" Name="stc-lease 1700000000 user@host:123"/>\n'
+                    '<Tag id="10" Name="mine"></Tag>\n'
+                    '<Port id="3" Location="//c/1/1"/>\n</Project>\n</StcSystem>\n')
+    StcSessionLease.strip(str(path))
+    data = path.read_text()
+    assert 'stc-lease' not in data
+    assert 'Name="mine"' in data and 'Location="//c/1/1"' in data
+
+class Session:
+    def __init__(self, lease=None):
+        self.config = StcConfig().copy({'lease': {'ttl': 100}})
+        self.state = {'lease': lease} if lease else {}
+
+def test_due():
+    assert StcSessionLease(Session()).due()
+    assert not StcSessionLease(Session({'handle': 'tag1', 'expires': time() + 90})).due()
+    assert StcSessionLease(Session({'handle': 'tag1', 'expires': time() + 40})).due()
@@ -0,0 +1,36 @@
+import pytest
+
+from stc_port_map import StcPortMap, StcPortMapException
+
+table = {
+    '10.8.0.0/16': '//10.0.0.1/5/8',
+    '10.9.0.0/16': '//10.0.0.2/1/2',
+    '10.9.7.0/24': '//10.0.0.3/3/1',
+    '10.9.7.5': '//10.0.0.3/3/2',
+}
+
+def test_longest_prefix():
+    m = StcPortMap(table)
+    assert m.location('10.8.200.1') == '//10.0.0.1/5/8'
+    assert m.location('10.9.1.1') == '//10.0.0.2/1/2'
+    assert m.location('10.9.7.1') == '//10.0.0.3/3/1'
+    assert m.location('10.9.7.5') == '//10.0.0.3/3/2'
+    assert len(m) == 4
+
+def test_chassis_in_table_order():
+    assert StcPortMap(table).chassis() == ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+
+def test_no_port():
+    with pytest.raises(StcPortMapException):
+        StcPortMap(table).location('192.168.1.1')
+
+def test_bad_table():
+    with pytest.raises(StcPortMapException):
+        StcPortMap({'10.8.0.0/16': '10.0.0.1/5/8'})
+    with pytest.raises(StcPortMapException):
+        StcPortMap({'10.8.0.0/33': '//10.0.0.1/5/8'})
+
+def test_ilab_rule():
+    m = StcPortMap({}, '10.0.0.1', 5)
+    assert m.location('10.12.1.25') == '//10.0.0.1/5/12'
+    assert m.chassis() == ['10.0.0.1']
@@ -0,0 +1,30 @@
+import pytest
+
+from stc_results import StcResultRing, StcResultSample, StcResultsException
+
+def sample(t, handle='streamblock1', result_type='TxStreamResults', frames=0):
+    return StcResultSample(time=t, handle=handle, result_type=result_type, frames=frames, bytes=frames * 64,
+                           frame_rate=0.0, dropped=0, latency_min=0.0, latency_avg=0.0, latency_max=0.0,
+                           out_of_seq=0)
+
+def test_ring_wraps():
+    ring = StcResultRing(3)
+    for t in range(5):
+        ring.append(sample(float(t), frames=t))
+    assert len(ring) == 3
+    assert [s.time for s in ring] == [2.0, 3.0, 4.0]
+    assert [s.frames for s in ring] == [2, 3, 4]
+
+def test_latest_per_stream():
+    ring = StcResultRing(2)
+    ring.append(sample(1.0, handle='a', frames=1))
+    ring.append(sample(2.0, handle='b', frames=2))
+    ring.append(sample(3.0, handle='b', frames=3))
+    latest = ring.latest()
+    assert latest[('b', 'TxStreamResults')].frames == 3
+    # the latest of a stream is kept even once the ring has overwritten it.
+    assert latest[('a', 'TxStreamResults')].frames == 1
+
+def test_ring_size():
+    with pytest.raises(StcResultsException):
+        StcResultRing(0)
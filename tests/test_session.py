@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from stc_commands import run_command
+from stc_session import StcSession
+
+def run(config, state, *commands):
+    '''Run commands as one spirent_session.py run would, and return the state it writes.'''
+    session = StcSession(config=config, state=state)
+    with session:
+        for command in commands:
+            run_command(session, command)
+
+    return json.loads(json.dumps(session.state))
+
+def attrs(emulator, handle):
+    session, = emulator.sessions.values()
+    return session.objects[handle]['attrs']
+
+def test_lifecycle(emulator, config):
+    state = run(config, None, 'create')
+    assert state['sid'] and state['project_handle']
+    assert state['lease']['handle']
+    assert len(emulator.sessions) == 1
+
+    state = run(config, state, 'traffic_start')
+    sb, = state['streamblocks']
+    assert sb['running']
+    assert set(sb['pdus']) == {'ethernetII', 'ipv4'}
+    assert attrs(emulator, sb['handle'])['runningstate'] == 'RUNNING'
+
+    # only the load changed, so it is sent with traffic running.
+    state = run(config.copy({'streamblock': {'Load': '20'}}), state, 'reconfigure')
+    sb, = state['streamblocks']
+    assert sb['running']
+    assert sb['config']['streamblock']['Load'] == '20'
+    assert attrs(emulator, sb['handle'])['load'] == '20'
+
+    state = run(config, state, 'traffic_stop')
+    assert not state.get('streamblocks')
+    assert not state.get('ports')
+
+    run(config, state, 'destroy')
+    assert not emulator.sessions
+
+def test_second_run_skips_connect_and_apply(emulator, config):
+    state = run(config, None, 'create')
+    emulator.reset_stats()
+    run(config, state, 'create')
+    calls = emulator.calls()
+    assert ('POST', 'connections') not in calls and ('PUT', 'connections') not in calls
+    assert ('PUT', 'apply') not in calls
+
+def test_frame_cache_reuses_streamblocks(emulator, config):
+    config = config.copy({'frame_cache': {'keep_ports': True}})
+    state = run(config, None, 'traffic_start', 'traffic_stop')
+    cached, = state['frame_cache']
+    assert attrs(emulator, cached['handle'])['active'] == 'FALSE'
+
+    emulator.reset_stats()
+    state = run(config, state, 'traffic_start')
+    assert [sb['handle'] for sb in state['streamblocks']] == [cached['handle']]
+    assert not state['frame_cache']
+    assert ('POST', 'bulk') not in emulator.calls() and ('POST', 'objects') not in emulator.calls()
+
+@pytest.mark.parametrize('emulator', [{'bulk': True}, {'bulk': False}], indirect=True)
+def test_batch_placeholders(emulator, config):
+    with StcSession(config=config, keep_open=False) as session:
+        port, = session.reserve_ports(['10.8.1.2'])
+        emulator.reset_stats()
+        with session.batch(workers=2):
+            handles = []
+            for _ in range(2):
+                sb = session.create_obj('streamBlock', port, {'Load': '5'})
+                ip = session.create_obj('ipv4:IPv4', sb, {'destAddr': '10.9.1.2'})
+                handles.append((sb, ip))
+            assert all([h.startswith('pending') for pair in handles for h in pair])
+
+        objects = emulator.sessions[session.state['sid']].objects
+        for sb, ip in handles:
+            assert objects[session.resolve(ip)]['parent'] == session.resolve(sb)
+            assert objects[session.resolve(sb)]['attrs']['load'] == '5'
+
+        creates = emulator.calls().get(('POST', 'bulk' if emulator.bulk else 'objects'))
+        assert creates == (2 if emulator.bulk else 4)
+
+@pytest.mark.parametrize('emulator', [{'arp_delay': 0.2}], indirect=True)
+def test_arp_retries_until_resolved(emulator, config):
+    state = run(config, None, 'traffic_start')
+    sb, = state['streamblocks']
+    assert sb['running']
+    assert list(state['arp_cache'][sb['port']].values()) == ['02:00:0a:08:01:01']